@@ -9,4 +9,10 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 # 3. Run Database Migrations
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# 4. Recount the super-admin platform counters (clears drift from bulk updates)
+python manage.py rebuild_platform_counters
+
+# 5. Recount the unit counters behind plan limits and admin lists
+python manage.py rebuild_unit_counts
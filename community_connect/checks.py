@@ -0,0 +1,37 @@
+"""
+Deployment checks for settings that work on one process but break across workers.
+Loaded from UsersConfig.ready().
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from .worker_state import cache_is_shared
+
+SHARED_CACHE_HINT = "Set REDIS_URL (or CACHE_BACKEND/CACHE_LOCATION) to a cache every worker can reach."
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Membership invalidation, shard moves and worker metrics need one cache for all processes."""
+    if cache_is_shared():
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.REQUIRE_SHARED_CACHE:
+        return [Error(
+            f"The default cache ({backend}) is private to each process.",
+            hint=SHARED_CACHE_HINT,
+            id='community_connect.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache_deploy(app_configs, **kwargs):
+    if cache_is_shared() or settings.REQUIRE_SHARED_CACHE:
+        return []  # Already reported by check_shared_cache
+    return [Warning(
+        f"The default cache ({settings.CACHES['default']['BACKEND']}) is private to each process; "
+        "run a single worker or configure a shared cache.",
+        hint=SHARED_CACHE_HINT,
+        id='community_connect.W001',
+    )]
@@ -0,0 +1,244 @@
+"""
+Business and runtime counters in Prometheus text format.
+
+Metrics are declared once at module level (`counter`, `histogram`) and
+updated from views with ``STK_PUSHES.inc(outcome='accepted')``. Updates only
+touch this process's memory; every few seconds a worker publishes its totals
+to a cache slot (community_connect/worker_state.py) and ``/metrics`` sums the
+slots of all workers. When a stopped worker's slot is taken over, its totals
+move into the slot's base, so the summed counters never go down.
+"""
+import bisect
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .worker_state import SharedSnapshots, process_id
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}  # (name, label values) -> number, or [bucket counts..., sum] for histograms
+        self.published = 0.0
+        self.shared = None
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, key, apply):
+        with self.lock:
+            apply(self.values, key)
+        self.publish_if_due()
+
+    def publish_if_due(self):
+        now = time.time()
+        with self.lock:
+            due = self.values and now - self.published >= settings.METRICS_PUBLISH_SECONDS
+            if due:
+                self.published = now
+                snapshot = self._snapshot()
+        if due:
+            self._shared().publish(snapshot)
+
+    def _snapshot(self):
+        return {key: list(value) if isinstance(value, list) else value for key, value in self.values.items()}
+
+    def _shared(self):
+        if self.shared is None:
+            # Slots never expire: a stopped worker's totals count until another worker carries them on.
+            self.shared = SharedSnapshots('metrics', timeout=None, carry=_carry, rebase=self._rebase)
+        return self.shared
+
+    def _rebase(self, carried):
+        """Drops totals another worker carried off with our old slot; returns the new snapshot."""
+        with self.lock:
+            for key, value in carried.items():
+                if isinstance(value, list):
+                    self.values[key] = [a - b for a, b in zip(self.values[key], value)]
+                else:
+                    self.values[key] -= value
+            return self._snapshot()
+
+    def collect(self):
+        """Every worker's values summed. Returns ``(values, live worker count)``."""
+        # Publishing first puts this worker's live numbers (rebased if its slot was taken over) in its slot.
+        with self.lock:
+            self.published = time.time()
+            snapshot = self._snapshot()
+        self._shared().publish(snapshot)
+        own, now = process_id(), time.time()
+        entries = self._shared().collect()
+        snapshots, workers = [], 0
+        for entry in entries:
+            snapshots += [entry['data'], entry.get('base') or {}]
+            workers += self._shared().is_live(entry, now)
+        if not any(entry['process'] == own for entry in entries):  # No slot to be had
+            with self.lock:
+                snapshots.append(self._snapshot())
+            workers += 1
+        totals = {}
+        for values in snapshots:
+            _add_values(totals, values)
+        return totals, workers
+
+def _add_values(totals, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            current = totals.setdefault(key, [0] * len(value))
+            totals[key] = [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _carry(base, values):
+    totals = dict(base or {})
+    _add_values(totals, values)
+    return totals
+
+REGISTRY = Registry()
+
+
+def _publish_after_request(sender, **kwargs):
+    # Also flushes updates made since the last publish by a worker that has gone quiet.
+    REGISTRY.publish_if_due()
+
+
+request_finished.connect(_publish_after_request, dispatch_uid='metrics_publish')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}.")
+        return (self.name, tuple(str(labels[label]) for label in self.labels))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        def apply(values, key):
+            values[key] = values.get(key, 0) + amount
+        REGISTRY.update(self._key(labels), apply)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value, **labels):
+        index = bisect.bisect_left(self.buckets, value)
+
+        def apply(values, key):
+            # Per-bucket counts, then the +Inf bucket, then the sum.
+            current = values.setdefault(key, [0] * (len(self.buckets) + 2))
+            current[index] += 1
+            current[-1] += value
+        REGISTRY.update(self._key(labels), apply)
+
+
+def counter(name, documentation, labels=()):
+    return Counter(name, documentation, labels)
+
+
+def histogram(name, documentation, labels=(), buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)):
+    return Histogram(name, documentation, labels, buckets)
+
+
+# --- Metrics ---
+STK_PUSHES = counter(
+    'cc_mpesa_stk_pushes_total', "STK push requests sent to Daraja, by outcome.", ['outcome'])
+MPESA_CALLBACKS = counter(
+    'cc_mpesa_callbacks_total', "M-Pesa callbacks received, by what they did to the invoice.", ['outcome'])
+VISITORS_LOGGED = counter(
+    'cc_visitors_logged_total', "Visitors logged at the gate, by entry point.", ['source'])
+INVOICES_GENERATED = counter(
+    'cc_invoices_generated_total', "Invoices created, by kind.", ['kind'])
+NOTIFICATION_FANOUT = histogram(
+    'cc_notification_fanout', "Notifications created per triggering event.", ['event'])
+CACHE_LOOKUPS = counter(
+    'cc_cache_lookups_total', "Application cache lookups, by cache and hit/miss.", ['cache', 'result'])
+LOGINS = counter(
+    'cc_logins_total', "Login attempts, by result.", ['result'])
+SIGNUPS = counter(
+    'cc_signups_total', "Organizations registered through the sign-up form.")
+
+
+def cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+# --- Exposition ---
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    values, workers = REGISTRY.collect()
+    lines = [
+        '# HELP cc_metrics_workers Worker processes that have published recently.',
+        '# TYPE cc_metrics_workers gauge',
+        f'cc_metrics_workers {workers}',
+    ]
+    for name, metric in sorted(REGISTRY.metrics.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for (_, label_values), value in sorted((k, v) for k, v in values.items() if k[0] == name):
+            pairs = list(zip(metric.labels, label_values))
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*metric.buckets, '+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(pairs + [("le", str(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. With METRICS_TOKEN set, scrapers send it as a
+    bearer token; without one only logged-in superusers can read it.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    elif not request.user.is_superuser:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
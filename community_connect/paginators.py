@@ -0,0 +1,48 @@
+"""
+Admin pagination for large tables.
+
+Django's change list runs an exact ``COUNT(*)`` over the filtered queryset on
+every page, which takes seconds on tables with millions of rows. An
+unfiltered list takes its total from the table statistics the database keeps
+(``reltuples`` on PostgreSQL, ``TABLE_ROWS`` on MySQL/TiDB); a filtered one, or
+one on a database without statistics, counts at most ADMIN_COUNT_LIMIT rows.
+Pair it with ``show_full_result_count = False`` on the ModelAdmin.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def estimated_rows(model, using):
+    """The database's estimate of the rows in ``model``'s table, or None where it keeps none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [connection.ops.quote_name(table)]
+    elif connection.vendor == 'mysql':
+        sql, params = "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is a table estimate or a capped count, never a full COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_COUNT_LIMIT
+        if not queryset.query.has_filters():
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
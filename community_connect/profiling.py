@@ -0,0 +1,287 @@
+"""
+Request profiling.
+
+ProfilingMiddleware times every request and, per resolved URL name, feeds
+wall time, query count, SQL time and response size into rolling histograms
+(one-minute slots, PROFILING_WINDOW_MINUTES of them). Each worker process
+keeps its own and publishes a snapshot to the cache every few seconds
+(community_connect/worker_state.py); the super-admin performance page merges
+them. A sample of requests also records their SQL text, which is kept for
+those that turn out slow.
+
+Queries are counted by an execute wrapper attached to every database
+connection as it opens, reporting to the request's probe through a context
+variable, so queries run on `concurrency.gather` worker threads count too.
+The slow-query wrapper (community_connect/slow_queries.py) is attached with it.
+"""
+import bisect
+import contextvars
+import datetime
+import heapq
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .slow_queries import capture_slow
+from .worker_state import SharedSnapshots, process_id
+
+# Upper bucket bounds per metric; one extra bucket holds everything above the last.
+BOUNDS = {
+    'wall_ms': [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000],
+    'queries': [0, 1, 2, 3, 5, 10, 20, 50, 100, 250],
+    'sql_ms': [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000],
+    'bytes': [1024, 4096, 16384, 65536, 262144, 1048576, 4194304],
+}
+TRACE_MAX_QUERIES = 200
+TRACE_SQL_CHARS = 2000
+UNRESOLVED = '(unresolved)'
+
+_probe = contextvars.ContextVar('profiling_probe', default=None)
+
+
+class Probe:
+    """SQL totals for one request (shared with the worker threads it spawns)."""
+    __slots__ = ('request', 'queries', 'sql_seconds', 'trace', 'lock')
+
+    def __init__(self, request, trace):
+        self.request = request
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.trace = [] if trace else None
+        self.lock = threading.Lock()
+
+
+def _record_query(execute, sql, params, many, context):
+    probe = _probe.get()
+    if probe is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        with probe.lock:
+            probe.queries += 1
+            probe.sql_seconds += elapsed
+            if probe.trace is not None and len(probe.trace) < TRACE_MAX_QUERIES:
+                probe.trace.append((context['connection'].alias, sql[:TRACE_SQL_CHARS], round(elapsed * 1000, 2)))
+
+
+def current_request():
+    """The request being profiled in this context, if any."""
+    probe = _probe.get()
+    return probe.request if probe is not None else None
+
+
+def _attach(connection):
+    for wrapper in (_record_query, capture_slow):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _attach(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='profiling_execute_wrapper')
+
+
+# --- Histograms ---
+def _empty_stats():
+    return {
+        'count': 0, 'errors': 0,
+        'hist': {metric: [0] * (len(bounds) + 1) for metric, bounds in BOUNDS.items()},
+        'sum': dict.fromkeys(BOUNDS, 0),
+        'max': dict.fromkeys(BOUNDS, 0),
+    }
+
+
+def _add(stats, sample, error):
+    stats['count'] += 1
+    stats['errors'] += error
+    for metric, value in sample.items():
+        stats['hist'][metric][bisect.bisect_left(BOUNDS[metric], value)] += 1
+        stats['sum'][metric] += value
+        stats['max'][metric] = max(stats['max'][metric], value)
+
+
+def _merge(into, stats):
+    into['count'] += stats['count']
+    into['errors'] += stats['errors']
+    for metric in BOUNDS:
+        into['hist'][metric] = [a + b for a, b in zip(into['hist'][metric], stats['hist'][metric])]
+        into['sum'][metric] += stats['sum'][metric]
+        into['max'][metric] = max(into['max'][metric], stats['max'][metric])
+
+
+def percentile(stats, metric, q):
+    """Estimated ``q``-quantile (0-1), interpolated inside the bucket it falls in."""
+    counts, bounds = stats['hist'][metric], BOUNDS[metric]
+    rank = q * stats['count']
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = bounds[index - 1] if index else 0
+            upper = bounds[index] if index < len(bounds) else stats['max'][metric]
+            upper = min(upper, stats['max'][metric])
+            return lower + (upper - lower) * max(rank - seen, 0) / count
+        seen += count
+    return 0
+
+
+# --- Per-process recorder ---
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}   # minute -> {view name: stats}
+        self.worst = []   # min-heap of (wall_ms, seq, request summary)
+        self.seq = 0
+        self.published = 0.0
+        self.shared = SharedSnapshots('profiling', timeout=settings.PROFILING_WINDOW_MINUTES * 60)
+
+    def record(self, name, sample, error, summary):
+        now = time.time()
+        minute = int(now // 60)
+        with self.lock:
+            views = self.slots.setdefault(minute, {})
+            _add(views.setdefault(name, _empty_stats()), sample, error)
+            self.seq += 1
+            entry = (sample['wall_ms'], self.seq, summary)
+            if len(self.worst) < settings.PROFILING_WORST_REQUESTS:
+                heapq.heappush(self.worst, entry)
+            elif entry[0] > self.worst[0][0]:
+                heapq.heapreplace(self.worst, entry)
+            due = now - self.published >= settings.PROFILING_PUBLISH_SECONDS
+            if due:
+                self.published = now
+                snapshot = self._snapshot(minute)
+        if due:
+            self.shared.publish(snapshot)
+
+    def _snapshot(self, minute):
+        oldest = minute - settings.PROFILING_WINDOW_MINUTES + 1
+        for stale in [m for m in self.slots if m < oldest]:
+            del self.slots[stale]
+        horizon = oldest * 60
+        self.worst = [entry for entry in self.worst if entry[2]['at'] >= horizon]
+        heapq.heapify(self.worst)
+        views = {}
+        for slot in self.slots.values():
+            for name, stats in slot.items():
+                _merge(views.setdefault(name, _empty_stats()), stats)
+        return {'views': views, 'worst': [summary for _, _, summary in self.worst]}
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot(int(time.time() // 60))
+
+
+_recorder = None
+
+
+def recorder():
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    return _recorder
+
+
+def report():
+    """Every worker's window merged: ``(rows, worst requests, process count)``."""
+    # This worker's own numbers are taken live rather than from its last publish.
+    own = process_id()
+    entries = [entry for entry in recorder().shared.collect() if entry['process'] != own]
+    entries.append({'process': own, 'data': recorder().snapshot()})
+    views, worst = {}, []
+    for entry in entries:
+        for name, stats in entry['data']['views'].items():
+            _merge(views.setdefault(name, _empty_stats()), stats)
+        worst.extend(entry['data']['worst'])
+    rows = []
+    for name, stats in views.items():
+        row = {'name': name, 'count': stats['count'], 'errors': stats['errors']}
+        for metric in BOUNDS:
+            row[metric] = {
+                'avg': stats['sum'][metric] / stats['count'],
+                'p50': percentile(stats, metric, 0.50),
+                'p95': percentile(stats, metric, 0.95),
+                'p99': percentile(stats, metric, 0.99),
+                'max': stats['max'][metric],
+            }
+        rows.append(row)
+    rows.sort(key=lambda row: row['wall_ms']['p95'], reverse=True)
+    worst = sorted(worst, key=lambda summary: summary['wall_ms'], reverse=True)[:settings.PROFILING_WORST_REQUESTS]
+    for summary in worst:
+        summary['when'] = datetime.datetime.fromtimestamp(summary['at'], tz=datetime.timezone.utc)
+    return rows, worst, len(entries)
+
+
+# --- Middleware ---
+class ProfilingMiddleware:
+    """
+    Records each request into the rolling histograms. Place it right after
+    WhiteNoise so static files are not counted but every other middleware is.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        probe, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _probe.reset(token)
+        self.finish(request, response, probe, started)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return await self.get_response(request)
+        probe, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _probe.reset(token)
+        self.finish(request, response, probe, started)
+        return response
+
+    def start(self, request):
+        # Connections opened before this module loaded never saw connection_created.
+        for connection in connections.all(initialized_only=True):
+            _attach(connection)
+        trace = settings.PROFILING_TRACE_SLOW_MS > 0 and random.random() < settings.PROFILING_TRACE_SAMPLE_RATE
+        probe = Probe(request, trace)
+        return probe, _probe.set(probe), time.perf_counter()
+
+    def finish(self, request, response, probe, started):
+        wall_ms = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        name = match.view_name if match is not None else UNRESOLVED
+        # Streams are timed until their first byte only, and their size is unknown.
+        size = 0 if response.streaming else len(response.content)
+        sample = {
+            'wall_ms': wall_ms,
+            'queries': probe.queries,
+            'sql_ms': probe.sql_seconds * 1000,
+            'bytes': size,
+        }
+        summary = {
+            'at': time.time(), 'view': name, 'method': request.method, 'path': request.path,
+            'status': response.status_code, **sample, 'trace': None,
+        }
+        if probe.trace is not None and wall_ms >= settings.PROFILING_TRACE_SLOW_MS:
+            summary['trace'] = probe.trace
+        recorder().record(name, sample, response.status_code >= 500, summary)
@@ -0,0 +1,149 @@
+"""
+Read-replica routing.
+
+Only views wrapped in `replica_reads` read from the ``replica`` alias; every
+other query, and every write, goes to ``default``. Once a request writes, it
+is pinned to the primary for the rest of the request and, through a short-
+lived cookie, for the client's next few requests, so nobody reads a replica
+that has not yet caught up with their own change. Without a ``replica``
+entry in DATABASES everything stays on ``default``.
+"""
+import contextvars
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import sharding
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pin'
+
+_reading_replica = contextvars.ContextVar('reading_replica', default=False)
+_pinned = contextvars.ContextVar('pinned_to_primary', default=None)
+
+
+def replica_available():
+    return REPLICA in settings.DATABASES
+
+
+def pin_to_primary():
+    """Sends the rest of this request's reads to the primary (called on every write)."""
+    pinned = _pinned.get()
+    if pinned is not None:
+        pinned['wrote'] = True
+
+
+def _is_pinned():
+    pinned = _pinned.get()
+    return pinned is not None and (pinned['wrote'] or pinned['cookie'])
+
+
+def replica_reads(view_func):
+    """Lets a read-heavy view (reports, dashboards) run its queries on the replica."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _reading_replica.set(request.method in ('GET', 'HEAD'))
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _reading_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        token = _reading_replica.set(request.method in ('GET', 'HEAD'))
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _reading_replica.reset(token)
+    return wrapper
+
+
+class ShardRouter:
+    """
+    Sends sharded models (see community_connect/sharding.py) to the bound shard.
+    Leaves ``default`` decisions to the routers after it, so replica reads and
+    primary pinning keep working for organizations on the default shard.
+    """
+    def _shard(self, model, hints):
+        if not sharding.is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        alias = sharding.current_shard()
+        if alias == sharding.DEFAULT and instance is not None and instance._state.db:
+            alias = instance._state.db  # Loaded from a shard outside a bound block
+        return None if alias in (sharding.DEFAULT, REPLICA) else alias
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        alias = self._shard(model, hints)
+        if sharding.is_sharded(model):
+            instance = hints.get('instance')
+            org_id = getattr(instance, 'organization_id', None) or sharding.current_organization_id()
+            sharding.check_writable(org_id, alias or sharding.DEFAULT)
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Directory rows (users, organizations) are mirrored onto every shard.
+        return True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading_replica.get() and not _is_pinned() and replica_available():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Both aliases hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary (replication, or
+        # `sync_replica` for the local SQLite copy).
+        return db != REPLICA
+
+
+class PrimaryPinningMiddleware:
+    """
+    Tracks writes per request for ReplicaRouter and sets the pin cookie.
+    Place it above SessionMiddleware so session saves count as writes.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _pinned.set({'wrote': False, 'cookie': PIN_COOKIE in request.COOKIES})
+        try:
+            return self.set_pin(request, self.get_response(request))
+        finally:
+            _pinned.reset(token)
+
+    async def __acall__(self, request):
+        token = _pinned.set({'wrote': False, 'cookie': PIN_COOKIE in request.COOKIES})
+        try:
+            return self.set_pin(request, await self.get_response(request))
+        finally:
+            _pinned.reset(token)
+
+    def set_pin(self, request, response):
+        # The flag dict is shared with the copies of this context that worker threads run in.
+        if _pinned.get()['wrote'] and replica_available():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
@@ -1,6 +1,6 @@
 from pathlib import Path
 import os
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,11 +43,19 @@ MIDDLEWARE = [
     
     # WHITENOISE MUST BE HERE (After SecurityMiddleware)
     'whitenoise.middleware.WhiteNoiseMiddleware',
-    
+
+    # Per-view latency and SQL histograms (community_connect/profiling.py)
+    'community_connect.profiling.ProfilingMiddleware',
+
+    # Pins clients to the primary database after they write (must precede SessionMiddleware)
+    'community_connect.routers.PrimaryPinningMiddleware',
+
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Resolves request.org once per request (must follow AuthenticationMiddleware)
+    'users.middleware.OrganizationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -102,6 +110,43 @@ else:
         }
     }
 
+# Optional read replica for report and dashboard reads (community_connect/routers.py).
+# On Render set DB_REPLICA_HOST (same credentials as the primary); locally set
+# DB_REPLICA_NAME to a second SQLite file and fill it with `manage.py sync_replica`.
+if config('RENDER', default=False, cast=bool) and config('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': config('DB_REPLICA_HOST'),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+    }
+elif not config('RENDER', default=False, cast=bool) and config('DB_REPLICA_NAME', default=''):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': config('DB_REPLICA_NAME'),
+    }
+if 'replica' in DATABASES:
+    # Tests read the replica through the test primary
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Extra shards for organization data (community_connect/sharding.py), as alias=location
+# pairs: on Render host[:port] with the primary's credentials, locally a SQLite file path.
+#   DB_SHARDS=shard1=/tmp/shard1.sqlite3,shard2=/tmp/shard2.sqlite3
+# Run `manage.py migrate --database=<alias>` for each, then move organizations
+# onto them with `manage.py move_organization_shard`.
+DATABASE_SHARDS = ['default']
+for _entry in config('DB_SHARDS', default='', cast=Csv()):
+    _alias, _, _location = _entry.partition('=')
+    if config('RENDER', default=False, cast=bool):
+        _host, _, _port = _location.partition(':')
+        DATABASES[_alias] = {**DATABASES['default'], 'HOST': _host, 'PORT': _port or DATABASES['default']['PORT']}
+    else:
+        DATABASES[_alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': _location}
+    DATABASE_SHARDS.append(_alias)
+
+DATABASE_ROUTERS = ['community_connect.routers.ShardRouter', 'community_connect.routers.ReplicaRouter']
+# After a write, the client reads from the primary for this long (replication lag allowance).
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
 
 # ==============================================
 # 4. AUTH & PASSWORDS
@@ -116,6 +161,17 @@ AUTH_PASSWORD_VALIDATORS = [
 # Point to our Custom User Model
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Serve request.user from the cache (users/backends.py). ModelBackend stays
+# listed so sessions created before the cached backend existed remain valid.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Sessions are read from the cache and only written to the database when they
+# change (login, logout, messages), so a warm request never touches the session table.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -164,8 +220,133 @@ DARAJA_BUSINESS_SHORTCODE = config('DARAJA_BUSINESS_SHORTCODE', default='174379'
 DARAJA_PASSKEY = config('DARAJA_PASSKEY', default='bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919')
 DARAJA_CALLBACK_URL = config('DARAJA_CALLBACK_URL', default='http://localhost:8000/api/mpesa/callback/')
 
+# ==============================================
+# 8. GATE HISTORY RETENTION
+# ==============================================
+# Closed visitor logs and guest stays older than this move to the archive tables
+# (python manage.py archive_gate_history), keeping the live tables small.
+GATE_HISTORY_RETENTION_DAYS = config('GATE_HISTORY_RETENTION_DAYS', default=90, cast=int)
+
 # Media files (User uploaded content like ID cards)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-# Force deployment update v1
\ No newline at end of file
+# Uploads are stored once per unique content under media/blobs/ (property/storage.py);
+# run `python manage.py gc_media` daily to drop blobs nothing references.
+STORAGES = {
+    "default": {"BACKEND": "property.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# ==============================================
+# 9. UPLOADED IMAGES
+# ==============================================
+# Uploads above this size stream to a temp file instead of being held in memory.
+FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=256 * 1024, cast=int)
+# Photos are re-encoded in the background (property/images.py); the management
+# command `process_images` picks up anything the in-process worker missed.
+IMAGE_PROCESS_IN_BACKGROUND = config('IMAGE_PROCESS_IN_BACKGROUND', default=True, cast=bool)
+IMAGE_DISPLAY_MAX_SIDE = config('IMAGE_DISPLAY_MAX_SIDE', default=1600, cast=int)
+IMAGE_THUMBNAIL_MAX_SIDE = config('IMAGE_THUMBNAIL_MAX_SIDE', default=320, cast=int)
+IMAGE_JPEG_QUALITY = config('IMAGE_JPEG_QUALITY', default=80, cast=int)
+
+# ==============================================
+# 10. CACHE
+# ==============================================
+# Local memory by default (per process). For a file cache in development use
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/tmp/cc-cache
+# Production must use one backend shared by every worker: membership invalidation,
+# shard moves and the per-worker metrics all go through it. On Render set REDIS_URL
+# (e.g. the Key Value instance's internal URL); elsewhere set CACHE_BACKEND, e.g.
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://host:6379/1
+if config('REDIS_URL', default=''):
+    _cache_backend = 'django.core.cache.backends.redis.RedisCache'
+    _cache_location = config('REDIS_URL')
+else:
+    _cache_backend = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+    _cache_location = config('CACHE_LOCATION', default='community-connect')
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': _cache_location,
+        'KEY_PREFIX': 'cc',
+        'TIMEOUT': 300,
+    }
+}
+# A per-process cache is a system check error where this is on (community_connect/checks.py).
+REQUIRE_SHARED_CACHE = config('REQUIRE_SHARED_CACHE', default=config('RENDER', default=False, cast=bool), cast=bool)
+# Upper bound for version-keyed dashboard entries (property/cache.py); they are
+# normally replaced as soon as a signal bumps their scope.
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=600, cast=int)
+
+# ==============================================
+# 11. REQUEST PROFILING
+# ==============================================
+# Rolling per-view histograms, shown to superusers at /app/super-admin/performance/.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_WINDOW_MINUTES = config('PROFILING_WINDOW_MINUTES', default=60, cast=int)
+# How often each worker publishes its numbers to the cache.
+PROFILING_PUBLISH_SECONDS = config('PROFILING_PUBLISH_SECONDS', default=10, cast=int)
+PROFILING_WORST_REQUESTS = config('PROFILING_WORST_REQUESTS', default=20, cast=int)
+# Keep full SQL traces for sampled requests slower than this (0 turns tracing off).
+PROFILING_TRACE_SLOW_MS = config('PROFILING_TRACE_SLOW_MS', default=1000, cast=int)
+PROFILING_TRACE_SAMPLE_RATE = config('PROFILING_TRACE_SAMPLE_RATE', default=0.1, cast=float)
+
+# ==============================================
+# 12. METRICS
+# ==============================================
+# Prometheus scrape endpoint at /metrics (community_connect/metrics.py). Give the
+# scraper this token as a bearer token; left empty, only superusers can read it.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# How often each worker publishes its counters to the cache. A stopped worker's
+# totals keep counting until a new worker takes over its slot and carries them on.
+METRICS_PUBLISH_SECONDS = config('METRICS_PUBLISH_SECONDS', default=5, cast=int)
+
+# ==============================================
+# 13. SLOW QUERIES
+# ==============================================
+# Statements slower than this are captured with their plan (community_connect/slow_queries.py),
+# listed on the performance page and written to SLOW_QUERY_LOG. 0 turns capture off.
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=200, cast=float)
+SLOW_QUERY_EXPLAIN = config('SLOW_QUERY_EXPLAIN', default=True, cast=bool)
+SLOW_QUERY_BUFFER_SIZE = config('SLOW_QUERY_BUFFER_SIZE', default=100, cast=int)
+SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=os.path.join(BASE_DIR, 'slow_queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow_queries': {'format': '%(asctime)s pid=%(process)d %(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+            'formatter': 'slow_queries',
+        },
+    },
+    'loggers': {
+        'community_connect.slow_queries': {'handlers': ['slow_queries'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# ==============================================
+# 14. SUBSCRIPTION BILLING
+# ==============================================
+# Monthly plan prices (property/billing.py); run `manage.py run_subscription_billing` daily.
+# Enterprise is quoted per contract and invoiced by hand.
+SUBSCRIPTION_STANDARD_FEE = config('SUBSCRIPTION_STANDARD_FEE', default=3000, cast=int)
+SUBSCRIPTION_PREMIUM_UNIT_PRICE = config('SUBSCRIPTION_PREMIUM_UNIT_PRICE', default=40, cast=int)
+SUBSCRIPTION_DUE_DAYS = config('SUBSCRIPTION_DUE_DAYS', default=14, cast=int)
+
+# ==============================================
+# 15. ADMIN
+# ==============================================
+# Admin change lists count at most this many matching rows (community_connect/paginators.py);
+# unfiltered lists of bigger tables use the database's row estimate instead.
+ADMIN_COUNT_LIMIT = config('ADMIN_COUNT_LIMIT', default=10000, cast=int)
+
+# Force deployment update v1
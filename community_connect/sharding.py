@@ -0,0 +1,164 @@
+"""
+Organization sharding.
+
+Each Organization's property data (units, invoices, gate logs, ...) lives on
+the database alias named by ``Organization.shard``. The directory (users,
+organizations and other platform tables) lives on ``default`` and is mirrored
+onto every other shard, so foreign keys and joins to users keep working there.
+
+A request is bound to its organization's shard by OrganizationMiddleware;
+code running outside a request (commands, background threads) binds one
+with `using_shard`. ShardRouter (community_connect/routers.py) sends every
+query on a sharded model to the bound shard.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+
+DEFAULT = 'default'
+
+# Sharded models, in foreign-key dependency order, with the lookup(s) from each
+# to its owning organization. Models not listed stay on ``default``.
+ORG_PATHS = {
+    'property.expensecategory': ['organization'],
+    'property.property': ['organization'],
+    'property.propertystaff': ['property__organization'],
+    'property.unit': ['organization'],
+    'property.meter': ['unit__organization'],
+    'property.invoice': ['organization'],
+    'property.meterreading': ['meter__unit__organization'],
+    'property.visitorlog': ['organization'],
+    'property.shorttermstay': ['organization'],
+    'property.visitorlogarchive': ['organization'],
+    'property.shorttermstayarchive': ['organization'],
+    'property.gatetraffichourly': ['organization'],
+    'property.expense': ['organization'],
+    'property.ticket': ['unit__organization'],
+    'property.announcement': ['property__organization'],
+    'property.parkinglot': ['property__organization'],
+    'property.notification': [
+        'recipient__organization', 'recipient__occupied_unit__organization', 'recipient__owned_units__organization',
+    ],
+}
+
+_bound = contextvars.ContextVar('bound_shard', default=(None, None))
+
+
+class ShardMoveInProgress(DatabaseError):
+    """Raised for writes to an organization while move_organization_shard is cutting it over."""
+
+
+def is_sharded(model):
+    return model._meta.label_lower in ORG_PATHS
+
+
+def shard_aliases():
+    """Every database alias that holds a shard (``default`` first)."""
+    return settings.DATABASE_SHARDS
+
+
+def shard_of(org_id):
+    """The alias holding an organization's data (from the cached Organization)."""
+    from users.middleware import get_cached_organization
+    org = get_cached_organization(org_id)
+    return org.shard if org is not None else DEFAULT
+
+
+def current_shard():
+    return _bound.get()[0] or DEFAULT
+
+
+def current_organization_id():
+    return _bound.get()[1]
+
+
+@contextmanager
+def using_shard(alias, org_id=None):
+    """Binds sharded-model queries in this block (and thread/task) to ``alias``."""
+    token = _bound.set((alias, org_id))
+    try:
+        yield alias
+    finally:
+        _bound.reset(token)
+
+
+def atomic(**kwargs):
+    """`transaction.atomic` on the bound shard, for blocks that touch sharded models."""
+    return transaction.atomic(using=current_shard(), **kwargs)
+
+
+def scoped(model, org_id, alias):
+    """One organization's rows of a sharded model on ``alias``."""
+    condition = Q()
+    for path in ORG_PATHS[model._meta.label_lower]:
+        condition |= Q(**{f'{path}_id': org_id})
+    queryset = model._base_manager.using(alias).filter(condition)
+    return queryset.distinct() if len(ORG_PATHS[model._meta.label_lower]) > 1 else queryset
+
+
+def find_across_shards(queryset):
+    """First match for ``queryset`` on any shard, as ``(alias, obj)``; ``(None, None)`` if none."""
+    for alias in shard_aliases():
+        obj = queryset.using(alias).first()
+        if obj is not None:
+            return alias, obj
+    return None, None
+
+
+def insert_copies(model, objs, alias):
+    """
+    Inserts rows copied from another database exactly as they are: primary keys
+    and auto_now(_add) timestamps are kept and no signals are sent (the same raw
+    insert loaddata uses).
+    """
+    if objs:
+        model._base_manager.using(alias)._insert(objs, fields=model._meta.concrete_fields, using=alias, raw=True)
+
+
+# --- Directory mirroring ---
+def mirror(instance, aliases=None):
+    """Upserts a directory row (user, organization) onto the other shards without sending signals."""
+    model = type(instance)
+    values = {f.attname: getattr(instance, f.attname) for f in model._meta.concrete_fields if not f.primary_key}
+    for alias in aliases or shard_aliases()[1:]:
+        if not model._base_manager.using(alias).filter(pk=instance.pk).update(**values):
+            insert_copies(model, [instance], alias)
+
+
+def unmirror(model, pk):
+    for alias in shard_aliases()[1:]:
+        model._base_manager.using(alias).filter(pk=pk).delete()
+
+
+# --- Cutover freeze ---
+def _freeze_key(org_id):
+    return f"shard:moving:{org_id}"
+
+
+def freeze(org_id, seconds=300):
+    cache.set(_freeze_key(org_id), True, seconds)
+
+
+def thaw(org_id):
+    cache.delete(_freeze_key(org_id))
+
+
+def is_frozen(org_id):
+    return org_id is not None and cache.get(_freeze_key(org_id)) is not None
+
+
+def check_writable(org_id, alias):
+    """
+    Refuses a write for an organization that is being moved, or one aimed at a
+    shard the organization has already left (a request bound before the switch).
+    """
+    if org_id is None:
+        return
+    if is_frozen(org_id):
+        raise ShardMoveInProgress(f"Organization {org_id} is moving shards; retry shortly.")
+    if shard_of(org_id) != alias:
+        raise ShardMoveInProgress(f"Organization {org_id} no longer lives on '{alias}'; retry.")
@@ -0,0 +1,201 @@
+"""
+Slow-query capture.
+
+An execute wrapper (attached to every connection alongside the profiler's,
+see community_connect/profiling.py) times each statement. Statements slower
+than SLOW_QUERY_MS are recorded with their normalized shape (literals and
+placeholders folded, so ``WHERE id = 7`` and ``WHERE id = 9`` group together),
+the count and types of their parameters, the view and code line that ran
+them, and, the first time a shape is seen by a worker, the database's plan
+for it (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on MySQL/TiDB). Captures
+go to a per-worker ring buffer, shown on the super-admin performance page,
+and to the ``slow_queries`` log. Parameter values and raw SQL are never kept:
+they carry phone numbers, names and tokens.
+"""
+import collections
+import contextvars
+import datetime
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from .worker_state import SharedSnapshots, process_id
+
+logger = logging.getLogger('community_connect.slow_queries')
+
+MAX_PLANNED_SHAPES = 500
+SQL_CHARS = 4000
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+_explaining = contextvars.ContextVar('explaining_slow_query', default=False)
+
+
+def shape_of(sql):
+    """The statement with literals and placeholders replaced by ``?`` and IN lists collapsed."""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape.replace('%s', '?'))
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def describe_params(params):
+    """Parameter count and types, e.g. ``3 params: int, str x2``; None when there were none."""
+    if not params:
+        return None
+    values = params.values() if isinstance(params, dict) else params
+    types = collections.Counter(type(value).__name__ for value in values)
+    listed = ', '.join(name if count == 1 else f"{name} x{count}" for name, count in types.items())
+    return f"{sum(types.values())} params: {listed}"
+
+
+def shape_id(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def _caller():
+    """``file:line in function`` of the innermost project frame that led to the query."""
+    base = str(settings.BASE_DIR) + '/'
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and '/site-packages/' not in filename and not filename.startswith(base + 'community_connect/'):
+            return f"{filename[len(base):]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def explain(connection, sql, params):
+    """The plan for ``sql`` as text lines, or None where the backend is not supported."""
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif connection.vendor in ('mysql', 'postgresql'):
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        _explaining.reset(token)
+    if connection.vendor == 'sqlite':
+        return [row[-1] for row in rows]  # id, parent, notused, detail
+    if connection.vendor == 'postgresql':
+        return [row[0] for row in rows]
+    return ['  '.join(f"{name}={value}" for name, value in zip(columns, row) if value is not None) for row in rows]
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = collections.deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+        self.plans = collections.OrderedDict()  # shape id -> plan lines
+        self.published = 0.0
+        self.shared = SharedSnapshots('slow_queries', timeout=24 * 3600)
+
+    def capture(self, connection, sql, params, elapsed):
+        from .profiling import current_request
+
+        shape = shape_of(sql)
+        key = shape_id(shape)
+        with self.lock:
+            plan = self.plans.get(key)
+            new_shape = key not in self.plans
+        if new_shape and settings.SLOW_QUERY_EXPLAIN and sql.lstrip().upper().startswith(EXPLAINABLE):
+            plan = explain(connection, sql, params)
+
+        request = current_request()
+        match = getattr(request, 'resolver_match', None)
+        entry = {
+            'at': time.time(),
+            'ms': round(elapsed * 1000, 2),
+            'alias': connection.alias,
+            'shape_id': key,
+            'shape': shape[:SQL_CHARS],
+            'params': describe_params(params),
+            'view': match.view_name if match is not None else None,
+            'path': request.path if request is not None else None,
+            'caller': _caller(),
+            'plan': plan,
+        }
+        now = time.time()
+        with self.lock:
+            if new_shape:
+                self.plans[key] = plan
+                if len(self.plans) > MAX_PLANNED_SHAPES:
+                    self.plans.popitem(last=False)
+            self.entries.append(entry)
+            due = now - self.published >= settings.PROFILING_PUBLISH_SECONDS
+            if due:
+                self.published = now
+                snapshot = list(self.entries)
+        if due:
+            self.shared.publish(snapshot)
+
+        logger.warning(
+            "%.1fms [%s] shape=%s view=%s caller=%s\n  SQL: %s\n  Params: %s%s",
+            entry['ms'], entry['alias'], key, entry['view'] or entry['path'], entry['caller'],
+            entry['shape'], entry['params'] or 'none',
+            ''.join(f"\n  Plan: {line}" for line in plan or []) if new_shape else '',
+        )
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries)
+
+
+_log = None
+
+
+def slow_query_log():
+    global _log
+    if _log is None:
+        _log = SlowQueryLog()
+    return _log
+
+
+def capture_slow(execute, sql, params, many, context):
+    """Execute wrapper: records statements slower than SLOW_QUERY_MS."""
+    threshold = settings.SLOW_QUERY_MS
+    if not threshold or _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - started
+    if elapsed * 1000 >= threshold:
+        slow_query_log().capture(context['connection'], sql, None if many else params, elapsed)
+    return result
+
+
+def report():
+    """Captures from every worker grouped by shape, slowest first, each with its latest occurrence."""
+    own = process_id()
+    entries = slow_query_log().snapshot()
+    for other in slow_query_log().shared.collect():
+        if other['process'] != own:
+            entries.extend(other['data'])
+    shapes = {}
+    for entry in sorted(entries, key=lambda entry: entry['at']):
+        group = shapes.setdefault(entry['shape_id'], {'count': 0, 'max_ms': 0, 'total_ms': 0, 'plan': None})
+        group['count'] += 1
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['total_ms'] += entry['ms']
+        group['plan'] = entry['plan'] or group['plan']
+        group['latest'] = entry
+    for group in shapes.values():
+        group['latest']['when'] = datetime.datetime.fromtimestamp(group['latest']['at'], tz=datetime.timezone.utc)
+    return sorted(shapes.values(), key=lambda group: group['total_ms'], reverse=True)
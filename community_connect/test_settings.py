@@ -0,0 +1,34 @@
+"""
+Settings for the test suite:
+
+    python manage.py test -t . --settings=community_connect.test_settings
+
+``-t .`` sets the top-level directory explicitly, since the project directory
+is itself a package and discovery would otherwise import the apps under the
+wrong name.
+"""
+from .settings import *  # noqa: F401,F403
+
+# property's initial migration opens with MySQL-only cleanup SQL (SET
+# FOREIGN_KEY_CHECKS), which SQLite rejects, so the test database is built
+# straight from the current models instead of by replaying the migrations.
+DATABASES['default']['TEST'] = {'MIGRATE': False}
+
+# A second SQLite database as the read replica, so routing and `sync_replica`
+# run against a real copy. ReplicaRouter is switched on only by the tests that
+# exercise it (community_connect/tests.py): elsewhere a TestCase's rows are
+# uncommitted on the primary and a replica read could not see them.
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'replica.sqlite3',
+    'TEST': {'MIGRATE': False},
+}
+DATABASE_ROUTERS = ['community_connect.routers.ShardRouter']
+
+# A second shard for move_organization_shard. It is not in DATABASE_SHARDS, so
+# directory rows are only mirrored onto it by tests that add it there.
+DATABASES['shard1'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'shard1.sqlite3',
+    'TEST': {'MIGRATE': False},
+}
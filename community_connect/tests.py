@@ -0,0 +1,340 @@
+import contextlib
+import datetime
+import json
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from property.models import Expense, Property, Unit
+from users.models import CustomUser, Organization
+
+from . import checks, metrics, profiling, slow_queries, worker_state
+from .paginators import EstimatedCountPaginator, estimated_rows
+from .routers import PIN_COOKIE, REPLICA, PrimaryPinningMiddleware, replica_reads
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+# test_settings leaves ReplicaRouter out so other tests read their uncommitted rows from the primary.
+REPLICA_ROUTERS = ['community_connect.routers.ShardRouter', 'community_connect.routers.ReplicaRouter']
+
+
+# --- Shared cache checks (039) ---
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES=LOCAL_CACHE, REQUIRE_SHARED_CACHE=True)
+    def test_local_cache_is_an_error_where_a_shared_one_is_required(self):
+        self.assertEqual([e.id for e in checks.check_shared_cache(None)], ['community_connect.E001'])
+        self.assertEqual(checks.check_shared_cache_deploy(None), [])
+
+    @override_settings(CACHES=LOCAL_CACHE, REQUIRE_SHARED_CACHE=False)
+    def test_local_cache_is_a_deploy_warning_otherwise(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
+        self.assertEqual([w.id for w in checks.check_shared_cache_deploy(None)], ['community_connect.W001'])
+
+    @override_settings(CACHES=REDIS_CACHE, REQUIRE_SHARED_CACHE=True)
+    def test_shared_cache_passes(self):
+        self.assertEqual(checks.check_shared_cache(None) + checks.check_shared_cache_deploy(None), [])
+
+
+# --- Read replica routing (041) ---
+@override_settings(DATABASE_ROUTERS=REPLICA_ROUTERS)
+class ReplicaRouterTests(TransactionTestCase):
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+        self.pm = CustomUser.objects.create_user(username="pm", password="x", role='PM', organization=self.org)
+        Property.objects.create(name="Greenwood", organization=self.org)
+        call_command('sync_replica', stdout=StringIO())
+        Property.objects.create(name="Lakeside", organization=self.org)  # Not replicated yet
+        self.factory = RequestFactory()
+
+    def names(self, request=None):  # Doubles as a view
+        return sorted(Property.objects.values_list('name', flat=True))
+
+    def test_replica_reads_views_read_the_replica(self):
+        view = replica_reads(self.names)
+        self.assertEqual(view(self.factory.get('/')), ["Greenwood"])
+        self.assertEqual(view(self.factory.post('/')), ["Greenwood", "Lakeside"])
+        self.assertEqual(self.names(), ["Greenwood", "Lakeside"])
+
+        call_command('sync_replica', stdout=StringIO())
+        self.assertEqual(view(self.factory.get('/')), ["Greenwood", "Lakeside"])
+
+    def test_report_page_is_served_from_the_replica(self):
+        Expense.objects.create(property=Property.objects.get(name="Greenwood"), payee="Plumber", amount=250,
+                               date_incurred=datetime.date.today())
+        self.client.force_login(self.pm)
+        self.assertEqual(self.client.get('/app/finance/report/print/').context['total_expense'], 0)
+        call_command('sync_replica', stdout=StringIO())
+        self.assertEqual(self.client.get('/app/finance/report/print/').context['total_expense'], 250)
+
+    def test_write_pins_the_rest_of_the_request_and_the_client(self):
+        def view(request):
+            before = self.names()
+            Property.objects.create(name="Riverside", organization=self.org)
+            return HttpResponse(json.dumps([before, self.names()]))
+
+        response = PrimaryPinningMiddleware(replica_reads(view))(self.factory.get('/'))
+        self.assertEqual(json.loads(response.content), [["Greenwood"], ["Greenwood", "Lakeside", "Riverside"]])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_reads_on_the_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response = PrimaryPinningMiddleware(replica_reads(lambda r: HttpResponse(json.dumps(self.names()))))(request)
+        self.assertEqual(json.loads(response.content), ["Greenwood", "Lakeside"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)  # Reads alone do not extend the pin
+
+    def test_without_a_replica_everything_stays_on_default(self):
+        with mock.patch.dict(settings.DATABASES):
+            del settings.DATABASES[REPLICA]
+            self.assertEqual(replica_reads(self.names)(self.factory.get('/')), ["Greenwood", "Lakeside"])
+            with self.assertRaisesMessage(CommandError, "DB_REPLICA_NAME"):
+                call_command('sync_replica', stdout=StringIO())
+
+            def view(request):
+                Property.objects.create(name="Riverside", organization=self.org)
+                return HttpResponse()
+            self.assertNotIn(PIN_COOKIE, PrimaryPinningMiddleware(view)(self.factory.get('/')).cookies)
+
+
+# --- Request profiling (044) ---
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling._recorder = None
+        self.addCleanup(setattr, profiling, '_recorder', None)
+        self.admin = CustomUser.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.factory = RequestFactory()
+
+    def rows(self):
+        return {row['name']: row for row in profiling.report()[0]}
+
+    def test_percentile_interpolates_inside_the_bucket(self):
+        stats = profiling._empty_stats()
+        for wall_ms in (30, 30, 30, 30, 40, 40, 40, 40, 200, 3000):
+            profiling._add(stats, {'wall_ms': wall_ms}, False)
+        self.assertTrue(25 <= profiling.percentile(stats, 'wall_ms', 0.5) <= 50)
+        self.assertEqual(profiling.percentile(stats, 'wall_ms', 1.0), 3000)
+        self.assertEqual(profiling.percentile(profiling._empty_stats(), 'wall_ms', 0.5), 0)
+
+    def test_requests_are_recorded_under_their_view_name(self):
+        self.client.force_login(self.admin)
+        self.client.get('/app/super-admin/performance/')
+        self.client.get('/no-such-page/')
+        rows = self.rows()
+        row = rows['property:super_admin_performance']
+        self.assertEqual(row['count'], 1)
+        self.assertGreater(row['queries']['max'], 0)
+        self.assertGreater(row['bytes']['max'], 0)
+        self.assertEqual(rows[profiling.UNRESOLVED]['count'], 1)
+
+    def test_queries_and_server_errors_are_counted(self):
+        def view(request):
+            list(Property.objects.all())
+            list(Organization.objects.all())
+            return HttpResponse(status=500)
+
+        profiling.ProfilingMiddleware(view)(self.factory.get('/'))
+        row = self.rows()[profiling.UNRESOLVED]
+        self.assertEqual((row['count'], row['errors'], row['queries']['max']), (1, 1, 2))
+
+    @override_settings(PROFILING_TRACE_SLOW_MS=1, PROFILING_TRACE_SAMPLE_RATE=1.0)
+    def test_slow_sampled_requests_keep_their_sql(self):
+        def view(request):
+            list(Property.objects.all())
+            time.sleep(0.005)
+            return HttpResponse()
+
+        profiling.ProfilingMiddleware(view)(self.factory.get('/slow/'))
+        [summary] = profiling.report()[1]
+        self.assertEqual(summary['path'], '/slow/')
+        self.assertIn('property_property', summary['trace'][0][1])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_profiling_records_nothing(self):
+        profiling.ProfilingMiddleware(lambda request: HttpResponse())(self.factory.get('/'))
+        self.assertEqual(self.rows(), {})
+
+    def test_report_merges_other_workers(self):
+        stats = profiling._empty_stats()
+        profiling._add(stats, {'wall_ms': 10, 'queries': 1, 'sql_ms': 1, 'bytes': 100}, False)
+        with mock.patch('community_connect.worker_state.process_id', return_value='other-host:1'):
+            profiling.recorder().shared.publish({'views': {'home': stats}, 'worst': []})
+        profiling.ProfilingMiddleware(lambda request: HttpResponse())(self.factory.get('/'))
+
+        rows, _, processes = profiling.report()
+        self.assertEqual(processes, 2)
+        self.assertEqual({row['name']: row['count'] for row in rows}, {'home': 1, profiling.UNRESOLVED: 1})
+
+    def test_performance_page_is_for_superusers_only(self):
+        pm = CustomUser.objects.create_user(username="pm", password="x", role='PM')
+        self.client.force_login(pm)
+        self.assertEqual(self.client.get('/app/super-admin/performance/').status_code, 302)
+        self.client.force_login(self.admin)
+        response = self.client.get('/app/super-admin/performance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['processes'], 1)
+
+
+# --- Worker snapshots and metrics (045) ---
+class WorkerStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @contextlib.contextmanager
+    def worker(self, name):
+        with mock.patch('community_connect.worker_state.process_id', return_value=name), \
+                mock.patch('community_connect.metrics.process_id', return_value=name):
+            yield
+
+    def fill_slots(self, published_at):
+        cache.set_many({
+            f"test:slot:{slot}": {'process': f"gone:{slot}", 'published_at': published_at, 'data': {}, 'base': None}
+            for slot in range(worker_state.MAX_WORKERS)
+        }, None)
+
+    def test_abandoned_slot_is_taken_over_cheaply(self):
+        self.fill_slots(time.time() - worker_state.HEARTBEAT_SECONDS - 1)
+        shared = worker_state.SharedSnapshots('test', timeout=None)
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            shared.publish({'n': 1})
+        self.assertEqual(add.call_count, 1)  # The reclaim lock only
+        mine = [entry for entry in shared.collect() if entry['process'] == worker_state.process_id()]
+        self.assertEqual([entry['data'] for entry in mine], [{'n': 1}])
+
+    def test_live_slots_are_left_alone(self):
+        self.fill_slots(time.time())
+        shared = worker_state.SharedSnapshots('test', timeout=None)
+        shared.publish({'n': 1})
+        self.assertIsNone(shared._slot)
+        self.assertNotIn(worker_state.process_id(), [entry['process'] for entry in shared.collect()])
+
+    @override_settings(METRICS_PUBLISH_SECONDS=0)
+    def test_stopped_workers_totals_never_drop_out_of_the_sum(self):
+        key = ('cc_signups_total', ())
+        registry = metrics.REGISTRY
+        with mock.patch.object(registry, 'values', {}), mock.patch.object(registry, 'shared', None):
+            with self.worker('old:1'):
+                metrics.SIGNUPS.inc(3)
+            # The old worker goes quiet and a new one takes its slot over.
+            with self.worker('new:1'), mock.patch.object(worker_state, 'HEARTBEAT_SECONDS', 0):
+                worker_state.SharedSnapshots('metrics', timeout=None, carry=metrics._carry).publish({key: 1})
+            with self.worker('old:1'):
+                self.assertEqual(registry.collect(), ({key: 4}, 2))
+                metrics.SIGNUPS.inc(2)
+                self.assertEqual(registry.collect(), ({key: 6}, 2))
+                self.assertIn('cc_signups_total 6\n', metrics.render())
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_scrape_needs_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE cc_signups_total counter', response.content.decode())
+
+
+# --- Slow query capture (046) ---
+capture_everything = override_settings(SLOW_QUERY_MS=0.000001)
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        slow_queries._log = None
+        self.addCleanup(setattr, slow_queries, '_log', None)
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+
+    def test_shape_folds_literals_and_placeholder_lists(self):
+        self.assertEqual(
+            slow_queries.shape_of("SELECT *  FROM t WHERE id = 7 AND name = 'O''Neil' AND x IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND x IN (...)",
+        )
+
+    def test_params_are_described_not_kept(self):
+        self.assertEqual(slow_queries.describe_params([1, "0712345678", "token"]), "3 params: int, str x2")
+        self.assertEqual(slow_queries.describe_params({'phone': "0712345678"}), "1 params: str")
+        self.assertIsNone(slow_queries.describe_params(()))
+
+    @capture_everything
+    def test_slow_statements_are_captured_without_their_values(self):
+        with self.assertLogs('community_connect.slow_queries', 'WARNING') as logs:
+            list(Property.objects.filter(name="0712345678", organization=self.org))
+        [entry] = [entry for entry in slow_queries.slow_query_log().snapshot() if 'property_property' in entry['shape']]
+        self.assertEqual(entry['params'], "2 params: str, int")
+        self.assertTrue(entry['plan'])  # SQLite's EXPLAIN QUERY PLAN
+        for text in (json.dumps(entry), *logs.output):
+            self.assertNotIn("0712345678", text)
+
+    def test_captures_name_the_view_and_group_by_shape(self):
+        pm = CustomUser.objects.create_user(username="pm", password="x", role='PM', organization=self.org)
+        Property.objects.create(name="Greenwood", organization=self.org)
+        self.client.force_login(pm)
+        with capture_everything, self.assertLogs('community_connect.slow_queries', 'WARNING'):
+            self.client.get('/app/finance/report/print/')
+            self.client.get('/app/finance/report/print/')
+        groups = [group for group in slow_queries.report() if group['latest']['view'] == 'property:financial_report_print']
+        self.assertTrue(groups)
+        self.assertTrue(all(group['count'] == 2 for group in groups))
+        self.assertTrue(any(group['latest']['caller'].startswith('property/') for group in groups))
+
+    def test_zero_threshold_turns_capture_off(self):
+        with self.settings(SLOW_QUERY_MS=0):
+            list(Property.objects.all())
+        self.assertEqual(slow_queries.slow_query_log().snapshot(), [])
+
+
+# --- Admin on large tables (050) ---
+@override_settings(ADMIN_COUNT_LIMIT=3)
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for n in range(5):
+            Organization.objects.create(name=f"Org {n}", is_active=n % 2 == 0)
+
+    def test_count_is_capped_without_statistics(self):
+        self.assertIsNone(estimated_rows(Organization, 'default'))  # SQLite keeps none
+        self.assertEqual(EstimatedCountPaginator(Organization.objects.order_by('pk'), 2).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Organization.objects.filter(is_active=True).order_by('pk'), 2).count, 3)
+
+    def test_unfiltered_list_takes_the_table_estimate(self):
+        with mock.patch('community_connect.paginators.estimated_rows', return_value=2_000_000):
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(Organization.objects.order_by('pk'), 100).num_pages, 20_000)
+            filtered = EstimatedCountPaginator(Organization.objects.filter(is_active=False).order_by('pk'), 100)
+            self.assertEqual(filtered.count, 2)
+
+    def test_estimate_below_the_cap_is_not_trusted(self):
+        with mock.patch('community_connect.paginators.estimated_rows', return_value=1):
+            self.assertEqual(EstimatedCountPaginator(Organization.objects.order_by('pk'), 2).count, 3)
+
+    def test_unit_change_list_never_counts_the_whole_table(self):
+        org = Organization.objects.first()
+        prop = Property.objects.create(name="Greenwood", organization=org)
+        admin = CustomUser.objects.create_superuser(username="root", email="root@example.com", password="x")
+        self.client.force_login(admin)
+
+        def change_list():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/admin/property/unit/').status_code, 200)
+            return [query['sql'] for query in queries]
+
+        Unit.objects.create(property=prop, block="A", floor="1", door_number="01")
+        change_list()  # Loads the cached principal
+        few = change_list()
+        for n in range(2, 8):
+            Unit.objects.create(property=prop, block="A", floor="1", door_number=f"0{n}")
+        many = change_list()
+        self.assertEqual(len(few), len(many))
+        counts = [sql for sql in many if 'COUNT(' in sql and 'property_unit' in sql]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT' in sql for sql in counts))
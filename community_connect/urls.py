@@ -6,6 +6,7 @@ from django.conf import settings
 # 1. Import Views from your apps
 from property.views import dashboard_redirect_view
 from users.views import splash_page_view  # <--- Import the splash view here
+from community_connect.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -21,6 +22,9 @@ urlpatterns = [
     
     # 5. APP URLS
     path('app/', include('property.urls')),
+
+    # 6. PROMETHEUS SCRAPE ENDPOINT
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Allow serving uploaded ID photos during development/demo
@@ -0,0 +1,107 @@
+"""
+Per-process state shared through the cache.
+
+Each gunicorn/uvicorn worker keeps its own counters in memory (no cross-
+process locking on the hot path) and periodically publishes a snapshot to a
+cache slot it has claimed. Readers collect every slot and merge them.
+
+A slot whose worker has not published for HEARTBEAT_SECONDS counts as
+abandoned and is handed to the next worker that needs one, so restarts
+never run the pool dry. Snapshots that must keep counting after their
+worker stops (metrics totals) pass ``carry``: the new owner folds the old
+snapshot into the slot's ``base``, and a worker that finds its slot taken
+over is asked to ``rebase`` its numbers onto what was carried off.
+With the default local-memory cache every worker only sees itself;
+point CACHE_BACKEND at a shared cache to see the whole deployment.
+"""
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+MAX_WORKERS = 64
+HEARTBEAT_SECONDS = 300
+# Backends whose contents other processes cannot see.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """Whether every worker process reads and writes the same cache."""
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def process_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedSnapshots:
+    def __init__(self, namespace, timeout, carry=None, rebase=None):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.carry = carry      # (base or None, data) -> new base
+        self.rebase = rebase    # data carried off -> this worker's fresh snapshot
+        self._slot = None
+        self._pid = None
+        self._last = None
+        self._lock = threading.Lock()
+
+    def _key(self, slot):
+        return f"{self.namespace}:slot:{slot}"
+
+    def is_live(self, entry, now=None):
+        return (now or time.time()) - entry['published_at'] < HEARTBEAT_SECONDS
+
+    def _claim(self, entry):
+        # One read to find a free or abandoned slot, then one add (two to take one over).
+        found = cache.get_many([self._key(slot) for slot in range(MAX_WORKERS)])
+        for slot in range(MAX_WORKERS):
+            key = self._key(slot)
+            current = found.get(key)
+            if current is None:
+                if cache.add(key, entry, self.timeout):
+                    return slot
+            elif not self.is_live(current) and cache.add(f"{key}:reclaim", entry['process'], HEARTBEAT_SECONDS):
+                try:
+                    current = cache.get(key)
+                    if current is None or not self.is_live(current):
+                        self._store(key, entry, current, taking_over=True)
+                        return slot
+                finally:
+                    cache.delete(f"{key}:reclaim")
+        return None
+
+    def _store(self, key, entry, previous, taking_over=False):
+        base = previous.get('base') if previous else None
+        if taking_over and self.carry is not None and previous is not None:
+            base = self.carry(base, previous['data'])
+        cache.set(key, {**entry, 'base': base}, self.timeout)
+
+    def publish(self, data):
+        """Stores this process's snapshot; claims a slot on first use, after a fork or once taken over."""
+        pid = process_id()
+        with self._lock:
+            if self._pid != pid:
+                self._slot, self._pid, self._last = None, pid, None
+            if self._slot is not None:
+                key = self._key(self._slot)
+                current = cache.get(key)
+                if current is None or current['process'] == pid:
+                    self._store(key, {'process': pid, 'published_at': time.time(), 'data': data}, current)
+                    self._last = data
+                    return
+                # Another worker took this slot over and carried our last snapshot into its base.
+                if self.carry is not None and self.rebase is not None and self._last is not None:
+                    data = self.rebase(self._last)
+            self._slot = self._claim({'process': pid, 'published_at': time.time(), 'data': data, 'base': None})
+            self._last = data if self._slot is not None else None
+
+    def collect(self):
+        """Every slot's latest snapshot, as ``[{'process', 'published_at', 'data', 'base'}]``."""
+        found = cache.get_many([self._key(slot) for slot in range(MAX_WORKERS)])
+        return sorted(found.values(), key=lambda entry: entry['process'])
@@ -1,51 +1,116 @@
 from django.contrib import admin
+
+from community_connect.paginators import EstimatedCountPaginator
 from .models import Property, Unit, Invoice, Ticket, Notification, ParkingLot, Announcement, PropertyStaff, ShortTermStay, VisitorLog
 
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Change lists for tables that grow to millions of rows: no exact COUNT(*)
+    per page (see community_connect/paginators.py), and searchable widgets
+    instead of dropdowns listing every unit or user.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PropertyListFilter(admin.SimpleListFilter):
+    # The stock related filter labels each property with a query for its organization.
+    title = 'property'
+    parameter_name = 'property__id__exact'
+
+    def lookups(self, request, model_admin):
+        return [(prop.pk, str(prop)) for prop in Property.objects.select_related('organization').order_by('name')]
+
+    def queryset(self, request, queryset):
+        return queryset.filter(property_id=self.value()) if self.value() else queryset
+
+
 # --- Staff Assignment Admin ---
 @admin.register(PropertyStaff)
 class PropertyStaffAdmin(admin.ModelAdmin):
     list_display = ('user', 'property', 'get_role')
+    list_select_related = ('user', 'property__organization')
     search_fields = ('user__username', 'property__name')
-    
+    autocomplete_fields = ('user', 'property')
+
+    @admin.display(description='Staff Role', ordering='user__role')
     def get_role(self, obj):
         return obj.user.get_role_display()
-    get_role.short_description = 'Staff Role'
 
 # --- Existing Admins ---
 
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
-    list_display = ('name', 'organization', 'total_units_count')
+    list_display = ('name', 'organization', 'unit_count', 'occupied_count')
+    list_select_related = ('organization',)
     search_fields = ('name', 'organization__name')
     list_filter = ('organization',)
 
 @admin.register(Unit)
-class UnitAdmin(admin.ModelAdmin):
+class UnitAdmin(LargeTableAdmin):
     list_display = ('unit_number', 'property', 'block', 'floor', 'owner', 'current_tenant')
-    list_filter = ('property', 'is_locked')
+    list_select_related = ('property__organization', 'owner', 'current_tenant')
+    list_filter = (PropertyListFilter, 'is_locked')
+    ordering = ('property', 'block', 'floor', 'door_number')
     search_fields = ('unit_number', 'property__name', 'current_tenant__username')
+    autocomplete_fields = ('property', 'owner', 'current_tenant')
+    raw_id_fields = ('organization_owner',)
+
+    def get_queryset(self, request):
+        # Unit.__str__ shows the property name (autocomplete results, form labels). The change
+        # list ignores list_select_related once the queryset has a select_related, so join it all here.
+        return super().get_queryset(request).select_related(*self.list_select_related)
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(LargeTableAdmin):
     list_display = ('id', 'unit', 'amount', 'due_date', 'is_paid', 'sender_role')
-    list_filter = ('is_paid', 'due_date', 'sender_role')
+    list_select_related = ('unit__property',)
+    list_filter = ('is_paid', 'sender_role')
     search_fields = ('unit__unit_number',)
+    date_hierarchy = 'due_date'
+    ordering = ('-due_date',)
+    autocomplete_fields = ('unit',)
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     list_display = ('title', 'unit', 'priority', 'status', 'created_at')
+    list_select_related = ('unit__property',)
     list_filter = ('status', 'priority')
+    autocomplete_fields = ('unit', 'submitted_by')
 
 @admin.register(VisitorLog)
-class VisitorLogAdmin(admin.ModelAdmin):
+class VisitorLogAdmin(LargeTableAdmin):
     list_display = ('visitor_name', 'unit', 'visitor_type', 'entry_time', 'is_active')
+    list_select_related = ('unit__property',)
     list_filter = ('visitor_type', 'is_active')
+    date_hierarchy = 'entry_time'
+    ordering = ('-entry_time',)
+    autocomplete_fields = ('unit', 'notified_tenant')
 
 @admin.register(ShortTermStay)
-class ShortTermStayAdmin(admin.ModelAdmin):
+class ShortTermStayAdmin(LargeTableAdmin):
     list_display = ('guest_name', 'unit', 'check_in_time', 'is_active')
+    list_select_related = ('unit__property',)
+    list_filter = ('is_active',)
+    date_hierarchy = 'check_in_time'
+    ordering = ('-check_in_time',)
+    autocomplete_fields = ('unit', 'checked_in_by', 'checked_out_by')
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('recipient', 'is_read', 'timestamp')
+    list_select_related = ('recipient',)
+    autocomplete_fields = ('recipient', 'sender')
+
+@admin.register(ParkingLot)
+class ParkingLotAdmin(admin.ModelAdmin):
+    list_display = ('lot_number', 'property', 'owner', 'current_tenant')
+    list_select_related = ('property__organization', 'owner', 'current_tenant')
+    autocomplete_fields = ('property', 'owner', 'current_tenant')
 
-# Register others simply
-admin.site.register(Announcement)
-admin.site.register(ParkingLot)
-admin.site.register(Notification)
\ No newline at end of file
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+    list_display = ('title', 'property', 'created_at', 'is_active')
+    list_select_related = ('property__organization',)
+    autocomplete_fields = ('property', 'posted_by')
@@ -0,0 +1,149 @@
+"""
+Gate traffic analytics.
+
+`rollup_hours` rebuilds GateTrafficHourly buckets for a window from the raw
+VisitorLog. `rollup_changes` runs every few minutes from cron (the
+`rollup_gate_traffic` command): it finds the rows written since its last run
+by their server-side ``updated_at`` and rebuilds every hour those rows count
+in, however old (a gate tablet replaying its offline queue writes entries
+hours or days in the past). The heatmap endpoint reads only the rollup, so its
+cost depends on the number of hours asked for, not on gate volume. Hours
+before the archive cutoff (archive.py) are never rebuilt: their raw rows are
+partly gone, so their buckets are the only complete record left.
+"""
+import datetime
+from collections import defaultdict
+
+from django.utils import timezone
+
+from community_connect import sharding
+
+from .archive import live_history_start
+from .models import GateTrafficHourly, RollupWatermark, VisitorLog
+
+HOUR = datetime.timedelta(hours=1)
+# Rows saved just before a run may commit just after it; re-read this much each time.
+CHANGE_OVERLAP = datetime.timedelta(minutes=5)
+
+
+def _hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_hours(start, end):
+    """
+    Recomputes every bucket whose hour falls in [start, end) on the bound shard,
+    skipping hours that may have been archived. Idempotent: the window's buckets
+    are replaced wholesale. Returns the bucket count.
+    """
+    start = max(_hour(start), _hour(live_history_start(sharding.current_shard())) + HOUR)
+    if start >= end:
+        return 0
+    buckets = defaultdict(lambda: [0, 0, 0, 0])  # entries, exits, dwell seconds, dwell samples
+    orgs = {}
+
+    entered = VisitorLog.objects.filter(entry_time__gte=start, entry_time__lt=end).values_list(
+        'organization_id', 'unit__property_id', 'visitor_type', 'entry_time', 'exit_time'
+    )
+    for org_id, property_id, visitor_type, entry_time, exit_time in entered.iterator(chunk_size=5000):
+        bucket = buckets[(property_id, _hour(entry_time), visitor_type)]
+        bucket[0] += 1
+        if exit_time:
+            bucket[2] += int((exit_time - entry_time).total_seconds())
+            bucket[3] += 1
+        orgs[property_id] = org_id
+
+    exited = VisitorLog.objects.filter(exit_time__gte=start, exit_time__lt=end).values_list(
+        'organization_id', 'unit__property_id', 'visitor_type', 'exit_time'
+    )
+    for org_id, property_id, visitor_type, exit_time in exited.iterator(chunk_size=5000):
+        buckets[(property_id, _hour(exit_time), visitor_type)][1] += 1
+        orgs[property_id] = org_id
+
+    rows = [
+        GateTrafficHourly(
+            organization_id=orgs[property_id], property_id=property_id, hour=hour, visitor_type=visitor_type,
+            entries=counts[0], exits=counts[1], dwell_seconds_total=counts[2], dwell_samples=counts[3],
+        )
+        for (property_id, hour, visitor_type), counts in buckets.items()
+    ]
+    with sharding.atomic():
+        GateTrafficHourly.objects.filter(hour__gte=start, hour__lt=end).delete()
+        GateTrafficHourly.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def touched_hours(since, until):
+    """Hours holding an entry or exit of a VisitorLog row written in [since, until)."""
+    hours = set()
+    changed = VisitorLog.objects.filter(updated_at__gte=since, updated_at__lt=until).values_list('entry_time', 'exit_time')
+    for entry_time, exit_time in changed.iterator(chunk_size=5000):
+        hours.add(_hour(entry_time))
+        if exit_time:
+            hours.add(_hour(exit_time))
+    return hours
+
+
+def _ranges(hours):
+    """Merges hours into [start, end) runs of consecutive hours."""
+    runs = []
+    for hour in sorted(hours):
+        if runs and runs[-1][1] == hour:
+            runs[-1][1] = hour + HOUR
+        else:
+            runs.append([hour, hour + HOUR])
+    return runs
+
+
+def rollup_changes(alias, initial_hours=48):
+    """
+    Rebuilds the buckets touched since the last run on shard ``alias`` and moves its
+    watermark. The first run rebuilds the trailing ``initial_hours`` instead.
+    Returns ``(buckets written, hours rebuilt)``.
+    """
+    now = timezone.now()
+    name = f"gate_traffic:{alias}"
+    watermark = RollupWatermark.objects.using(sharding.DEFAULT).filter(name=name).first()
+    with sharding.using_shard(alias):
+        if watermark is None:
+            runs, hours = [[now - datetime.timedelta(hours=initial_hours), now]], initial_hours
+        else:
+            touched = touched_hours(watermark.position - CHANGE_OVERLAP, now)
+            runs, hours = _ranges(touched), len(touched)
+        buckets = sum(rollup_hours(start, end) for start, end in runs)
+    RollupWatermark.objects.using(sharding.DEFAULT).update_or_create(name=name, defaults={'position': now})
+    return buckets, hours
+
+
+def heatmap(org, property_id=None, days=28):
+    """
+    Weekday x hour entry counts (local time), visitor-type mix and average dwell
+    for ``org`` over the last ``days`` days, read from the hourly rollup.
+    """
+    since = _hour(timezone.now() - datetime.timedelta(days=days))
+    rows = GateTrafficHourly.objects.filter(organization=org, hour__gte=since)
+    if property_id:
+        rows = rows.filter(property_id=property_id)
+
+    matrix = [[0] * 24 for _ in range(7)]
+    by_type = defaultdict(int)
+    dwell_total = dwell_samples = 0
+    for hour, visitor_type, entries, dwell_seconds, samples in rows.values_list(
+        'hour', 'visitor_type', 'entries', 'dwell_seconds_total', 'dwell_samples'
+    ):
+        local = timezone.localtime(hour)
+        matrix[local.weekday()][local.hour] += entries
+        by_type[visitor_type] += entries
+        dwell_total += dwell_seconds
+        dwell_samples += samples
+
+    peak_day, peak_hour = max(
+        ((d, h) for d in range(7) for h in range(24)), key=lambda dh: matrix[dh[0]][dh[1]]
+    )
+    return {
+        'days': days,
+        'matrix': matrix,  # matrix[weekday][hour], Monday = 0
+        'by_type': dict(by_type),
+        'average_dwell_minutes': round(dwell_total / dwell_samples / 60, 1) if dwell_samples else None,
+        'peak': {'weekday': peak_day, 'hour': peak_hour, 'entries': matrix[peak_day][peak_hour]},
+    }
@@ -0,0 +1,172 @@
+"""
+Gate history retention.
+
+Closed VisitorLog and ShortTermStay rows older than the retention window are
+copied into month-partitioned archive tables and deleted from the live tables
+in small chunks, so the active-visitor queries only ever scan recent rows.
+`search_visitor_history` / `search_stay_history` read both sides, so the
+history view does not care where a record currently lives. Each run's cutoff
+is recorded per shard; `live_history_start` tells jobs that rebuild from the
+live tables (analytics rollups) where the complete history begins.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from community_connect import sharding
+
+from .models import RollupWatermark, ShortTermStay, ShortTermStayArchive, Unit, VisitorLog, VisitorLogArchive
+
+SEARCH_LIMIT = 200
+
+
+def _month(value):
+    return value.date().replace(day=1)
+
+
+def archive_visitors(cutoff, chunk_size=1000):
+    """Moves closed visitor logs that ended before ``cutoff``. Returns the number moved."""
+    closed = VisitorLog.objects.filter(is_active=False).filter(
+        Q(exit_time__lt=cutoff) | Q(exit_time__isnull=True, entry_time__lt=cutoff)
+    )
+    moved = 0
+    while True:
+        with sharding.atomic():
+            batch = list(closed.select_related('unit').order_by('pk')[:chunk_size])
+            if not batch:
+                return moved
+            VisitorLogArchive.objects.bulk_create([
+                VisitorLogArchive(
+                    original_id=v.pk,
+                    organization_id=v.organization_id,
+                    month=_month(v.entry_time),
+                    unit_id=v.unit_id,
+                    unit_number=v.unit.unit_number,
+                    visitor_name=v.visitor_name,
+                    visitor_id_number=v.visitor_id_number,
+                    visitor_phone=v.visitor_phone,
+                    id_collected_at_gate=v.id_collected_at_gate,
+                    visitor_type=v.visitor_type,
+                    notified_tenant_id=v.notified_tenant_id,
+                    entry_time=v.entry_time,
+                    exit_time=v.exit_time,
+                    allowed_entry=v.allowed_entry,
+                    notes=v.notes,
+                ) for v in batch
+            ], ignore_conflicts=True)  # A chunk re-run after a crash is harmless
+            VisitorLog.objects.filter(pk__in=[v.pk for v in batch]).delete()
+        moved += len(batch)
+
+
+def archive_stays(cutoff, chunk_size=1000):
+    """Moves checked-out guest stays that ended before ``cutoff``. Returns the number moved."""
+    closed = ShortTermStay.objects.filter(is_active=False, check_out_time__lt=cutoff)
+    moved = 0
+    while True:
+        with sharding.atomic():
+            batch = list(closed.select_related('unit').order_by('pk')[:chunk_size])
+            if not batch:
+                return moved
+            ShortTermStayArchive.objects.bulk_create([
+                ShortTermStayArchive(
+                    original_id=s.pk,
+                    organization_id=s.organization_id,
+                    month=_month(s.check_in_time),
+                    unit_id=s.unit_id,
+                    unit_number=s.unit.unit_number,
+                    guest_name=s.guest_name,
+                    guest_id_number=s.guest_id_number,
+                    guest_phone=s.guest_phone,
+                    id_passport_image=s.id_passport_image.name or '',
+                    check_in_time=s.check_in_time,
+                    check_out_time=s.check_out_time,
+                    checked_in_by_id=s.checked_in_by_id,
+                    checked_out_by_id=s.checked_out_by_id,
+                    feedback_rating=s.feedback_rating,
+                    feedback_comment=s.feedback_comment,
+                ) for s in batch
+            ], ignore_conflicts=True)
+            ShortTermStay.objects.filter(pk__in=[s.pk for s in batch]).delete()
+        moved += len(batch)
+
+
+def record_cutoff(alias, cutoff):
+    """Remembers that closed history before ``cutoff`` may have left the live tables on ``alias``."""
+    watermark, created = RollupWatermark.objects.using(sharding.DEFAULT).get_or_create(
+        name=f"gate_archive:{alias}", defaults={'position': cutoff},
+    )
+    if not created and watermark.position < cutoff:
+        watermark.position = cutoff
+        watermark.save(update_fields=['position'])
+
+
+def live_history_start(alias):
+    """
+    From this instant on the live tables on ``alias`` still hold every visitor
+    log; earlier ones may already be archived (by a past run, or by the next one).
+    """
+    start = timezone.now() - datetime.timedelta(days=settings.GATE_HISTORY_RETENTION_DAYS)
+    archived = RollupWatermark.objects.using(sharding.DEFAULT).filter(
+        name=f"gate_archive:{alias}",
+    ).values_list('position', flat=True).first()
+    return max(start, archived) if archived else start
+
+
+def _day_range(start, end):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.datetime.combine(start, datetime.time.min), tz),
+        timezone.make_aware(datetime.datetime.combine(end, datetime.time.max), tz),
+    )
+
+
+def _merge(live, archived, time_field):
+    rows = [dict(r, archived=False) for r in live] + [dict(r, archived=True) for r in archived]
+    rows.sort(key=lambda r: r[time_field], reverse=True)
+    return rows[:SEARCH_LIMIT]
+
+
+def search_visitor_history(org, query, start, end):
+    """
+    Visitor records (live and archived) for ``org`` between two dates, newest first.
+    ``query`` matches visitor name, ID number, phone or exact unit number.
+    """
+    window = _day_range(start, end)
+    text = Q()
+    if query:
+        text = (Q(visitor_name__icontains=query) | Q(visitor_id_number__icontains=query)
+                | Q(visitor_phone__icontains=query))
+    fields = ('visitor_name', 'visitor_type', 'visitor_id_number', 'visitor_phone', 'entry_time', 'exit_time', 'notes')
+
+    live = VisitorLog.objects.filter(
+        text | Q(unit__unit_key=Unit.normalize_number(query)) if query else text,
+        organization=org, entry_time__range=window,
+    ).order_by('-entry_time').values(*fields, unit_number=F('unit__unit_number'))[:SEARCH_LIMIT]
+    # Only the month partitions overlapping the window are scanned.
+    archived = VisitorLogArchive.objects.filter(
+        text | Q(unit_number__iexact=query) if query else text,
+        organization=org, month__gte=start.replace(day=1), month__lte=end, entry_time__range=window,
+    ).order_by('-entry_time').values(*fields, 'unit_number')[:SEARCH_LIMIT]
+    return _merge(live, archived, 'entry_time')
+
+
+def search_stay_history(org, query, start, end):
+    """Guest stays (live and archived) for ``org`` checked in between two dates, newest first."""
+    window = _day_range(start, end)
+    text = Q()
+    if query:
+        text = (Q(guest_name__icontains=query) | Q(guest_id_number__icontains=query)
+                | Q(guest_phone__icontains=query))
+    fields = ('guest_name', 'guest_id_number', 'guest_phone', 'check_in_time', 'check_out_time', 'feedback_rating')
+
+    live = ShortTermStay.objects.filter(
+        text | Q(unit__unit_key=Unit.normalize_number(query)) if query else text,
+        organization=org, check_in_time__range=window,
+    ).order_by('-check_in_time').values(*fields, unit_number=F('unit__unit_number'))[:SEARCH_LIMIT]
+    archived = ShortTermStayArchive.objects.filter(
+        text | Q(unit_number__iexact=query) if query else text,
+        organization=org, month__gte=start.replace(day=1), month__lte=end, check_in_time__range=window,
+    ).order_by('-check_in_time').values(*fields, 'unit_number')[:SEARCH_LIMIT]
+    return _merge(live, archived, 'check_in_time')
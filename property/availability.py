@@ -0,0 +1,72 @@
+"""
+Short-term stay availability.
+
+A stay occupies its unit over [check_in_time, occupied_until), where
+occupied_until is the actual checkout, the planned checkout, or NULL for an
+open-ended stay; a guest still checked in after their planned checkout holds
+the unit until they actually leave. Two intervals overlap when each starts
+before the other ends, so every question below is a range filter on the
+(unit|organization, check_in_time, occupied_until) indexes. Units with a
+long-term tenant are never available.
+"""
+import datetime
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import ShortTermStay, Unit
+
+CHECKOUT_HOUR = 11  # Local time guests are expected out the next morning
+
+
+def _occupied_after(start):
+    """Filter for stays still holding their unit at ``start``, given they checked in before it."""
+    overdue = Q(is_active=True, check_out_time__isnull=True, occupied_until__lte=timezone.now())
+    return Q(occupied_until__gt=start) | Q(occupied_until__isnull=True) | overdue
+
+
+def overlapping(start, end):
+    """Filter for stays whose occupied interval intersects [start, end)."""
+    return Q(check_in_time__lt=end) & _occupied_after(start)
+
+
+def tonight():
+    """[now, tomorrow's checkout hour) in local time."""
+    now = timezone.localtime()
+    checkout = (now + datetime.timedelta(days=1)).replace(hour=CHECKOUT_HOUR, minute=0, second=0, microsecond=0)
+    return now, checkout
+
+
+def conflicting_stay(unit, start, end):
+    """The first stay on ``unit`` overlapping [start, end), or None. ``end`` None means open-ended."""
+    stays = ShortTermStay.objects.filter(unit=unit)
+    stays = stays.filter(overlapping(start, end) if end else _occupied_after(start))
+    return stays.order_by('check_in_time').first()
+
+
+def free_units(org, start, end, property_id=None):
+    """Units of ``org`` with no long-term tenant and no stay overlapping [start, end)."""
+    busy = ShortTermStay.objects.filter(overlapping(start, end), unit=OuterRef('pk'))
+    units = Unit.objects.filter(organization=org, current_tenant__isnull=True, is_locked=False)
+    if property_id:
+        units = units.filter(property_id=property_id)
+    return units.exclude(Exists(busy)).select_related('property').order_by('property__name', 'block', 'floor', 'door_number')
+
+
+def calendar(org, start, end, property_id=None):
+    """Stays of ``org`` overlapping [start, end), grouped by unit number, for a booking calendar."""
+    stays = ShortTermStay.objects.filter(overlapping(start, end), organization=org)
+    if property_id:
+        stays = stays.filter(unit__property_id=property_id)
+    by_unit = {}
+    for row in stays.order_by('check_in_time').values(
+        'id', 'unit_id', 'unit__unit_number', 'guest_name', 'check_in_time', 'occupied_until', 'is_active'
+    ):
+        by_unit.setdefault(row['unit__unit_number'], []).append({
+            'stay_id': row['id'],
+            'guest_name': row['guest_name'],
+            'start': row['check_in_time'].isoformat(),
+            'end': row['occupied_until'].isoformat() if row['occupied_until'] else None,
+            'active': row['is_active'],
+        })
+    return by_unit
@@ -0,0 +1,108 @@
+"""
+Monthly SaaS subscription billing (run daily by `run_subscription_billing`).
+
+Every active organization whose ``next_billing_date`` has arrived gets one
+SoftwareInvoice for that period, priced by the plan it is subscribed to (the
+tiers on the pricing page) using its maintained ``unit_count``, and its
+billing date moves on a month. Enterprise is a custom quote: those periods are
+reported for manual invoicing instead of being billed.
+Invoices are unique per organization and period, so re-running a day, or two
+runs overlapping, never bills anyone twice.
+"""
+import calendar
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from community_connect import sharding
+from users.middleware import organization_cache_key
+from users.models import Organization
+
+from .models import SoftwareInvoice
+
+# Plans invoiced by hand ("Custom Quote" on the pricing page).
+MANUAL_PLANS = {'ENTERPRISE'}
+
+
+def subscription_amount(plan, units):
+    if plan == 'STANDARD':
+        return Decimal(settings.SUBSCRIPTION_STANDARD_FEE)
+    return Decimal(settings.SUBSCRIPTION_PREMIUM_UNIT_PRICE) * units
+
+
+def add_month(day):
+    """Same day next month, clamped to the month's last day."""
+    year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _update_directory(org_ids, values, where=None):
+    """
+    Updates organizations on ``default`` (only rows still matching ``where``)
+    and their copies on the other shards, which bulk updates do not mirror.
+    Returns the number of rows changed on ``default``.
+    """
+    changed = Organization.objects.filter(pk__in=org_ids, **(where or {})).update(**values)
+    for alias in sharding.shard_aliases()[1:]:
+        Organization.objects.using(alias).filter(pk__in=org_ids).update(**values)
+    return changed
+
+
+def start_unscheduled(today):
+    """Active organizations that were never given a billing date start their cycle today."""
+    org_ids = list(Organization.objects.filter(is_active=True, next_billing_date__isnull=True).values_list('id', flat=True))
+    if org_ids:
+        _update_directory(org_ids, {'next_billing_date': today})
+        invalidate_organizations(org_ids)
+    return len(org_ids)
+
+
+def bill_due(today, dry_run=False):
+    """
+    Bills one period for every organization due on ``today``.
+    Returns ``(invoices, organizations advanced, manual)`` where ``manual`` lists the
+    ``(organization id, period)`` pairs on a custom-quote plan, which are not invoiced;
+    call again until nothing is due to catch up organizations that missed several months.
+    """
+    due = list(Organization.objects.filter(is_active=True, next_billing_date__lte=today)
+               .values_list('id', 'unit_count', 'subscription_plan', 'max_units', 'next_billing_date'))
+    if not due:
+        return [], 0, []
+
+    invoices, manual, limit_fixes, moves = [], [], defaultdict(list), defaultdict(list)
+    for org_id, units, plan, max_units, period in due:
+        moves[period].append(org_id)
+        limit = Organization.PLAN_UNIT_LIMITS.get(plan)
+        if limit is not None and max_units != limit:
+            limit_fixes[limit].append(org_id)  # Drift from bulk updates that bypassed save()
+        if plan in MANUAL_PLANS:
+            manual.append((org_id, period))
+            continue
+        invoices.append(SoftwareInvoice(
+            organization_id=org_id,
+            amount=subscription_amount(plan, units),
+            description=f"{period:%B %Y} Subscription ({plan.title()}, {units} units)",
+            due_date=period + datetime.timedelta(days=settings.SUBSCRIPTION_DUE_DAYS),
+            billing_period=period,
+        ))
+    if dry_run:
+        return invoices, len(due), manual
+
+    advanced = 0
+    with transaction.atomic():
+        SoftwareInvoice.objects.bulk_create(invoices, ignore_conflicts=True)
+        for limit, org_ids in limit_fixes.items():
+            _update_directory(org_ids, {'max_units': limit})
+        # Guarded by the old date, so an overlapping run cannot move an organization twice.
+        for period, org_ids in moves.items():
+            advanced += _update_directory(org_ids, {'next_billing_date': add_month(period)}, where={'next_billing_date': period})
+    invalidate_organizations([row[0] for row in due])
+    return invoices, advanced, manual
+
+
+def invalidate_organizations(org_ids):
+    cache.delete_many([organization_cache_key(org_id) for org_id in org_ids])
@@ -0,0 +1,89 @@
+"""
+Version-keyed caching for dashboards.
+
+Cached values are never deleted. Instead every key embeds the current version
+of the scopes it depends on (an organization, a user, or the whole platform),
+and signals bump those versions when the underlying rows change, so stale
+entries simply stop being asked for and age out. Versions start from a
+timestamp rather than 1, so a version key evicted from a local-memory cache
+can never come back at a value an old entry was stored under.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from community_connect import metrics, sharding
+
+PLATFORM = 'platform'
+
+
+def org_scope(org_id):
+    return f"org:{org_id}" if org_id else None
+
+
+def user_scope(user_id):
+    return f"user:{user_id}" if user_id else None
+
+
+def _key(scope):
+    return f"ver:{scope}"
+
+
+def versions(*scopes):
+    """Current version token for the given scopes (one cache round trip when warm)."""
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def _bump_now(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.set(_key(scope), time.time_ns(), None)
+
+
+def bump(*scopes):
+    """Invalidates everything cached under these scopes once the current transaction commits."""
+    scopes = {scope for scope in scopes if scope}
+    if scopes:
+        transaction.on_commit(lambda: _bump_now(scopes), using=sharding.current_shard())
+
+
+def _entry_key(name, scopes):
+    return f"dash:{name}:{'|'.join(scopes)}:{versions(*scopes)}"
+
+
+def cached(name, scopes, build, timeout=None):
+    """Returns ``build()``, cached until any of ``scopes`` is bumped (or ``timeout`` passes)."""
+    key = _entry_key(name, [scope for scope in scopes if scope])
+    value = cache.get(key)
+    metrics.cache_lookup('dashboard', value is not None)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout or getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 600))
+    return value
+
+
+async def acached(name, scopes, build, timeout=None):
+    """`cached` for async views: ``build`` is a coroutine function."""
+    key = await sync_to_async(_entry_key)(name, [scope for scope in scopes if scope])
+    value = await cache.aget(key)
+    metrics.cache_lookup('dashboard', value is not None)
+    if value is None:
+        value = await build()
+        await cache.aset(key, value, timeout or getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 600))
+    return value
+
+
+def fragment_version(*scopes):
+    """Token for `{% cache %}` fragments: pass it as a vary-on argument."""
+    return versions(*[scope for scope in scopes if scope])
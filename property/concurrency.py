@@ -0,0 +1,33 @@
+"""
+Concurrent ORM work for async views.
+
+`gather` runs independent blocking callables (aggregates, list queries) at the
+same time, each on its own worker thread and therefore its own database
+connection, so a dashboard waits for its slowest query rather than the sum of
+all of them. The callables inherit the caller's context, so shard binding and
+replica routing apply to them as usual.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def _run(call):
+    # Worker threads sit outside the request cycle, so they manage their own
+    # connection lifetime the way request_started/request_finished would.
+    close_old_connections()
+    try:
+        return call()
+    finally:
+        close_old_connections()
+
+
+async def gather(*calls):
+    """Runs ``calls`` (zero-argument callables) concurrently; returns their results in order."""
+    return await asyncio.gather(*(sync_to_async(_run, thread_sensitive=False)(call) for call in calls))
+
+
+async def run(call):
+    """Runs one blocking callable on a worker thread (see `gather`)."""
+    return await sync_to_async(_run, thread_sensitive=False)(call)
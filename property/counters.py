@@ -0,0 +1,186 @@
+"""
+Platform counters for the super-admin dashboard.
+
+Instead of counting organizations, landlords and properties and summing paid
+invoices across every shard on each page load, property/signals.py applies the
+change each save or delete makes to a few PlatformCounter rows (F() updates on
+``default``, after the triggering transaction commits). Per-organization
+rollups live under the organization's scope. `rebuild_platform_counters`
+recounts everything; build.sh runs it on each deploy to clear any drift from
+bulk updates that bypass signals.
+
+Unit counts are kept on the rows themselves (``Property.unit_count``,
+``occupied_count`` and ``Organization.unit_count``) so plan limits and admin
+lists never count units; `rebuild_unit_counts` recounts those.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils.functional import cached_property
+
+from community_connect import sharding
+
+from .cache import PLATFORM, org_scope
+
+# Platform scope: organizations, landlords, properties, revenue.
+# Organization scopes: members, properties, revenue.
+ORGANIZATIONS, LANDLORDS, PROPERTIES, REVENUE, MEMBERS = 'organizations', 'landlords', 'properties', 'revenue', 'members'
+
+
+def _apply(changes):
+    from .models import PlatformCounter
+    for (scope, name), delta in changes.items():
+        try:
+            PlatformCounter.objects.get_or_create(scope=scope, name=name)
+        except IntegrityError:
+            pass  # Created concurrently by another update
+        PlatformCounter.objects.filter(scope=scope, name=name).update(value=F('value') + delta)
+
+
+def adjust(changes, using='default'):
+    """
+    Adds ``{(scope, name): delta}`` to the counters once the current
+    transaction on ``using`` (the database the change was written to) commits.
+    """
+    changes = {key: Decimal(str(delta)) for key, delta in changes.items() if key[0] and delta}
+    if changes:
+        transaction.on_commit(lambda: _apply(changes), using=using)
+
+
+def forget(scope):
+    from .models import PlatformCounter
+    transaction.on_commit(lambda: PlatformCounter.objects.filter(scope=scope).delete())
+
+
+def read(scopes):
+    """``{scope: {name: value}}`` for the given scopes; missing counters read as 0."""
+    from .models import PlatformCounter
+    result = {scope: defaultdict(int) for scope in scopes}
+    for scope, name, value in PlatformCounter.objects.filter(scope__in=list(scopes)).values_list('scope', 'name', 'value'):
+        result[scope][name] = value if name == REVENUE else int(value)
+    return result
+
+
+class CountedPaginator(Paginator):
+    """Paginator whose total comes from a counter instead of a COUNT(*)."""
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        return self._known_count
+
+
+def recount():
+    """Every counter computed from the data, as ``{(scope, name): value}``."""
+    from users.models import CustomUser, Organization
+    from .models import Invoice, Property
+
+    values = {
+        (PLATFORM, ORGANIZATIONS): Organization.objects.count(),
+        (PLATFORM, LANDLORDS): CustomUser.objects.filter(role='HO').count(),
+    }
+    for org_id, members in CustomUser.objects.filter(organization__isnull=False).values_list('organization').annotate(n=Count('id')):
+        values[(org_scope(org_id), MEMBERS)] = members
+
+    # Each shard only counts the organizations it currently owns.
+    totals = defaultdict(Decimal)
+    for alias in sharding.shard_aliases():
+        properties = Property.objects.using(alias).filter(organization__shard=alias)
+        for org_id, count in properties.values_list('organization').annotate(n=Count('id')):
+            values[(org_scope(org_id), PROPERTIES)] = count
+            totals[PROPERTIES] += count
+        paid = Invoice.objects.using(alias).filter(is_paid=True, organization__shard=alias)
+        for org_id, revenue in paid.values_list('organization').annotate(total=Sum('amount')):
+            values[(org_scope(org_id), REVENUE)] = revenue or 0
+            totals[REVENUE] += revenue or 0
+    values[(PLATFORM, PROPERTIES)] = totals[PROPERTIES]
+    values[(PLATFORM, REVENUE)] = totals[REVENUE]
+    return values
+
+
+def rebuild(values=None):
+    """Replaces every counter with ``values`` (default: a fresh recount). Returns the number written."""
+    from .models import PlatformCounter
+    values = recount() if values is None else values
+    with transaction.atomic():
+        PlatformCounter.objects.all().delete()
+        PlatformCounter.objects.bulk_create(
+            PlatformCounter(scope=scope, name=name, value=value) for (scope, name), value in values.items()
+        )
+    return len(values)
+
+
+# --- Unit counters ---
+def count_units(property_id, organization_id, units=0, occupied=0, using='default'):
+    """
+    Adds to a property's unit and occupied counters (on ``using``, the shard the
+    unit was written to, inside its transaction) and to its organization's unit
+    counter on ``default`` and on the copy that shard holds.
+    """
+    from users.models import Organization
+    from .models import Property
+    if property_id and (units or occupied):
+        Property.objects.using(using).filter(pk=property_id).update(
+            unit_count=F('unit_count') + units, occupied_count=F('occupied_count') + occupied,
+        )
+    if organization_id and units:
+        for alias in {sharding.DEFAULT, using}:
+            Organization.objects.using(alias).filter(pk=organization_id).update(unit_count=F('unit_count') + units)
+
+
+def units_left(org_id):
+    """
+    How many more units the organization's plan allows. Locks its row on
+    ``default`` until the caller's transaction there ends, so concurrent
+    additions are checked one after another.
+    """
+    from users.models import Organization
+    org = Organization.objects.using(sharding.DEFAULT).select_for_update().only('unit_count', 'max_units').get(pk=org_id)
+    return max(org.max_units - org.unit_count, 0)
+
+
+def recount_units():
+    """
+    Unit counts computed from the data, as ``({(alias, property id): (units, occupied)},
+    {organization id: units})``. Each shard only counts the organizations it owns.
+    """
+    from .models import Unit
+    properties, organizations = {}, defaultdict(int)
+    for alias in sharding.shard_aliases():
+        rows = Unit.objects.using(alias).filter(organization__shard=alias).order_by() \
+            .values_list('organization', 'property') \
+            .annotate(n=Count('id'), occupied=Count('id', filter=Q(current_tenant__isnull=False)))
+        for org_id, property_id, units, occupied in rows:
+            properties[(alias, property_id)] = (units, occupied)
+            organizations[org_id] += units
+    return properties, organizations
+
+
+def rebuild_units(dry_run=False):
+    """Writes fresh unit counts where they have drifted. Returns ``(properties, organizations)`` corrected."""
+    from users.models import Organization
+    from .models import Property
+    properties, organizations = recount_units()
+    stale_properties = []
+    for alias in sharding.shard_aliases():
+        for pk, units, occupied in Property.objects.using(alias).filter(organization__shard=alias) \
+                .values_list('pk', 'unit_count', 'occupied_count').iterator():
+            fresh = properties.get((alias, pk), (0, 0))
+            if fresh != (units, occupied):
+                stale_properties.append((alias, pk, fresh))
+    stale_organizations = [
+        (pk, organizations.get(pk, 0)) for pk, units in Organization.objects.values_list('pk', 'unit_count').iterator()
+        if organizations.get(pk, 0) != units
+    ]
+    if not dry_run:
+        for alias, pk, (units, occupied) in stale_properties:
+            Property.objects.using(alias).filter(pk=pk).update(unit_count=units, occupied_count=occupied)
+        for pk, units in stale_organizations:
+            for alias in sharding.shard_aliases():
+                Organization.objects.using(alias).filter(pk=pk).update(unit_count=units)
+    return len(stale_properties), len(stale_organizations)
@@ -0,0 +1,261 @@
+"""
+PDF documents: tenant invoices and the monthly financial statement.
+
+Each document is first reduced to a plain "spec" (every value that appears on
+the page, already formatted). The spec's hash names the PDF in the cache and
+doubles as the HTTP ETag, so an unchanged invoice is rendered once and a
+repeat download can be answered with 304. Page chrome that only depends on
+the organization is drawn once per process and replayed as a raw fragment.
+"""
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import Expense, Invoice
+from .pdf import PAGE_HEIGHT, PAGE_WIDTH, Canvas, hex_color, wrap
+
+# Bump when a layout changes so cached PDFs are not served for the old one.
+LAYOUT_VERSION = 1
+MARGIN = 40
+
+NAVY = hex_color('#1e3a8a')
+LIGHT_BLUE = hex_color('#eff6ff')
+BLUE_BORDER = hex_color('#bfdbfe')
+GREY = hex_color('#6b7280')
+DARK = hex_color('#1f2937')
+PANEL = hex_color('#f8fafc')
+RULE = hex_color('#e5e7eb')
+GREEN = hex_color('#059669')
+RED = hex_color('#dc2626')
+WHITE = (255, 255, 255)
+
+
+def money(amount):
+    return f"{amount:,.2f}"
+
+
+def spec_digest(kind, spec):
+    payload = json.dumps([kind, LAYOUT_VERSION, spec], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cached_pdf(kind, spec, render):
+    """Returns ``(digest, pdf_bytes)``, rendering only when this exact spec is not cached."""
+    digest = spec_digest(kind, spec)
+    key = f"pdf:{kind}:{digest}"
+    content = cache.get(key)
+    if content is None:
+        content = render(spec)
+        cache.set(key, content, getattr(settings, 'PDF_CACHE_TIMEOUT', 60 * 60 * 24))
+    return digest, content
+
+
+# --- INVOICE ---
+def invoice_spec(invoice):
+    unit = invoice.unit
+    org = unit.property.organization
+    tenant = unit.current_tenant
+    return {
+        'org': [org.name, org.address, org.contact_email],
+        'number': f"INV-{invoice.id:05d}",
+        'account': f"INV-{invoice.id}",
+        'issued': invoice.due_date.strftime('%d %b, %Y'),
+        'due': invoice.due_date.strftime('%d %b, %Y'),
+        'paid': invoice.is_paid,
+        'tenant': [
+            f"{tenant.first_name} {tenant.last_name}".strip() if tenant else '',
+            tenant.email if tenant else '',
+            (tenant.phone_number or '') if tenant else '',
+        ],
+        'property': unit.property.name,
+        'unit': unit.unit_number,
+        'description': invoice.description,
+        'charge': f"{invoice.sender_role.title()} Charge",
+        'amount': money(invoice.amount),
+    }
+
+
+@functools.lru_cache(maxsize=256)
+def _invoice_chrome(org_name, address, email):
+    """Everything on an invoice that only depends on the organization."""
+    def draw(c):
+        c.rect(0, 0, PAGE_WIDTH, 10, fill=NAVY)
+        c.text(MARGIN, 60, org_name, size=18, bold=True, color=NAVY)
+        y = 78
+        for line in [*address.splitlines(), email, 'Kenya']:
+            if line.strip():
+                c.text(MARGIN, y, line.strip(), size=9, color=GREY)
+                y += 12
+        c.text(PAGE_WIDTH - MARGIN, 62, 'INVOICE', size=28, bold=True, color=NAVY, align='right')
+        for y, label in ((90, 'INVOICE NO:'), (106, 'DATE ISSUED:'), (122, 'DUE DATE:')):
+            c.text(PAGE_WIDTH - MARGIN - 110, y, label, size=8, bold=True, color=GREY, align='right')
+        c.line(MARGIN, 150, PAGE_WIDTH - MARGIN, 150, color=RULE, line_width=1.5)
+        c.text(MARGIN, 190, 'BILL TO:', size=8, bold=True, color=GREY)
+        c.rect(MARGIN, 300, PAGE_WIDTH - 2 * MARGIN, 28, fill=LIGHT_BLUE)
+        c.line(MARGIN, 328, PAGE_WIDTH - MARGIN, 328, color=BLUE_BORDER, line_width=1.5)
+        for x, label, align in ((MARGIN + 12, 'DESCRIPTION', 'left'), (340, 'QUANTITY', 'center'),
+                                (450, 'UNIT PRICE', 'right'), (PAGE_WIDTH - MARGIN - 12, 'TOTAL', 'right')):
+            c.text(x, 318, label, size=8, bold=True, color=NAVY, align=align)
+        # Footer band with payment instructions
+        c.rect(0, PAGE_HEIGHT - 110, PAGE_WIDTH, 110, fill=NAVY)
+        c.text(MARGIN, PAGE_HEIGHT - 80, 'PAYMENT INSTRUCTIONS', size=8, bold=True, color=BLUE_BORDER)
+        c.text(MARGIN, PAGE_HEIGHT - 62, 'Paybill Number', size=8, color=BLUE_BORDER)
+        c.text(MARGIN, PAGE_HEIGHT - 46, '247247', size=14, bold=True, color=WHITE)
+        c.text(MARGIN + 120, PAGE_HEIGHT - 62, 'Account Number', size=8, color=BLUE_BORDER)
+        c.text(PAGE_WIDTH - MARGIN, PAGE_HEIGHT - 62, 'Thank you for your business!', size=12, bold=True, color=WHITE, align='right')
+        if email:
+            c.text(PAGE_WIDTH - MARGIN, PAGE_HEIGHT - 46, f"Questions? Contact {email}", size=8, color=BLUE_BORDER, align='right')
+    return Canvas.fragment(draw)
+
+
+def render_invoice(spec):
+    c = Canvas()
+    c.raw(_invoice_chrome(*spec['org']))
+    right = PAGE_WIDTH - MARGIN
+    for y, value in ((90, spec['number']), (106, spec['issued']), (122, spec['due'])):
+        c.text(right, y, value, size=10, bold=True, color=RED if y == 122 else DARK, align='right')
+
+    stamp, color = ('PAID', GREEN) if spec['paid'] else ('UNPAID', RED)
+    c.rect(right - 110, 175, 110, 32, stroke=color, line_width=2)
+    c.text(right - 55, 197, stamp, size=16, bold=True, color=color, align='center')
+
+    name, email, phone = spec['tenant']
+    c.text(MARGIN, 210, name or '-', size=15, bold=True, color=DARK)
+    y = 228
+    for line in (f"Property: {spec['property']}", f"Unit: {spec['unit']}", email, phone):
+        if line:
+            c.text(MARGIN, y, line, size=10, color=DARK)
+            y += 14
+
+    y = 352
+    for line in wrap(spec['description'], 250, 10, bold=True):
+        c.text(MARGIN + 12, y, line, size=10, bold=True, color=DARK)
+        y += 13
+    c.text(MARGIN + 12, y, spec['charge'], size=8, color=GREY)
+    c.text(340, 352, '1', size=10, color=DARK, align='center')
+    c.text(450, 352, spec['amount'], size=10, color=DARK, align='right')
+    c.text(right - 12, 352, spec['amount'], size=10, bold=True, color=DARK, align='right')
+
+    top = max(y + 30, 420)
+    c.rect(right - 240, top, 240, 96, fill=PANEL)
+    c.text(right - 228, top + 24, 'Subtotal', size=10, color=GREY)
+    c.text(right - 12, top + 24, spec['amount'], size=10, bold=True, color=DARK, align='right')
+    c.text(right - 228, top + 44, 'Tax (0%)', size=10, color=GREY)
+    c.text(right - 12, top + 44, '0.00', size=10, color=DARK, align='right')
+    c.line(right - 228, top + 58, right - 12, top + 58, color=RULE, line_width=1.5)
+    c.text(right - 228, top + 80, 'Total Due', size=13, bold=True, color=NAVY)
+    c.text(right - 12, top + 80, f"KES {spec['amount']}", size=13, bold=True, color=NAVY, align='right')
+
+    c.text(MARGIN + 120, PAGE_HEIGHT - 46, spec['account'], size=14, bold=True, color=WHITE)
+    return c.to_bytes()
+
+
+def invoice_pdf(invoice):
+    """``(digest, pdf_bytes)`` for one invoice (expects unit, property, organization and tenant joined)."""
+    return cached_pdf('invoice', invoice_spec(invoice), render_invoice)
+
+
+def invoice_digest(invoice):
+    """The invoice PDF's ETag, from the joined rows alone: nothing is rendered or read from the cache."""
+    return spec_digest('invoice', invoice_spec(invoice))
+
+
+def invoice_queryset():
+    return Invoice.objects.select_related('unit__property__organization', 'unit__current_tenant')
+
+
+# --- MONTHLY FINANCIAL STATEMENT ---
+def monthly_statement(org, month, year):
+    """Income, expenditure and category breakdown for one month (shared by the HTML and PDF reports)."""
+    total_income = Invoice.objects.filter(
+        organization=org, is_paid=True, payment_date__month=month, payment_date__year=year
+    ).aggregate(Sum('amount'))['amount__sum'] or 0
+    expense_qs = Expense.objects.filter(organization=org, date_incurred__month=month, date_incurred__year=year)
+    total_expense = expense_qs.aggregate(Sum('amount'))['amount__sum'] or 0
+    return {
+        'total_income': total_income,
+        'total_expense': total_expense,
+        'net_profit': total_income - total_expense,
+        'expenses_breakdown': list(
+            expense_qs.values('category__name').annotate(total=Sum('amount')).order_by('-total')
+        ),
+    }
+
+
+def statement_spec(org, month, year, data, generated_on):
+    total_expense = data['total_expense']
+    return {
+        'org': org.name,
+        'period': f"{month}/{year}",
+        'generated': generated_on.strftime('%d %b %Y'),
+        'income': money(data['total_income']),
+        'expense': money(total_expense),
+        'net': money(data['net_profit']),
+        'rows': [
+            [row['category__name'] or 'Uncategorised', money(row['total']),
+             f"{round(row['total'] * 100 / total_expense) if total_expense else 0}%"]
+            for row in data['expenses_breakdown']
+        ],
+    }
+
+
+def render_statement(spec):
+    c = Canvas()
+    right = PAGE_WIDTH - MARGIN
+
+    def header():
+        c.text(PAGE_WIDTH / 2, 60, spec['org'], size=20, bold=True, align='center')
+        c.text(PAGE_WIDTH / 2, 80, 'Monthly Financial Statement', size=12, color=GREY, align='center')
+        c.line(MARGIN, 92, right, 92, line_width=1.5)
+
+    def table_head(y):
+        c.rect(MARGIN, y, right - MARGIN, 22, fill=hex_color('#f8f9fa'), stroke=RULE)
+        c.text(MARGIN + 8, y + 15, 'Category', size=10, bold=True)
+        c.text(right - 110, y + 15, 'Amount (KES)', size=10, bold=True, align='right')
+        c.text(right - 8, y + 15, '% of Total', size=10, bold=True, align='right')
+        return y + 22
+
+    header()
+    c.text(MARGIN, 115, f"Period: {spec['period']}", size=10, bold=True)
+    c.text(right, 115, f"Generated On: {spec['generated']}", size=10, align='right')
+
+    box = (right - MARGIN) / 3
+    for i, (label, value) in enumerate((('TOTAL REVENUE', spec['income']), ('TOTAL EXPENDITURE', spec['expense']),
+                                        ('NET SURPLUS/DEFICIT', spec['net']))):
+        x = MARGIN + i * box
+        c.rect(x + 4, 135, box - 8, 60, stroke=RULE)
+        c.text(x + box / 2, 157, label, size=8, color=GREY, align='center')
+        c.text(x + box / 2, 180, f"KES {value}", size=13, bold=True, align='center')
+
+    c.text(MARGIN, 230, 'Expenditure Breakdown', size=13, bold=True)
+    y = table_head(242)
+    for category, amount, share in spec['rows'] or [['No expenses recorded.', '', '']]:
+        if y > PAGE_HEIGHT - 100:
+            c.new_page()
+            header()
+            y = table_head(110)
+        c.rect(MARGIN, y, right - MARGIN, 22, stroke=RULE)
+        c.text(MARGIN + 8, y + 15, category, size=10)
+        c.text(right - 110, y + 15, amount, size=10, align='right')
+        c.text(right - 8, y + 15, share, size=10, align='right')
+        y += 22
+    c.rect(MARGIN, y, right - MARGIN, 22, fill=hex_color('#f8f9fa'), stroke=RULE)
+    c.text(MARGIN + 8, y + 15, 'TOTAL', size=10, bold=True)
+    c.text(right - 110, y + 15, spec['expense'], size=10, bold=True, align='right')
+    c.text(right - 8, y + 15, '100%', size=10, bold=True, align='right')
+
+    c.line(MARGIN, PAGE_HEIGHT - 60, right, PAGE_HEIGHT - 60, color=RULE)
+    footer = 'Generated by Communities Connect Property Management System.'
+    c.text(PAGE_WIDTH / 2, PAGE_HEIGHT - 44, footer, size=9, color=GREY, align='center')
+    return c.to_bytes()
+
+
+def statement_pdf(org, month, year, generated_on=None):
+    data = monthly_statement(org, month, year)
+    spec = statement_spec(org, month, year, data, generated_on or datetime.date.today())
+    return cached_pdf('statement', spec, render_statement)
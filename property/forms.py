@@ -1,24 +1,40 @@
 from django import forms
+from django.urls import reverse_lazy
+from django.utils import timezone
 from users.models import CustomUser
 from .models import Property, Unit, Announcement, Invoice, Ticket, ShortTermStay, MeterReading, Expense, PaymentConfiguration, ParkingLot
+from .unit_lookup import find_unit
 
 class CheckInForm(forms.ModelForm):
-    unit_number = forms.CharField(max_length=20, label="Unit Number", widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. A-104'}))
+    unit_number = forms.CharField(max_length=20, label="Unit Number", widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. A-104', 'data-unit-autocomplete': reverse_lazy('property:unit_autocomplete_api')}))
     class Meta:
         model = ShortTermStay
-        fields = ['guest_name', 'guest_id_number', 'guest_phone', 'id_passport_image']
+        fields = ['guest_name', 'guest_id_number', 'guest_phone', 'expected_check_out', 'id_passport_image']
         widgets = {
             'guest_name': forms.TextInput(attrs={'class': 'form-control'}),
             'guest_id_number': forms.TextInput(attrs={'class': 'form-control'}),
             'guest_phone': forms.TextInput(attrs={'class': 'form-control'}),
+            'expected_check_out': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
             'id_passport_image': forms.FileInput(attrs={'class': 'form-control'}),
         }
+
+    def __init__(self, *args, **kwargs):
+        self.org = kwargs.pop('org', None)
+        super().__init__(*args, **kwargs)
+
     def clean_unit_number(self):
         unit_num = self.cleaned_data.get('unit_number')
-        unit = Unit.objects.filter(unit_number__iexact=unit_num).first()
+        unit = find_unit(self.org, unit_num)
         if not unit: raise forms.ValidationError(f"Unit '{unit_num}' does not exist.")
+        if unit.current_tenant_id: raise forms.ValidationError(f"Unit '{unit.unit_number}' is let to a long-term tenant.")
         return unit
 
+    def clean_expected_check_out(self):
+        expected = self.cleaned_data.get('expected_check_out')
+        if expected and expected <= timezone.now():
+            raise forms.ValidationError("Planned checkout must be in the future.")
+        return expected
+
 class FeedbackForm(forms.ModelForm):
     class Meta:
         model = ShortTermStay
@@ -31,7 +47,7 @@ class FeedbackForm(forms.ModelForm):
 # --- NEW FINANCE FORMS ---
 
 class MeterReadingForm(forms.ModelForm):
-    unit_number = forms.CharField(max_length=20, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Unit No.'}))
+    unit_number = forms.CharField(max_length=20, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Unit No.', 'data-unit-autocomplete': reverse_lazy('property:unit_autocomplete_api')}))
     
     class Meta:
         model = MeterReading
@@ -40,13 +56,17 @@ class MeterReadingForm(forms.ModelForm):
             'current_reading': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'reading_image': forms.FileInput(attrs={'class': 'form-control'}),
         }
+
+    def __init__(self, *args, **kwargs):
+        self.org = kwargs.pop('org', None)
+        super().__init__(*args, **kwargs)
     
     def clean(self):
         cleaned_data = super().clean()
         unit_num = cleaned_data.get('unit_number')
         current = cleaned_data.get('current_reading')
         
-        unit = Unit.objects.filter(unit_number__iexact=unit_num).first()
+        unit = find_unit(self.org, unit_num)
         if not unit:
             raise forms.ValidationError("Unit not found.")
             
@@ -135,10 +155,14 @@ class InvoiceCreationForm(forms.ModelForm):
             'due_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'description': forms.TextInput(attrs={'class': 'form-control'}),
         }
+
+    def __init__(self, *args, **kwargs):
+        self.org = kwargs.pop('org', None)
+        super().__init__(*args, **kwargs)
     
     def clean_unit_number(self):
         unit_num = self.cleaned_data.get('unit_number')
-        unit = Unit.objects.filter(unit_number__iexact=unit_num).first()
+        unit = find_unit(self.org, unit_num)
         if not unit: raise forms.ValidationError("Unit not found.")
         return unit
 
@@ -0,0 +1,112 @@
+"""
+Live security desk board.
+
+The desk page renders the active visitor list once; afterwards the browser asks
+for changes since its last cursor and patches the table in place. Cursors are
+ISO timestamps taken before the queries run and are compared with each row's
+server-side ``updated_at``, never the device-supplied entry/exit times. Each
+poll overlaps the previous window by CURSOR_OVERLAP so rows committed a moment
+late are not lost (clients de-duplicate by visitor id).
+
+Under ASGI the desk subscribes to `stream` (server-sent events) instead, which
+runs the same delta query on the server every STREAM_INTERVAL and pushes only
+non-empty changes; the event id is the cursor, so a reconnecting browser
+resumes where it left off.
+"""
+import asyncio
+import datetime
+import json
+
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from community_connect import sharding
+
+from . import concurrency
+from .models import VisitorLog
+
+CURSOR_OVERLAP = datetime.timedelta(seconds=2)
+STREAM_INTERVAL = 3  # seconds between server-side checks
+STREAM_LIFETIME = 300  # seconds before the browser is asked to reconnect
+BOARD_FIELDS = ('id', 'visitor_name', 'visitor_type', 'entry_time', 'id_collected_at_gate', 'visitor_id_number', 'unit__unit_number')
+
+
+def active_visitors(org):
+    """The board's initial state: every visitor currently inside, with their unit joined in."""
+    return list(
+        VisitorLog.objects.filter(organization=org, is_active=True)
+        .select_related('unit')
+        .order_by('-entry_time')
+    )
+
+
+def serialize_row(row):
+    return {
+        'id': row['id'],
+        'visitor_name': row['visitor_name'],
+        'visitor_type': row['visitor_type'],
+        'unit_number': row['unit__unit_number'],
+        'entry_time': row['entry_time'].isoformat(),
+        'id_collected': row['id_collected_at_gate'],
+        'id_number': row['visitor_id_number'] if row['id_collected_at_gate'] else '',
+        'exit_url': reverse('property:exit_visitor', args=[row['id']]),
+    }
+
+
+def parse_cursor(value):
+    """An aware datetime from an ISO string; None when missing or malformed."""
+    try:
+        since = parse_datetime(value) if isinstance(value, str) and value else None
+    except ValueError:
+        return None  # Well-formed but impossible, e.g. month 13
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since, datetime.timezone.utc)
+    return since
+
+
+def board_changes(org, since):
+    """
+    Returns ``(cursor, entered, exited)`` for everything that happened after ``since``.
+    ``entered`` are serialized rows still inside; ``exited`` are visitor ids to drop.
+    """
+    cursor = timezone.now()
+    window_start = since - CURSOR_OVERLAP
+    # Keyed on the server's write time: a device replaying its offline queue writes
+    # entry and exit times that can be hours older than the cursor.
+    entered = [
+        serialize_row(row) for row in
+        VisitorLog.objects.filter(organization=org, is_active=True, updated_at__gt=window_start)
+        .order_by('entry_time').values(*BOARD_FIELDS)
+    ]
+    exited = list(
+        VisitorLog.objects.filter(organization=org, is_active=False, updated_at__gt=window_start).values_list('id', flat=True)
+    )
+    return cursor, entered, exited
+
+
+def full_board(org):
+    """Same shape as board_changes, but carrying every visitor currently inside."""
+    cursor = timezone.now()
+    entered = [
+        serialize_row(row) for row in
+        VisitorLog.objects.filter(organization=org, is_active=True).order_by('entry_time').values(*BOARD_FIELDS)
+    ]
+    return cursor, entered, []
+
+
+async def stream(org, since, shard):
+    """Server-sent events with board deltas; ends after STREAM_LIFETIME (EventSource reconnects)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_LIFETIME
+    yield f"retry: {STREAM_INTERVAL * 1000}\n\n"
+    while loop.time() < deadline:
+        with sharding.using_shard(shard, org.id):
+            cursor, entered, exited = await concurrency.run(lambda: board_changes(org, since))
+        since = cursor
+        if entered or exited:
+            payload = {'cursor': cursor.isoformat(), 'entered': entered, 'exited': exited}
+            yield f"id: {cursor.isoformat()}\ndata: {json.dumps(payload)}\n\n"
+        else:
+            yield ": idle\n\n"  # Keeps proxies from closing a quiet connection
+        await asyncio.sleep(STREAM_INTERVAL)
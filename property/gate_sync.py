@@ -0,0 +1,200 @@
+"""
+Batch ingest for gate devices.
+
+A gate tablet keeps working offline by queueing visitor events locally, each
+tagged with a client-generated key (a UUID). When it reconnects it replays the
+whole queue in one request:
+
+    POST /app/api/gate/sync/
+    {
+      "since": "<cursor from the previous sync, optional>",
+      "events": [
+        {"key": "…", "type": "entry", "unit_number": "A-104", "visitor_name": "…",
+         "visitor_id": "…", "visitor_phone": "…", "visitor_type": "DELIVERY",
+         "id_collected": true, "action": "ALLOW", "occurred_at": "<ISO time>"},
+        {"key": "…", "type": "exit", "entry_key": "<key of the entry>", "occurred_at": "…"},
+        {"key": "…", "type": "exit", "visitor_id": 123}
+      ]
+    }
+
+Replaying a batch is safe: entries whose key already exists are reported as
+"duplicate" (also when a concurrent replay of the same queue inserted it
+first) and exits of visitors who already left are no-ops. Malformed events get
+an "error" result of their own without failing the rest of the batch. The response
+carries a per-event status plus the board delta since ``since`` (see
+gate_board.py) and a new cursor, so the device's view of who is inside catches
+up in the same round trip.
+"""
+from django.db import IntegrityError
+from django.utils import timezone
+
+from community_connect import metrics, sharding
+
+from . import gate_board
+from .models import Notification, VisitorLog
+from .unit_lookup import lookup_unit
+
+MAX_EVENTS = 500
+VISITOR_TYPES = {code for code, _ in VisitorLog.VISITOR_TYPES}
+TEXT_FIELDS = {
+    'entry': ('unit_number', 'visitor_name', 'visitor_id', 'visitor_phone', 'visitor_type', 'action', 'occurred_at'),
+    'exit': ('entry_key', 'occurred_at'),
+}
+
+
+def _occurred_at(event):
+    when = gate_board.parse_cursor(event.get('occurred_at'))
+    now = timezone.now()
+    # Never trust a device clock that runs ahead of ours.
+    return min(when, now) if when else now
+
+
+def _problem(event):
+    """Why ``event`` cannot be applied, or None. Exit ``visitor_id`` is normalized to an int."""
+    for name in TEXT_FIELDS[event['type']]:
+        if event.get(name) is not None and not isinstance(event[name], str):
+            return f"{name} must be a string."
+    if event.get('occurred_at') and gate_board.parse_cursor(event['occurred_at']) is None:
+        return "occurred_at must be an ISO timestamp."
+    if event['type'] == 'entry':
+        return None if event.get('unit_number') else "unit_number is required."
+    if event.get('entry_key'):
+        return None
+    visitor_id = event.get('visitor_id')
+    if isinstance(visitor_id, str) and visitor_id.isdigit():
+        visitor_id = event['visitor_id'] = int(visitor_id)
+    if isinstance(visitor_id, bool) or not isinstance(visitor_id, int):
+        return "An exit needs an entry_key or a numeric visitor_id."
+    return None
+
+
+def _insert(logs):
+    """
+    Inserts ``logs`` and returns the client keys actually written. A concurrent
+    replay of the same queue may have inserted some first; those rows are
+    retried one by one and left out.
+    """
+    try:
+        with sharding.atomic():
+            VisitorLog.objects.bulk_create(logs)
+        return {log.client_key for log in logs}
+    except IntegrityError:
+        pass
+    inserted = set()
+    for log in logs:
+        try:
+            with sharding.atomic():
+                VisitorLog.objects.bulk_create([log])
+            inserted.add(log.client_key)
+        except IntegrityError:
+            pass
+    return inserted
+
+
+def apply_events(org, user, events):
+    """Applies a device's queued events. Returns one result dict per event, in order."""
+    results = [None] * len(events)
+    entries, exits = [], []
+
+    for pos, event in enumerate(events):
+        key = str(event.get('key') or '')[:64] if isinstance(event, dict) else ''
+        if not key:
+            results[pos] = {'key': key, 'status': 'error', 'message': 'Each event needs a key.'}
+        elif event.get('type') not in TEXT_FIELDS:
+            results[pos] = {'key': key, 'status': 'error', 'message': 'Unknown event type.'}
+        elif (problem := _problem(event)) is not None:
+            results[pos] = {'key': key, 'status': 'error', 'message': problem}
+        elif event['type'] == 'entry':
+            entries.append((pos, key, event))
+        else:
+            exits.append((pos, key, event))
+
+    with sharding.atomic():
+        known = dict(VisitorLog.objects.filter(
+            organization=org, client_key__in=[key for _, key, _ in entries]
+        ).values_list('client_key', 'id'))
+
+        new_logs, alerts, pending = [], {}, []
+        for pos, key, event in entries:
+            if key in known:
+                results[pos] = {'key': key, 'status': 'duplicate', 'visitor_id': known[key]}
+                continue
+            found = lookup_unit(org.pk if org else None, event.get('unit_number'))
+            if not found:
+                results[pos] = {'key': key, 'status': 'error', 'message': f"Unit {event.get('unit_number')} not found."}
+                continue
+            unit_id, tenant_id = found
+            visitor_type = event.get('visitor_type') if event.get('visitor_type') in VISITOR_TYPES else 'SOCIAL'
+            allowed = event.get('action', 'ALLOW') == 'ALLOW'
+            name = str(event.get('visitor_name') or '')[:100]
+            known[key] = None  # Repeated key later in the same batch counts as a duplicate
+            new_logs.append(VisitorLog(
+                unit_id=unit_id,
+                organization=org,
+                client_key=key,
+                visitor_name=name,
+                visitor_id_number=event.get('visitor_id') or None,
+                visitor_phone=event.get('visitor_phone') or None,
+                id_collected_at_gate=bool(event.get('id_collected')),
+                visitor_type=visitor_type,
+                notified_tenant_id=tenant_id,
+                entry_time=_occurred_at(event),
+                allowed_entry=allowed,
+                notes="Sent up" if allowed else "Waiting at gate",
+                is_active=allowed,
+            ))
+            pending.append((pos, key))
+            if tenant_id:
+                alerts[key] = Notification(
+                    recipient_id=tenant_id, message=f"{visitor_type}: {name} is at gate.", sender=user
+                )
+
+        # Only rows this request wrote notify tenants and count as logged.
+        inserted = _insert(new_logs) if new_logs else set()
+        notifications = [alert for key, alert in alerts.items() if key in inserted]
+        Notification.objects.bulk_create(notifications)
+
+        created = dict(VisitorLog.objects.filter(
+            organization=org, client_key__in=[key for _, key in pending]
+        ).values_list('client_key', 'id'))
+        if inserted:
+            metrics.VISITORS_LOGGED.inc(len(inserted), source='gate_sync')
+            metrics.NOTIFICATION_FANOUT.observe(len(notifications), event='gate_sync')
+        for pos, key in pending:
+            status = 'created' if key in inserted else 'duplicate'
+            results[pos] = {'key': key, 'status': status, 'visitor_id': created.get(key)}
+            known[key] = created.get(key)
+        for result in results:
+            if result and result['status'] == 'duplicate' and result.get('visitor_id') is None:
+                result['visitor_id'] = known.get(result['key'])
+
+        # Exits may reference an entry from this same batch by its key.
+        exit_ids = {}
+        for pos, key, event in exits:
+            entry_key = event.get('entry_key')
+            visitor_id = known.get(entry_key) if entry_key else event.get('visitor_id')
+            if entry_key and visitor_id is None:
+                visitor_id = VisitorLog.objects.filter(organization=org, client_key=entry_key).values_list('id', flat=True).first()
+            exit_ids[pos] = visitor_id
+
+        to_close = {
+            v.pk: v for v in VisitorLog.objects.select_for_update().filter(
+                organization=org, pk__in=[vid for vid in exit_ids.values() if vid]
+            )
+        }
+        closed = []
+        for pos, key, event in exits:
+            visitor = to_close.get(exit_ids[pos])
+            if visitor is None:
+                results[pos] = {'key': key, 'status': 'error', 'message': 'Visitor not found.'}
+            elif not visitor.is_active:
+                results[pos] = {'key': key, 'status': 'duplicate', 'visitor_id': visitor.pk}
+            else:
+                visitor.is_active = False
+                visitor.exit_time = max(_occurred_at(event), visitor.entry_time)
+                visitor.updated_at = timezone.now()  # bulk_update skips auto_now
+                closed.append(visitor)
+                results[pos] = {'key': key, 'status': 'applied', 'visitor_id': visitor.pk}
+        VisitorLog.objects.bulk_update(closed, ['is_active', 'exit_time', 'updated_at'])
+
+    return results
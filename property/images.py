@@ -0,0 +1,209 @@
+"""
+Uploaded photo ingestion.
+
+Uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE stream to a temp file and are
+saved untouched, so the request only pays for a file copy. Saving an owner
+record queues an ImageRendition; a background worker (an in-process thread
+after commit, plus `process_images` for anything left over) then:
+
+  * decodes the photo at reduced scale, applies the EXIF rotation and drops
+    all metadata (GPS, device serials),
+  * writes a display JPEG no larger than IMAGE_DISPLAY_MAX_SIDE and a
+    thumbnail no larger than IMAGE_THUMBNAIL_MAX_SIDE,
+  * points the owner's field at the display copy and deletes the original.
+
+List pages call `attach_thumbnails` once per page instead of loading photos.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from community_connect import sharding
+
+from .models import ImageRendition
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# Owner models and their photo fields.
+IMAGE_FIELDS = {
+    'property.ShortTermStay': 'id_passport_image',
+    'property.MeterReading': 'reading_image',
+    'property.Expense': 'receipt_image',
+}
+
+_executor = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# --- Queueing ---
+def enqueue(instance, field_name):
+    """Queues the photo in ``instance.<field_name>`` unless it is already known."""
+    name = getattr(instance, field_name).name
+    if not name or ImageRendition.objects.filter(source=name).exists():
+        return
+    ImageRendition.objects.get_or_create(source=name, defaults={
+        'model_label': instance._meta.label,
+        'object_id': instance.pk,
+        'field_name': field_name,
+    })
+    if _setting('IMAGE_PROCESS_IN_BACKGROUND', True):
+        # After the owner's transaction (it may be on a shard), or the worker would not see the row yet.
+        transaction.on_commit(_kick, using=instance._state.db)
+
+
+def _kick():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='images')
+    _executor.submit(_drain)
+
+
+def _drain():
+    try:
+        process_pending()
+    except Exception:
+        logger.exception("Image worker failed")
+    finally:
+        close_old_connections()
+
+
+# --- Processing ---
+def _claim():
+    """Atomically moves one pending rendition to PROCESSING; returns it or None."""
+    for rendition_id in ImageRendition.objects.filter(status='PENDING').order_by('created_at').values_list('id', flat=True)[:10]:
+        if ImageRendition.objects.filter(id=rendition_id, status='PENDING').update(status='PROCESSING'):
+            return ImageRendition.objects.get(id=rendition_id)
+    return None
+
+
+def process_pending(limit=None):
+    """Processes queued renditions until none are left (or ``limit`` is hit). Returns the count."""
+    done = 0
+    while limit is None or done < limit:
+        rendition = _claim()
+        if rendition is None:
+            break
+        process(rendition)
+        done += 1
+    return done
+
+
+def _encode(image, max_side):
+    copy = image.copy()
+    copy.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    # No exif/icc arguments: the re-encoded file carries no metadata.
+    copy.save(buffer, 'JPEG', quality=_setting('IMAGE_JPEG_QUALITY', 80), optimize=True, progressive=True)
+    return copy.size, buffer.getvalue()
+
+
+def _open(name, max_side):
+    with default_storage.open(name, 'rb') as fh:
+        image = Image.open(fh)
+        # JPEGs decode directly at a reduced scale, which is most of the cost for phone photos.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            flat = Image.new('RGB', image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel('A'))
+            image = flat
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.load()
+    return image
+
+
+def process(rendition):
+    """Renders one upload. Failures are recorded on the rendition and retried up to MAX_ATTEMPTS."""
+    original = rendition.source
+    display_side = _setting('IMAGE_DISPLAY_MAX_SIDE', 1600)
+    try:
+        original_bytes = default_storage.size(original)
+        image = _open(original, display_side)
+        (width, height), display = _encode(image, display_side)
+        (thumb_w, thumb_h), thumb = _encode(image, _setting('IMAGE_THUMBNAIL_MAX_SIDE', 320))
+    except Exception as exc:
+        rendition.attempts += 1
+        rendition.status = 'FAILED' if rendition.attempts >= MAX_ATTEMPTS else 'PENDING'
+        rendition.error = str(exc)[:255]
+        rendition.save(update_fields=['attempts', 'status', 'error'])
+        logger.warning("Could not process %s: %s", original, exc)
+        return rendition
+
+    stem = os.path.splitext(original)[0]
+    display_name = default_storage.save(f"{stem}.display.jpg", ContentFile(display))
+    thumb_name = default_storage.save(f"thumbs/{stem}.jpg", ContentFile(thumb))
+
+    with transaction.atomic():
+        # Repoint every record still holding this upload (identical uploads share one stored file),
+        # on every shard since the blob store is shared.
+        swapped = sum(
+            apps.get_model(label)._base_manager.using(alias).filter(**{field_name: original}).update(**{field_name: display_name})
+            for label, field_name in IMAGE_FIELDS.items()
+            for alias in sharding.shard_aliases()
+        )
+        if swapped > 1 and hasattr(default_storage, 'transfer_references'):
+            default_storage.transfer_references(original, display_name, swapped - 1)
+        # Identical photos render to the same stored blob; the existing record already describes it.
+        twin = ImageRendition.objects.filter(source=display_name).exclude(pk=rendition.pk).first() if swapped else None
+        if twin:
+            rendition.delete()
+    if twin:
+        default_storage.delete(original)
+        default_storage.delete(thumb_name)
+        return twin
+    with transaction.atomic():
+        rendition.source = display_name if swapped else original
+        rendition.status = 'DONE'
+        rendition.error = ''
+        rendition.original_bytes = original_bytes
+        rendition.width, rendition.height = width, height
+        rendition.display_bytes = len(display)
+        rendition.thumbnail = thumb_name if swapped else ''
+        rendition.thumbnail_width, rendition.thumbnail_height = thumb_w, thumb_h
+        rendition.thumbnail_bytes = len(thumb)
+        rendition.processed_at = timezone.now()
+        rendition.save()
+    if swapped:
+        default_storage.delete(original)
+    else:
+        # Replaced or deleted while queued: keep the record, drop the renders.
+        default_storage.delete(display_name)
+        default_storage.delete(thumb_name)
+    return rendition
+
+
+# --- Reading ---
+def attach_thumbnails(objects, field_name):
+    """
+    Sets ``thumbnail_url`` on each object (one query for the whole page). Falls back
+    to the full image while a photo is still queued, and to None when there is none.
+    """
+    objects = list(objects)
+    names = {getattr(obj, field_name).name for obj in objects if getattr(obj, field_name)}
+    thumbs = dict(
+        ImageRendition.objects.filter(source__in=names, status='DONE').values_list('source', 'thumbnail')
+    ) if names else {}
+    for obj in objects:
+        image = getattr(obj, field_name)
+        if not image:
+            obj.thumbnail_url = None
+        elif image.name in thumbs:
+            obj.thumbnail_url = default_storage.url(thumbs[image.name])
+        else:
+            obj.thumbnail_url = image.url
+    return objects
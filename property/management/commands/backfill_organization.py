@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from property.models import Expense, Invoice, Property, ShortTermStay, Unit, VisitorLog
+
+
+class Command(BaseCommand):
+    help = "Backfills the denormalized organization column on Invoice, VisitorLog, ShortTermStay and Expense in primary-key chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        chunk = options['chunk_size']
+        via_unit = Subquery(Unit.objects.filter(pk=OuterRef('unit_id')).values('property__organization_id')[:1])
+        via_property = Subquery(Property.objects.filter(pk=OuterRef('property_id')).values('organization_id')[:1])
+
+        for model, source in [(Invoice, via_unit), (VisitorLog, via_unit), (ShortTermStay, via_unit), (Expense, via_property)]:
+            last_id = model.objects.aggregate(Max('pk'))['pk__max'] or 0
+            updated = 0
+            # Walk the table in fixed pk windows so each UPDATE holds its locks briefly.
+            for start in range(0, last_id + 1, chunk):
+                with transaction.atomic():
+                    updated += model.objects.filter(
+                        pk__gte=start, pk__lt=start + chunk, organization__isnull=True
+                    ).update(organization_id=source)
+            self.stdout.write(f"{model.__name__}: {updated} rows backfilled.")
+
+        self.stdout.write(self.style.SUCCESS("Organization backfill complete."))
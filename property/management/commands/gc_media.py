@@ -0,0 +1,121 @@
+import datetime
+import os
+from collections import Counter
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from community_connect import sharding
+from property.models import ImageRendition, MediaBlob
+from property.storage import BLOB_PREFIX, EXTRA_REFERENCES, INCOMING_PREFIX, is_blob
+
+
+def reference_columns():
+    """(model, field name) for every column that stores a media file name."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field.name
+    for label, field_name in EXTRA_REFERENCES:
+        yield apps.get_model(label), field_name
+
+
+class Command(BaseCommand):
+    help = "Recounts media blob references and deletes blobs nothing points at."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help="Keep unreferenced blobs touched more recently than this (uploads still in flight).")
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help="Move files saved under the old dated paths into the blob store first.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - datetime.timedelta(hours=options['grace_hours'])
+
+        if options['adopt_legacy']:
+            self.adopt_legacy(dry_run)
+
+        counts = Counter()
+        for model, field_name in reference_columns():
+            # Sharded tables are counted on every shard; directory copies are not.
+            for alias in (sharding.shard_aliases() if sharding.is_sharded(model) else ['default']):
+                names = model._base_manager.using(alias).exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                counts.update(name for name in names.values_list(field_name, flat=True).iterator() if is_blob(name))
+
+        corrected, doomed = 0, []
+        for blob in MediaBlob.objects.iterator():
+            actual = counts.get(blob.name, 0)
+            if actual != blob.refcount:
+                corrected += 1
+                if not dry_run:
+                    MediaBlob.objects.filter(pk=blob.pk).update(refcount=actual)
+            if actual == 0 and blob.touched_at < cutoff:
+                doomed.append(blob)
+
+        if not dry_run:
+            # A blob re-uploaded since the recount has been touched again; it survives.
+            doomed = [
+                blob for blob in doomed
+                if MediaBlob.objects.filter(pk=blob.pk, refcount=0, touched_at__lt=cutoff).delete()[0]
+            ]
+            for blob in doomed:
+                if os.path.exists(default_storage.path(blob.name)):
+                    os.unlink(default_storage.path(blob.name))
+        freed = sum(blob.size for blob in doomed)
+        strays = self.sweep_strays(counts, cutoff, dry_run)
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(f"Corrected {corrected} reference counts.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(doomed)} unreferenced blobs ({freed / 1e6:.1f} MB) and {strays} stray files."
+        ))
+
+    def sweep_strays(self, counts, cutoff, dry_run):
+        """Temp files from interrupted uploads and blob files with no MediaBlob row."""
+        root = default_storage.path(BLOB_PREFIX)
+        if not os.path.isdir(root):
+            return 0
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        oldest = cutoff.timestamp()
+        removed = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location).replace(os.sep, '/')
+                orphan = filename.startswith(INCOMING_PREFIX) or (name not in known and name not in counts)
+                if orphan and os.path.getmtime(path) < oldest:
+                    removed += 1
+                    if not dry_run:
+                        os.unlink(path)
+        return removed
+
+    def adopt_legacy(self, dry_run):
+        moved = 0
+        for model, field_name in reference_columns():
+            legacy = (
+                model.objects.exclude(**{f'{field_name}__startswith': f'{BLOB_PREFIX}/'})
+                .exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).distinct()
+            )
+            for name in list(legacy.iterator()):
+                if not default_storage.exists(name):
+                    continue
+                moved += 1
+                if dry_run:
+                    continue
+                with default_storage.open(name, 'rb') as fh:
+                    blob_name = default_storage.save(name, fh)
+                for other_model, other_field in reference_columns():
+                    other_model.objects.filter(**{other_field: name}).update(**{other_field: blob_name})
+                # Rendition rows are keyed by the name their owner points at.
+                if ImageRendition.objects.filter(source=blob_name).exists():
+                    ImageRendition.objects.filter(source=name).delete()
+                else:
+                    ImageRendition.objects.filter(source=name).update(source=blob_name)
+                default_storage.delete(name)
+        self.stdout.write(f"{'Would adopt' if dry_run else 'Adopted'} {moved} legacy files.")
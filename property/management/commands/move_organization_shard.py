@@ -0,0 +1,157 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from community_connect import sharding
+from community_connect.worker_state import cache_is_shared
+from users.middleware import MEMBERSHIP_CACHE_TIMEOUT, invalidate_membership, invalidate_organization
+from users.models import CustomUser, Organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves one organization's property data to another shard while it stays online. "
+        "Rows are copied live, then writes are paused, in-flight writes drain, a short "
+        "catch-up pass runs and the organization is switched over. The pause and the switch "
+        "reach web workers through the cache, so it must be shared by all of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', type=int, help="Organization ID.")
+        parser.add_argument('target', help="Database alias to move to (one of DB_SHARDS, or 'default').")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--keep-source', action='store_true',
+                            help="Leave the old rows in place (they are ignored once the move is done).")
+        parser.add_argument('--drain-seconds', type=float, default=5,
+                            help="Wait after pausing writes so requests that started writing before the pause finish.")
+        parser.add_argument('--purge-delay', type=float, default=MEMBERSHIP_CACHE_TIMEOUT,
+                            help="Wait this long after the switch before deleting the old rows.")
+        parser.add_argument('--allow-local-cache', action='store_true',
+                            help="Run with a per-process cache. Only safe while no web workers are running.")
+
+    def handle(self, *args, **options):
+        try:
+            org = Organization.objects.get(pk=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError("Organization not found.")
+        source, target = org.shard, options['target']
+        if target not in sharding.shard_aliases():
+            raise CommandError(f"Unknown shard '{target}'. Configured: {', '.join(sharding.shard_aliases())}.")
+        if target == source:
+            raise CommandError(f"{org.name} is already on '{target}'.")
+        if not cache_is_shared() and not options['allow_local_cache']:
+            raise CommandError(
+                "The cache is per-process, so web workers would never see the write pause or the new shard. "
+                "Configure a shared cache backend or stop the web workers and pass --allow-local-cache."
+            )
+        self.batch_size = options['batch_size']
+        models = [apps.get_model(label) for label in sharding.ORG_PATHS]
+
+        self.stdout.write(f"Moving {org.name} from '{source}' to '{target}'.")
+        self.mirror_directory(target)
+        self.check_collisions(models, org.id, source, target)
+
+        started = time.monotonic()
+        copied = self.sync(models, org.id, source, target)
+        self.stdout.write(f"Live copy: {copied} rows in {time.monotonic() - started:.1f}s.")
+
+        # Cutover: pause writes, let writes already past the check commit, copy what changed meanwhile, switch.
+        started = time.monotonic()
+        sharding.freeze(org.id)
+        try:
+            time.sleep(options['drain_seconds'])
+            changed = self.sync(models, org.id, source, target)
+            org.shard = target
+            org.save(update_fields=['shard'])
+            invalidate_organization(org.id)
+            people = set()
+            for owner_id, tenant_id in sharding.scoped(apps.get_model('property.unit'), org.id, target).values_list('owner_id', 'current_tenant_id'):
+                people.update((owner_id, tenant_id))
+            invalidate_membership(*people)
+        finally:
+            sharding.thaw(org.id)
+        self.stdout.write(f"Cutover: {changed} rows caught up; writes paused for {time.monotonic() - started:.1f}s.")
+
+        if not options['keep_source']:
+            # Writes bound to the old shard are refused by the router from here on
+            # (sharding.check_writable); the delay outlasts any cached copy of the organization.
+            if options['purge_delay']:
+                self.stdout.write(f"Waiting {options['purge_delay']:.0f}s before removing the old rows...")
+                time.sleep(options['purge_delay'])
+            removed = self.purge(models, org.id, source)
+            self.stdout.write(f"Removed {removed} rows from '{source}'.")
+        self.stdout.write(self.style.SUCCESS(f"{org.name} now lives on '{target}'."))
+
+    def mirror_directory(self, target):
+        """Brings the target's copy of organizations and users up to date."""
+        for model in (Organization, CustomUser):
+            for obj in model.objects.using('default').order_by('pk').iterator(chunk_size=self.batch_size):
+                sharding.mirror(obj, [target])
+
+    def check_collisions(self, models, org_id, source, target):
+        """Refuses to start if another organization on the target already uses one of our primary keys."""
+        for model in models:
+            pks = list(sharding.scoped(model, org_id, source).values_list('pk', flat=True))
+            for start in range(0, len(pks), self.batch_size):
+                batch = pks[start:start + self.batch_size]
+                clash = model._base_manager.using(target).filter(pk__in=batch).exclude(
+                    pk__in=sharding.scoped(model, org_id, target).values('pk')
+                ).values_list('pk', flat=True).first()
+                if clash is not None:
+                    raise CommandError(
+                        f"{model._meta.label} #{clash} already exists on '{target}' for another organization; "
+                        f"give each shard its own primary key range before moving."
+                    )
+
+    def sync(self, models, org_id, source, target):
+        """Makes the target's rows for this organization match the source's. Returns rows written."""
+        written, present = 0, {}
+        for model in models:
+            names = [f.attname for f in model._meta.concrete_fields]
+            pk_index = names.index(model._meta.pk.attname)
+            rows = sharding.scoped(model, org_id, source).order_by('pk').values_list(*names)
+            present[model] = set()
+            batch = []
+            for row in rows.iterator(chunk_size=self.batch_size):
+                batch.append(row)
+                if len(batch) == self.batch_size:
+                    written += self.write_batch(model, names, pk_index, batch, target, present[model])
+                    batch = []
+            written += self.write_batch(model, names, pk_index, batch, target, present[model])
+
+        # Rows deleted on the source since the last pass, children first.
+        for model in reversed(models):
+            stale = set(sharding.scoped(model, org_id, target).values_list('pk', flat=True)) - present[model]
+            written += self.delete_rows(model, stale, target)
+        return written
+
+    def write_batch(self, model, names, pk_index, batch, target, present):
+        if not batch:
+            return 0
+        pks = [row[pk_index] for row in batch]
+        present.update(pks)
+        manager = model._base_manager.using(target)
+        existing = {row[pk_index]: row for row in manager.filter(pk__in=pks).values_list(*names)}
+        with transaction.atomic(using=target):
+            sharding.insert_copies(model, [model(**dict(zip(names, row))) for row in batch if row[pk_index] not in existing], target)
+            changed = [row for row in batch if row[pk_index] in existing and existing[row[pk_index]] != row]
+            for row in changed:
+                manager.filter(pk=row[pk_index]).update(**dict(zip(names, row)))
+        return len(batch) - len(existing) + len(changed)
+
+    def delete_rows(self, model, pks, alias):
+        # Raw deletes: no cascades or signals (file references belong to the surviving copies).
+        pks, removed = sorted(pks), 0
+        for start in range(0, len(pks), self.batch_size):
+            queryset = model._base_manager.using(alias).filter(pk__in=pks[start:start + self.batch_size])
+            removed += queryset._raw_delete(alias) or 0
+        return removed
+
+    def purge(self, models, org_id, source):
+        removed = 0
+        with transaction.atomic(using=source):
+            for model in reversed(models):
+                removed += self.delete_rows(model, sharding.scoped(model, org_id, source).values_list('pk', flat=True), source)
+        return removed
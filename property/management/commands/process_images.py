@@ -0,0 +1,46 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from property.images import process_pending
+from property.models import ImageRendition
+
+STALE_MINUTES = 10
+
+
+class Command(BaseCommand):
+    help = "Re-encodes queued photo uploads into display copies and thumbnails."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running as a worker, polling for new uploads.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop.")
+        parser.add_argument('--retry-failed', action='store_true', help="Re-queue renditions that previously failed.")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = ImageRendition.objects.filter(status='FAILED').update(status='PENDING', attempts=0)
+            self.stdout.write(f"Re-queued {requeued} failed renditions.")
+        # Rows stuck in PROCESSING this long belong to a worker that died mid-image.
+        stale = timezone.now() - datetime.timedelta(minutes=STALE_MINUTES)
+        ImageRendition.objects.filter(status='PROCESSING', created_at__lt=stale).update(status='PENDING')
+
+        while True:
+            processed = process_pending()
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} images."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        totals = ImageRendition.objects.filter(status='DONE').aggregate(
+            original=Sum('original_bytes'), display=Sum('display_bytes'), thumbs=Sum('thumbnail_bytes')
+        )
+        if totals['original']:
+            stored = (totals['display'] or 0) + (totals['thumbs'] or 0)
+            self.stdout.write(
+                f"Uploads {totals['original'] / 1e6:.1f} MB -> stored {stored / 1e6:.1f} MB "
+                f"({totals['original'] / max(stored, 1):.1f}x smaller)."
+            )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from property import counters
+from property.cache import PLATFORM
+from property.models import PlatformCounter
+
+
+class Command(BaseCommand):
+    help = "Recounts the super-admin platform counters (totals and per-organization rollups) from the data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing anything.")
+
+    def handle(self, *args, **options):
+        fresh = counters.recount()
+        stored = {(c.scope, c.name): c.value for c in PlatformCounter.objects.all()}
+        drifted = {key for key in fresh.keys() | stored.keys() if fresh.get(key, 0) != stored.get(key, 0)}
+        for scope, name in sorted(drifted):
+            if scope == PLATFORM or options['verbosity'] > 1:
+                self.stdout.write(f"  {scope} {name}: {stored.get((scope, name), 0)} -> {fresh.get((scope, name), 0)}")
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} of {len(fresh)} counters differ (dry run).")
+            return
+        written = counters.rebuild(fresh)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} counters ({len(drifted)} had drifted)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from property import counters
+
+
+class Command(BaseCommand):
+    help = "Recounts Property.unit_count/occupied_count and Organization.unit_count from the units on every shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing anything.")
+
+    def handle(self, *args, **options):
+        properties, organizations = counters.rebuild_units(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{properties} properties and {organizations} organizations have drifted (dry run).")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Corrected {properties} properties and {organizations} organizations."))
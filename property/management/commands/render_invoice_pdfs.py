@@ -0,0 +1,168 @@
+import datetime
+import os
+import struct
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.text import slugify
+
+from community_connect import sharding
+from property import documents
+from property.models import Invoice, Property
+from users.models import Organization
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+def _init_worker():
+    import django
+    django.setup()  # No-op under fork; needed where workers are spawned
+    connections.close_all()
+
+
+def render_chunk(shard, arc_dir, invoice_ids):
+    """Worker: renders a slice of one property's invoices. Returns [(arcname, pdf_bytes)]."""
+    with sharding.using_shard(shard):
+        invoices = documents.invoice_queryset().filter(id__in=invoice_ids).order_by('id')
+        return [
+            (f"{arc_dir}/INV-{invoice.id:05d}.pdf", documents.render_invoice(documents.invoice_spec(invoice)))
+            for invoice in invoices
+        ]
+
+
+def recover_archive(path):
+    """
+    Rebuilds a ZIP whose writer was killed before writing the central directory,
+    keeping every entry that was completely written. Returns the kept count.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    kept, pos = [], 0
+    while data[pos:pos + 4] == b'PK\x03\x04' and pos + _LOCAL_HEADER.size <= len(data):
+        _, _, flags, method, mtime, mdate, crc, size, _, name_len, extra_len = _LOCAL_HEADER.unpack_from(data, pos)
+        start = pos + _LOCAL_HEADER.size + name_len + extra_len
+        body = data[start:start + size]
+        if flags & 0x08 or method != zipfile.ZIP_STORED or len(body) != size or zlib.crc32(body) != crc:
+            break
+        info = zipfile.ZipInfo(data[pos + _LOCAL_HEADER.size:pos + _LOCAL_HEADER.size + name_len].decode(),
+                               ((mdate >> 9) + 1980, (mdate >> 5) & 15, mdate & 31, mtime >> 11, (mtime >> 5) & 63, (mtime & 31) * 2))
+        kept.append((info, body))
+        pos = start + size
+    with zipfile.ZipFile(path + '.recovered', 'w', zipfile.ZIP_STORED) as zf:
+        for info, body in kept:
+            zf.writestr(info, body)
+    os.replace(path + '.recovered', path)
+    return len(kept)
+
+
+class Command(BaseCommand):
+    help = "Renders invoice PDFs into one ZIP, one folder per property, using a process pool. Re-run to resume."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the ZIP archive to create or resume.")
+        parser.add_argument('--organization', type=int, help="Organization ID (default: all).")
+        parser.add_argument('--property', type=int, action='append', dest='properties', help="Property ID; repeatable.")
+        parser.add_argument('--month', help="Only invoices due in this month (YYYY-MM). Also adds the monthly statement.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=250, help="Invoices per worker task.")
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        properties = Property.objects.all()
+        if options['organization']:
+            invoices = invoices.filter(organization_id=options['organization'])
+            properties = properties.filter(organization_id=options['organization'])
+        if options['properties']:
+            invoices = invoices.filter(unit__property_id__in=options['properties'])
+            properties = properties.filter(id__in=options['properties'])
+        month = None
+        if options['month']:
+            try:
+                month = datetime.datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--month must look like 2026-01.")
+            invoices = invoices.filter(due_date__year=month.year, due_date__month=month.month)
+
+        output = options['output']
+        done = self.open_existing(output)
+
+        # Partition by property, then slice big properties so every core gets work.
+        tasks, pending = [], 0
+        for shard in sharding.shard_aliases():
+            mine = properties.using(shard).filter(organization__shard=shard)
+            arc_dirs = {pk: f"{pk}-{slugify(name) or 'property'}" for pk, name in mine.values_list('id', 'name')}
+            by_property = {}
+            for invoice_id, property_id in (invoices.using(shard).filter(unit__property__in=mine)
+                                            .order_by('unit__property_id', 'id').values_list('id', 'unit__property_id')):
+                if f"{arc_dirs[property_id]}/INV-{invoice_id:05d}.pdf" not in done:
+                    by_property.setdefault(property_id, []).append(invoice_id)
+                    pending += 1
+            for property_id, ids in by_property.items():
+                size = options['chunk_size']
+                tasks.extend((shard, arc_dirs[property_id], ids[i:i + size]) for i in range(0, len(ids), size))
+        self.stdout.write(f"{len(done)} PDFs already in {output}; {pending} to render in {len(tasks)} tasks.")
+
+        rendered, written_bytes, started = 0, 0, time.monotonic()
+        connections.close_all()  # Workers must not inherit this process's DB connections
+        with zipfile.ZipFile(output, 'a', zipfile.ZIP_STORED) as archive:
+            if tasks:
+                with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                    futures = [pool.submit(render_chunk, shard, arc_dir, ids) for shard, arc_dir, ids in tasks]
+                    try:
+                        for future in as_completed(futures):
+                            results = future.result()
+                            for name, content in results:
+                                archive.writestr(name, content)  # PDF streams are already compressed
+                                written_bytes += len(content)
+                            rendered += len(results)
+                            elapsed = time.monotonic() - started
+                            self.stdout.write(f"  {rendered}/{pending} PDFs, {rendered / elapsed:.0f}/s", ending='\r')
+                    except KeyboardInterrupt:
+                        for future in futures:
+                            future.cancel()
+                        self.stdout.write(self.style.WARNING(f"\nInterrupted after {rendered} PDFs; re-run to resume."))
+                        raise
+            if month:
+                self.add_statements(archive, month, options, done)
+
+        elapsed = time.monotonic() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"\nRendered {rendered} PDFs ({written_bytes / 1e6:.1f} MB) in {elapsed:.1f}s "
+            f"with {options['workers']} workers: {rate:.0f} PDFs/s."
+        ))
+
+    def open_existing(self, output):
+        """Names already in the archive, repairing it first if a previous run was killed."""
+        if not os.path.exists(output):
+            return set()
+        try:
+            with zipfile.ZipFile(output) as archive:
+                return set(archive.namelist())
+        except zipfile.BadZipFile:
+            kept = recover_archive(output)
+            self.stdout.write(self.style.WARNING(f"Recovered {kept} complete PDFs from an interrupted run."))
+            with zipfile.ZipFile(output) as archive:
+                return set(archive.namelist())
+
+    def add_statements(self, archive, month, options, done):
+        orgs = Organization.objects.all()
+        if options['organization']:
+            orgs = orgs.filter(id=options['organization'])
+        if options['properties']:
+            org_ids = set()
+            for shard in sharding.shard_aliases():
+                org_ids.update(Property.objects.using(shard).filter(
+                    id__in=options['properties'], organization__shard=shard,
+                ).values_list('organization_id', flat=True))
+            orgs = orgs.filter(id__in=org_ids)
+        for org in orgs:
+            name = f"statements/{slugify(org.name) or org.id}-{month:%Y-%m}.pdf"
+            if name not in done:
+                with sharding.using_shard(org.shard, org.id):
+                    _, content = documents.statement_pdf(org, month.month, month.year)
+                archive.writestr(name, content)
@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from community_connect import sharding
+from property.analytics import rollup_changes, rollup_hours
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates hourly gate traffic rollups for every hour touched by visitor rows written "
+        "since the last run (schedule every few minutes). --hours rebuilds a trailing window instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int,
+                            help="Rebuild this many trailing hours outright (backfills, repairs).")
+
+    def handle(self, *args, **options):
+        if options['hours']:
+            end = timezone.now()
+            start = end - datetime.timedelta(hours=options['hours'])
+            buckets = 0
+            for alias in sharding.shard_aliases():
+                with sharding.using_shard(alias):
+                    buckets += rollup_hours(start, end)
+            self.stdout.write(self.style.SUCCESS(f"Rolled up {buckets} hourly buckets since {start:%Y-%m-%d %H:00}."))
+            return
+
+        buckets = hours = 0
+        for alias in sharding.shard_aliases():
+            written, rebuilt = rollup_changes(alias)
+            buckets += written
+            hours += rebuilt
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {hours} changed hours ({buckets} buckets)."))
@@ -0,0 +1,54 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from property import billing
+
+MAX_CATCH_UP_MONTHS = 24
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the monthly subscription invoices for every active organization whose billing "
+        "date has arrived and moves the date on a month. Safe to re-run; schedule it daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Bill as of this day (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--dry-run', action='store_true', help="Show what today's pass would bill without writing.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['date']:
+            try:
+                today = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD.")
+
+        if options['dry_run']:
+            invoices, _, manual = billing.bill_due(today, dry_run=True)
+            for invoice in invoices:
+                self.stdout.write(f"  org #{invoice.organization_id}: KES {invoice.amount} - {invoice.description}")
+            self.report_manual(manual)
+            self.stdout.write(f"{len(invoices)} invoices would be created (dry run).")
+            return
+
+        started = billing.start_unscheduled(today)
+        if started:
+            self.stdout.write(f"{started} active organizations had no billing date; their cycle starts {today}.")
+
+        # Organizations that missed runs are billed one month per pass until current.
+        billed, manual = 0, []
+        for _ in range(MAX_CATCH_UP_MONTHS):
+            _, advanced, custom = billing.bill_due(today)
+            billed += advanced - len(custom)
+            manual += custom
+            if not advanced:
+                break
+        self.report_manual(manual)
+        self.stdout.write(self.style.SUCCESS(f"Billing for {today}: {billed} organization-months billed."))
+
+    def report_manual(self, manual):
+        for org_id, period in manual:
+            self.stdout.write(self.style.WARNING(f"  org #{org_id}: {period:%B %Y} is on a custom quote; invoice it by hand."))
@@ -0,0 +1,27 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from community_connect.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = "Copies the primary SQLite database over the local replica file (stands in for replication in development)."
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.settings:
+            raise CommandError("No 'replica' database configured; set DB_REPLICA_NAME.")
+        primary, replica = connections['default'].settings_dict, connections[REPLICA].settings_dict
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError("Only SQLite databases can be synced this way; real replicas replicate themselves.")
+
+        connections[REPLICA].close()
+        # uri=True as Django itself connects, so in-memory test databases can be named too.
+        source, target = sqlite3.connect(primary['NAME'], uri=True), sqlite3.connect(replica['NAME'], uri=True)
+        try:
+            source.backup(target)  # Consistent snapshot even while the primary is in use
+        finally:
+            source.close()
+            target.close()
+        self.stdout.write(self.style.SUCCESS(f"Replica {replica['NAME']} now matches {primary['NAME']}."))
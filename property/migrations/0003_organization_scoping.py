@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+CHUNK_SIZE = 5000
+
+
+def populate_organizations(apps, schema_editor):
+    # Same derivation and pk windows as `backfill_organization`, so existing rows are scoped as soon
+    # as the columns exist without one long table-wide UPDATE holding its locks.
+    db = schema_editor.connection.alias
+    Unit = apps.get_model('property', 'Unit')
+    Property = apps.get_model('property', 'Property')
+    via_unit = Subquery(Unit.objects.using(db).filter(pk=OuterRef('unit_id')).values('property__organization_id')[:1])
+    via_property = Subquery(Property.objects.using(db).filter(pk=OuterRef('property_id')).values('organization_id')[:1])
+    for name, source in [('Invoice', via_unit), ('VisitorLog', via_unit), ('ShortTermStay', via_unit), ('Expense', via_property)]:
+        rows = apps.get_model('property', name).objects.using(db)
+        last_id = rows.aggregate(Max('pk'))['pk__max'] or 0
+        for start in range(0, last_id + 1, CHUNK_SIZE):
+            with transaction.atomic(using=db):
+                rows.filter(pk__gte=start, pk__lt=start + CHUNK_SIZE, organization__isnull=True).update(organization_id=source)
+
+
+class Migration(migrations.Migration):
+    # Each backfill chunk commits on its own (see populate_organizations).
+    atomic = False
+
+    dependencies = [
+        ('property', '0002_alter_meter_unit'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='organization',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='organization',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='shorttermstay',
+            name='organization',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='visitorlog',
+            name='organization',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['organization', 'date_incurred'], name='expense_org_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['organization', 'is_paid', 'payment_date'], name='invoice_org_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shorttermstay',
+            index=models.Index(fields=['organization', 'is_active'], name='stay_org_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['organization', 'is_active', 'entry_time'], name='visitor_org_active_idx'),
+        ),
+        migrations.RunPython(populate_organizations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_unit_keys(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Unit = apps.get_model('property', 'Unit')
+    batch = []
+    for unit in Unit.objects.using(db).select_related('property').only('id', 'unit_number', 'property__organization_id').iterator(chunk_size=2000):
+        unit.unit_key = " ".join((unit.unit_number or "").split()).upper()
+        unit.organization_id = unit.property.organization_id
+        batch.append(unit)
+        if len(batch) >= 2000:
+            Unit.objects.using(db).bulk_update(batch, ['unit_key', 'organization'])
+            batch = []
+    if batch:
+        Unit.objects.using(db).bulk_update(batch, ['unit_key', 'organization'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0003_organization_scoping'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unit',
+            name='organization',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='unit_key',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='unit',
+            index=models.Index(fields=['organization', 'unit_key'], name='unit_org_key_idx'),
+        ),
+        migrations.RunPython(populate_unit_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0004_unit_lookup_key'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['organization', 'exit_time'], name='visitor_org_exit_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:56
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0005_visitor_exit_index'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitorlog',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='visitorlog',
+            name='entry_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='visitorlog',
+            constraint=models.UniqueConstraint(fields=('organization', 'client_key'), name='visitor_org_client_key_uniq'),
+        ),
+    ]
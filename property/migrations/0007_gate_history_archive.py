@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0006_visitor_client_key'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortTermStayArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('month', models.DateField(help_text='First day of the check-in month')),
+                ('unit_number', models.CharField(max_length=20)),
+                ('guest_name', models.CharField(max_length=255)),
+                ('guest_id_number', models.CharField(max_length=50)),
+                ('guest_phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('id_passport_image', models.CharField(blank=True, max_length=255)),
+                ('check_in_time', models.DateTimeField()),
+                ('check_out_time', models.DateTimeField(blank=True, null=True)),
+                ('checked_in_by_id', models.BigIntegerField(blank=True, null=True)),
+                ('checked_out_by_id', models.BigIntegerField(blank=True, null=True)),
+                ('feedback_rating', models.IntegerField(blank=True, null=True)),
+                ('feedback_comment', models.TextField(blank=True, null=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization')),
+                ('unit', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='property.unit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'month', 'check_in_time'], name='stay_arch_org_month_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitorLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('month', models.DateField(help_text='First day of the entry month')),
+                ('unit_number', models.CharField(max_length=20)),
+                ('visitor_name', models.CharField(max_length=100)),
+                ('visitor_id_number', models.CharField(blank=True, max_length=50, null=True)),
+                ('visitor_phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('id_collected_at_gate', models.BooleanField(default=False)),
+                ('visitor_type', models.CharField(choices=[('DELIVERY', 'Delivery'), ('SERVICE', 'Service'), ('SOCIAL', 'Social Visit'), ('TAXI', 'Taxi')], max_length=20)),
+                ('notified_tenant_id', models.BigIntegerField(blank=True, null=True)),
+                ('entry_time', models.DateTimeField()),
+                ('exit_time', models.DateTimeField(blank=True, null=True)),
+                ('allowed_entry', models.BooleanField(default=False)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization')),
+                ('unit', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='property.unit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'month', 'entry_time'], name='visitor_arch_org_month_idx')],
+            },
+        ),
+    ]
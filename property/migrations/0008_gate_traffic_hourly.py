@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0007_gate_history_archive'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GateTrafficHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('visitor_type', models.CharField(choices=[('DELIVERY', 'Delivery'), ('SERVICE', 'Service'), ('SOCIAL', 'Social Visit'), ('TAXI', 'Taxi')], max_length=20)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('exits', models.PositiveIntegerField(default=0)),
+                ('dwell_seconds_total', models.BigIntegerField(default=0)),
+                ('dwell_samples', models.PositiveIntegerField(default=0, help_text='Visits in this bucket that have exited')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.organization')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gate_traffic', to='property.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'hour'], name='gate_traffic_org_hour_idx')],
+                'unique_together': {('property', 'hour', 'visitor_type')},
+            },
+        ),
+    ]
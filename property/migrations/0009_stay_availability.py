@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_occupied_until(apps, schema_editor):
+    ShortTermStay = apps.get_model('property', 'ShortTermStay')
+    ShortTermStay.objects.filter(check_out_time__isnull=False).update(occupied_until=models.F('check_out_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0008_gate_traffic_hourly'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shorttermstay',
+            name='expected_check_out',
+            field=models.DateTimeField(blank=True, help_text='Planned departure (leave blank if open-ended)', null=True),
+        ),
+        migrations.AddField(
+            model_name='shorttermstay',
+            name='occupied_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='shorttermstay',
+            index=models.Index(fields=['unit', 'check_in_time', 'occupied_until'], name='stay_unit_interval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shorttermstay',
+            index=models.Index(fields=['organization', 'check_in_time', 'occupied_until'], name='stay_org_interval_idx'),
+        ),
+        migrations.RunPython(populate_occupied_until, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0009_stay_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('model_label', models.CharField(help_text='Owning model, e.g. property.Expense', max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('field_name', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('original_bytes', models.PositiveIntegerField(blank=True, null=True)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('display_bytes', models.PositiveIntegerField(blank=True, null=True)),
+                ('thumbnail', models.CharField(blank=True, max_length=255)),
+                ('thumbnail_width', models.PositiveIntegerField(blank=True, null=True)),
+                ('thumbnail_height', models.PositiveIntegerField(blank=True, null=True)),
+                ('thumbnail_bytes', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='rendition_status_idx')],
+            },
+        ),
+    ]
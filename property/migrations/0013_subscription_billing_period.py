@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0012_platform_counters'),
+        ('users', '0002_organization_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='softwareinvoice',
+            name='billing_period',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='softwareinvoice',
+            constraint=models.UniqueConstraint(fields=('organization', 'billing_period'), name='softwareinvoice_one_per_period'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:40
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _units(Unit, db, field, **filters):
+    rows = Unit.objects.using(db).filter(**{field: OuterRef('pk')}, **filters) \
+        .order_by().values(field).annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def populate_unit_counts(apps, schema_editor):
+    # Counts this database's units; `rebuild_unit_counts` sums organizations across shards.
+    db = schema_editor.connection.alias
+    Unit = apps.get_model('property', 'Unit')
+    Property = apps.get_model('property', 'Property')
+    Organization = apps.get_model('users', 'Organization')
+    Property.objects.using(db).update(
+        unit_count=_units(Unit, db, 'property'),
+        occupied_count=_units(Unit, db, 'property', current_tenant__isnull=False),
+    )
+    Organization.objects.using(db).update(unit_count=_units(Unit, db, 'organization'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0013_subscription_billing_period'),
+        ('users', '0003_organization_unit_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='occupied_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='unit_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_unit_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0014_unit_counters'),
+        ('users', '0003_organization_unit_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['due_date'], name='invoice_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shorttermstay',
+            index=models.Index(fields=['check_in_time'], name='stay_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['entry_time'], name='visitor_entry_idx'),
+        ),
+    ]
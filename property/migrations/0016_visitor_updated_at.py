@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_updated_at(apps, schema_editor):
+    # Best server-side guess for existing rows: when they were last closed or opened.
+    VisitorLog = apps.get_model('property', 'VisitorLog')
+    VisitorLog.objects.using(schema_editor.connection.alias).update(updated_at=Coalesce('exit_time', 'entry_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('property', '0015_admin_date_indexes'),
+        ('users', '0003_organization_unit_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitorlog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(populate_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['organization', 'updated_at'], name='visitor_org_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['updated_at'], name='visitor_updated_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from users.models import Organization
 # Ideally use fernet_fields for encryption, but using CharField for simplicity now. 
 # In prod, recommend django-fernet-fields.
@@ -35,10 +38,17 @@ class SoftwareInvoice(models.Model):
     date_issued = models.DateField(auto_now_add=True)
     due_date = models.DateField()
     is_paid = models.BooleanField(default=False)
+    # Start of the subscription month billed (empty for one-off fees); one invoice per period.
+    billing_period = models.DateField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.organization.name} - {self.amount} ({'Paid' if self.is_paid else 'Due'})"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'billing_period'], name='softwareinvoice_one_per_period'),
+        ]
+
 # --- 1. Property Structure (Existing) ---
 
 class Property(models.Model):
@@ -51,13 +61,19 @@ class Property(models.Model):
     water_unit_cost = models.DecimalField(max_digits=10, decimal_places=2, default=150.00, help_text="Cost per cubic meter")
     electricity_unit_cost = models.DecimalField(max_digits=10, decimal_places=2, default=25.00, help_text="Cost per unit (if sub-metered)")
 
+    # Maintained by the Unit signals (see property/counters.py); `rebuild_unit_counts` recounts them.
+    unit_count = models.IntegerField(default=0, editable=False)
+    occupied_count = models.IntegerField(default=0, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_organization_id = instance.__dict__.get('organization_id')
+        return instance
+
     def __str__(self):
         return f"{self.name} ({self.organization.name})"
-    
-    @property
-    def total_units_count(self): return self.unit_set.count()
-    @property
-    def occupied_units_count(self): return self.unit_set.filter(current_tenant__isnull=False).count()
+
     class Meta: verbose_name_plural = "Properties"
 
 # --- Staff Assignment Model (Existing) ---
@@ -68,28 +84,93 @@ class PropertyStaff(models.Model):
     def __str__(self):
         return f"{self.user.username} -> {self.property.name}"
 
-class Unit(models.Model):
+# --- Tenancy Scoping (Denormalized Organization) ---
+class OrganizationScopedModel(models.Model):
+    """
+    Keeps a copy of the owning Organization on high-volume rows so org-scoped
+    queries filter one indexed column instead of joining through Unit/Property.
+    `organization_source` names the relation the organization is derived from.
+    """
+    organization_source = 'unit'
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='+')
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_source_id = instance.__dict__.get(f"{cls.organization_source}_id")
+        return instance
+
+    def resolve_organization_id(self, using=None):
+        source_id = getattr(self, f"{self.organization_source}_id")
+        if source_id is None:
+            return None
+        if self.organization_source == 'property':
+            if self._meta.get_field('property').is_cached(self):
+                return self.property.organization_id
+            return Property.objects.db_manager(using).filter(pk=source_id).values_list('organization_id', flat=True).first()
+        # Derived through the unit: reuse already-loaded objects before querying.
+        field = self._meta.get_field('unit')
+        if field.is_cached(self) and Unit._meta.get_field('property').is_cached(self.unit):
+            return self.unit.property.organization_id
+        return Unit.objects.db_manager(using).filter(pk=source_id).values_list('property__organization_id', flat=True).first()
+
+    def save(self, *args, **kwargs):
+        source_id = getattr(self, f"{self.organization_source}_id")
+        if self.organization_id is None or source_id != getattr(self, '_loaded_source_id', source_id):
+            self.organization_id = self.resolve_organization_id(kwargs.get('using'))
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'organization' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['organization']
+        super().save(*args, **kwargs)
+        self._loaded_source_id = source_id
+
+class Unit(OrganizationScopedModel):
+    organization_source = 'property'
     property = models.ForeignKey(Property, on_delete=models.CASCADE)
     block = models.CharField(max_length=50, blank=True)
     floor = models.CharField(max_length=10)
     door_number = models.CharField(max_length=10)
     unit_number = models.CharField(max_length=20, editable=False)
+    # Normalized unit_number used for case-insensitive lookups within an organization
+    unit_key = models.CharField(max_length=20, editable=False, default='')
     is_locked = models.BooleanField(default=False)
     
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='owned_units')
     organization_owner = models.ForeignKey(Organization, on_delete=models.SET_NULL, null=True, blank=True)
     current_tenant = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='occupied_unit')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember who owned/occupied the unit when it was loaded so signals can
+        # tell a tenancy or ownership change apart from an unrelated edit.
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_owner_id = instance.__dict__.get('owner_id')
+        instance._loaded_tenant_id = instance.__dict__.get('current_tenant_id')
+        instance._loaded_organization_id = instance.__dict__.get('organization_id')
+        instance._loaded_unit_key = instance.__dict__.get('unit_key')
+        return instance
+
+    @staticmethod
+    def normalize_number(unit_number):
+        """Canonical form of a typed unit number: trimmed, single-spaced, upper-case."""
+        return " ".join((unit_number or "").split()).upper()
+
     def save(self, *args, **kwargs):
         prefix = f"{self.block}-" if self.block else ""
         self.unit_number = f"{prefix}{self.floor}{self.door_number}"
+        self.unit_key = self.normalize_number(self.unit_number)
         super().save(*args, **kwargs)
 
     def __str__(self): return f"{self.property.name} - {self.unit_number}"
-    class Meta: unique_together = ('property', 'block', 'floor', 'door_number')
+    class Meta:
+        unique_together = ('property', 'block', 'floor', 'door_number')
+        indexes = [models.Index(fields=['organization', 'unit_key'], name='unit_org_key_idx')]
 
 # --- 2. Visitor & Short Term (Existing) ---
-class VisitorLog(models.Model):
+class VisitorLog(OrganizationScopedModel):
     VISITOR_TYPES = [('DELIVERY', 'Delivery'), ('SERVICE', 'Service'), ('SOCIAL', 'Social Visit'), ('TAXI', 'Taxi')]
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='visitors')
     visitor_name = models.CharField(max_length=100)
@@ -98,13 +179,32 @@ class VisitorLog(models.Model):
     id_collected_at_gate = models.BooleanField(default=False)
     visitor_type = models.CharField(max_length=20, choices=VISITOR_TYPES, default='SOCIAL')
     notified_tenant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
-    entry_time = models.DateTimeField(auto_now_add=True)
+    # Defaults to now, but gate devices syncing an offline queue supply the real entry time.
+    entry_time = models.DateTimeField(default=timezone.now, editable=False)
     exit_time = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     allowed_entry = models.BooleanField(default=False)
     notes = models.CharField(max_length=255, blank=True)
+    # Idempotency key generated by a gate device (see gate_sync.py)
+    client_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    # Server time of the last write. entry_time/exit_time may be device times hours in the past,
+    # so board deltas and the hourly rollup look for changes by this column instead.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'is_active', 'entry_time'], name='visitor_org_active_idx'),
+            models.Index(fields=['organization', 'exit_time'], name='visitor_org_exit_idx'),
+            # Platform-wide date navigation in the admin
+            models.Index(fields=['entry_time'], name='visitor_entry_idx'),
+            models.Index(fields=['organization', 'updated_at'], name='visitor_org_updated_idx'),
+            models.Index(fields=['updated_at'], name='visitor_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'client_key'], name='visitor_org_client_key_uniq'),
+        ]
 
-class ShortTermStay(models.Model):
+class ShortTermStay(OrganizationScopedModel):
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='short_term_stays')
     guest_name = models.CharField(max_length=255)
     guest_id_number = models.CharField(max_length=50)
@@ -112,15 +212,113 @@ class ShortTermStay(models.Model):
     id_passport_image = models.ImageField(upload_to='guest_ids/%Y/%m/', blank=True, null=True)
     check_in_time = models.DateTimeField(auto_now_add=True)
     checked_in_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='stays_checked_in')
+    expected_check_out = models.DateTimeField(null=True, blank=True, help_text="Planned departure (leave blank if open-ended)")
     check_out_time = models.DateTimeField(null=True, blank=True)
     checked_out_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='stays_checked_out')
+    # End of the occupied interval: actual checkout, else planned checkout, else NULL (open-ended).
+    # Kept on save so overlap checks are plain indexed range comparisons.
+    occupied_until = models.DateTimeField(null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     feedback_rating = models.IntegerField(null=True, blank=True)
     feedback_comment = models.TextField(blank=True, null=True)
 
+    def save(self, *args, **kwargs):
+        self.occupied_until = self.check_out_time or self.expected_check_out
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'occupied_until' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['occupied_until']
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'is_active'], name='stay_org_active_idx'),
+            models.Index(fields=['unit', 'check_in_time', 'occupied_until'], name='stay_unit_interval_idx'),
+            models.Index(fields=['organization', 'check_in_time', 'occupied_until'], name='stay_org_interval_idx'),
+            models.Index(fields=['check_in_time'], name='stay_check_in_idx'),
+        ]
+
+# --- NEW: GATE HISTORY ARCHIVE ---
+class VisitorLogArchive(models.Model):
+    """
+    Closed VisitorLog rows moved out of the hot table by `archive_gate_history`.
+    Partitioned logically by `month` so history searches touch one slice at a time.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+')
+    month = models.DateField(help_text="First day of the entry month")
+    unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, related_name='+')
+    unit_number = models.CharField(max_length=20)
+    visitor_name = models.CharField(max_length=100)
+    visitor_id_number = models.CharField(max_length=50, blank=True, null=True)
+    visitor_phone = models.CharField(max_length=20, blank=True, null=True)
+    id_collected_at_gate = models.BooleanField(default=False)
+    visitor_type = models.CharField(max_length=20, choices=VisitorLog.VISITOR_TYPES)
+    notified_tenant_id = models.BigIntegerField(null=True, blank=True)
+    entry_time = models.DateTimeField()
+    exit_time = models.DateTimeField(null=True, blank=True)
+    allowed_entry = models.BooleanField(default=False)
+    notes = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['organization', 'month', 'entry_time'], name='visitor_arch_org_month_idx')]
+
+class ShortTermStayArchive(models.Model):
+    """Closed ShortTermStay rows moved out of the hot table by `archive_gate_history`."""
+    original_id = models.BigIntegerField(unique=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+')
+    month = models.DateField(help_text="First day of the check-in month")
+    unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, related_name='+')
+    unit_number = models.CharField(max_length=20)
+    guest_name = models.CharField(max_length=255)
+    guest_id_number = models.CharField(max_length=50)
+    guest_phone = models.CharField(max_length=20, blank=True, null=True)
+    id_passport_image = models.CharField(max_length=255, blank=True)
+    check_in_time = models.DateTimeField()
+    check_out_time = models.DateTimeField(null=True, blank=True)
+    checked_in_by_id = models.BigIntegerField(null=True, blank=True)
+    checked_out_by_id = models.BigIntegerField(null=True, blank=True)
+    feedback_rating = models.IntegerField(null=True, blank=True)
+    feedback_comment = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['organization', 'month', 'check_in_time'], name='stay_arch_org_month_idx')]
+
+# --- NEW: GATE TRAFFIC ANALYTICS ---
+class GateTrafficHourly(models.Model):
+    """
+    Hourly gate rollup per property and visitor type, maintained by `rollup_gate_traffic`.
+    Entries and dwell are bucketed by entry hour, exits by exit hour.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+')
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='gate_traffic')
+    hour = models.DateTimeField()
+    visitor_type = models.CharField(max_length=20, choices=VisitorLog.VISITOR_TYPES)
+    entries = models.PositiveIntegerField(default=0)
+    exits = models.PositiveIntegerField(default=0)
+    dwell_seconds_total = models.BigIntegerField(default=0)
+    dwell_samples = models.PositiveIntegerField(default=0, help_text="Visits in this bucket that have exited")
+
+    def average_dwell_seconds(self):
+        return self.dwell_seconds_total / self.dwell_samples if self.dwell_samples else None
+
+    class Meta:
+        unique_together = ('property', 'hour', 'visitor_type')
+        indexes = [models.Index(fields=['organization', 'hour'], name='gate_traffic_org_hour_idx')]
+
+
+class RollupWatermark(models.Model):
+    """
+    How far an incremental job has got through its source, one row per job and shard:
+    a rollup's read position, or the cutoff of the last gate history archive run.
+    """
+    name = models.CharField(max_length=60, unique=True)
+    position = models.DateTimeField()
+
+    def __str__(self): return f"{self.name} @ {self.position:%Y-%m-%d %H:%M}"
+
 # --- 3. Financials & Operations (Enhanced) ---
 
-class Invoice(models.Model):
+class Invoice(OrganizationScopedModel):
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name='invoices')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     due_date = models.DateField()
@@ -130,8 +328,28 @@ class Invoice(models.Model):
     mpesa_code = models.CharField(max_length=50, null=True, blank=True)
     checkout_request_id = models.CharField(max_length=100, blank=True, null=True, help_text="M-Pesa Transaction ID for tracking callbacks")
     payment_date = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # What this invoice contributed to revenue when loaded (see property/counters.py);
+        # unknown if any of the fields involved was deferred.
+        instance = super().from_db(db, field_names, values)
+        loaded = instance.__dict__
+        if {'organization_id', 'is_paid', 'amount'} <= loaded.keys():
+            instance._loaded_revenue = (loaded['organization_id'], instance.paid_amount())
+        else:
+            instance._loaded_revenue = None
+        return instance
+
+    def paid_amount(self):
+        return Decimal(str(self.amount)) if self.is_paid and self.amount is not None else Decimal(0)
     
     def __str__(self): return f"Invoice #{self.id} - {self.unit.unit_number} - {self.amount}"
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'is_paid', 'payment_date'], name='invoice_org_paid_idx'),
+            models.Index(fields=['due_date'], name='invoice_due_idx'),
+        ]
 
 # --- NEW: UTILITY METERING ---
 class Meter(models.Model):
@@ -173,8 +391,9 @@ class ExpenseCategory(models.Model):
     def __str__(self): return self.name
     class Meta: verbose_name_plural = "Expense Categories"
 
-class Expense(models.Model):
+class Expense(OrganizationScopedModel):
     """Digital Petty Cash Record"""
+    organization_source = 'property'
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='expenses')
     category = models.ForeignKey(ExpenseCategory, on_delete=models.SET_NULL, null=True)
     payee = models.CharField(max_length=100, help_text="Who was paid? (e.g. KPLC, Juma)")
@@ -185,6 +404,8 @@ class Expense(models.Model):
     recorded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     
     def __str__(self): return f"{self.amount} - {self.payee} ({self.date_incurred})"
+    class Meta:
+        indexes = [models.Index(fields=['organization', 'date_incurred'], name='expense_org_date_idx')]
 
 class Ticket(models.Model):
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE)
@@ -216,4 +437,79 @@ class ParkingLot(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE)
     lot_number = models.CharField(max_length=10)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={'role':'HO'}, related_name='owned_parking_lots')
-    current_tenant = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={'role': 'T'}, related_name='assigned_parking_lot')
\ No newline at end of file
+    current_tenant = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={'role': 'T'}, related_name='assigned_parking_lot')
+
+# --- NEW: IMAGE RENDITIONS ---
+class ImageRendition(models.Model):
+    """
+    Processing record for an uploaded photo (guest ID, meter photo, receipt).
+    `property.images` re-encodes the upload into a display copy that replaces it on
+    the owning record, plus a thumbnail for list pages. `source` is the file name
+    the owner currently points at.
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+    source = models.CharField(max_length=255, unique=True)
+    model_label = models.CharField(max_length=100, help_text="Owning model, e.g. property.Expense")
+    object_id = models.BigIntegerField()
+    field_name = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True)
+
+    original_bytes = models.PositiveIntegerField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    display_bytes = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.CharField(max_length=255, blank=True)
+    thumbnail_width = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail_height = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail_bytes = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self): return f"{self.source} ({self.status})"
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='rendition_status_idx')]
+
+
+class MediaBlob(models.Model):
+    """
+    One unique uploaded file, stored once under its SHA-256 digest by
+    `property.storage.ContentAddressedStorage`. `refcount` counts the saves that
+    point at it minus the deletes; `gc_media` recomputes it from the model
+    fields and removes blobs nothing references.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    touched_at = models.DateTimeField(default=timezone.now, help_text="Last time a reference was added or dropped")
+
+    def __str__(self): return f"{self.name} x{self.refcount}"
+    class Meta:
+        indexes = [models.Index(fields=['refcount', 'touched_at'], name='media_blob_gc_idx')]
+
+
+# --- NEW: PLATFORM COUNTERS ---
+class PlatformCounter(models.Model):
+    """
+    Running totals for the super-admin dashboard (platform-wide, or per
+    organization with scope ``org:<id>``), kept up to date by property/signals.py
+    with F() increments instead of counting every table on each page load.
+    `rebuild_platform_counters` recomputes them from the data.
+    """
+    scope = models.CharField(max_length=40)
+    name = models.CharField(max_length=40)
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self): return f"{self.scope} {self.name} = {self.value}"
+    class Meta:
+        unique_together = ('scope', 'name')
@@ -3,6 +3,8 @@ import base64
 from datetime import datetime
 from django.conf import settings
 
+from community_connect import metrics
+
 def get_access_token(consumer_key, consumer_secret):
     """
     Generates a dynamic access token using the provided credentials.
@@ -25,6 +27,7 @@ def lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_de
     """
     access_token = get_access_token(consumer_key, consumer_secret)
     if not access_token:
+        metrics.STK_PUSHES.inc(outcome='auth_failed')
         return {'ResponseCode': '1', 'errorMessage': 'Failed to authenticate with Safaricom.'}
     
     api_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
@@ -53,6 +56,9 @@ def lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_de
     
     try:
         r = requests.post(api_url, json=payload, headers=headers)
-        return r.json()
+        result = r.json()
     except Exception as e:
-        return {'ResponseCode': '1', 'errorMessage': str(e)}
\ No newline at end of file
+        metrics.STK_PUSHES.inc(outcome='error')
+        return {'ResponseCode': '1', 'errorMessage': str(e)}
+    metrics.STK_PUSHES.inc(outcome='accepted' if result.get('ResponseCode') == '0' else 'rejected')
+    return result
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Minimal PDF writer.
+
+Pure Python, no external binaries or font files: text uses the standard
+Helvetica faces every PDF viewer ships, so nothing is embedded and the metrics
+below are all layout needs. Output is deterministic (no timestamps, the file
+ID is derived from the content), so the same document always produces the
+same bytes and can be cached by hash.
+
+Coordinates are in points from the top-left corner of an A4 page.
+"""
+import hashlib
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89
+
+# Advance widths (1/1000 em) for ASCII 32..126 from the Adobe core font metrics.
+_HELVETICA = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+FONTS = {False: ('F1', 'Helvetica', _HELVETICA), True: ('F2', 'Helvetica-Bold', _HELVETICA_BOLD)}
+_DEFAULT_WIDTH = 556
+
+# The shared objects every document starts with. Built once per process.
+_FONT_OBJECTS = tuple(
+    f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>".encode()
+    for _, base, _ in (FONTS[False], FONTS[True])
+)
+_RESOURCES = b"<< /Font << /F1 3 0 R /F2 4 0 R >> >>"
+
+
+def _encode(text):
+    return str(text).encode('cp1252', 'replace')
+
+
+def text_width(text, size, bold=False):
+    widths = FONTS[bold][2]
+    total = 0
+    for byte in _encode(text):
+        total += widths[byte - 32] if 32 <= byte <= 126 else _DEFAULT_WIDTH
+    return total * size / 1000
+
+
+def wrap(text, max_width, size, bold=False):
+    """Greedy word wrap into lines no wider than ``max_width``."""
+    lines, current = [], ''
+    for word in str(text).split():
+        candidate = f"{current} {word}" if current else word
+        if current and text_width(candidate, size, bold) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines or ['']
+
+
+def _escape(raw):
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _num(value):
+    # Fixed precision keeps the output byte-stable across platforms.
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+def _color(rgb):
+    return ' '.join(_num(c / 255) for c in rgb)
+
+
+def hex_color(value):
+    value = value.lstrip('#')
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+class Canvas:
+    """Collects drawing operations page by page and serializes them to PDF bytes."""
+
+    def __init__(self, width=PAGE_WIDTH, height=PAGE_HEIGHT):
+        self.width, self.height = width, height
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self._ops = []
+        self.pages.append(self._ops)
+
+    def raw(self, fragment):
+        """Appends a pre-built content fragment (see `Canvas.fragment`)."""
+        self._ops.append(fragment)
+
+    def text(self, x, y, value, size=10, bold=False, color=(0, 0, 0), align='left'):
+        if align == 'right':
+            x -= text_width(value, size, bold)
+        elif align == 'center':
+            x -= text_width(value, size, bold) / 2
+        font = FONTS[bold][0]
+        self._ops.append(
+            f"BT {_color(color)} rg /{font} {_num(size)} Tf {_num(x)} {_num(self.height - y)} Td (".encode()
+            + _escape(_encode(value)) + b") Tj ET"
+        )
+
+    def rect(self, x, y, w, h, fill=None, stroke=None, line_width=1):
+        ops = []
+        if fill:
+            ops.append(f"{_color(fill)} rg")
+        if stroke:
+            ops.append(f"{_color(stroke)} RG {_num(line_width)} w")
+        paint = 'B' if fill and stroke else ('f' if fill else 'S')
+        ops.append(f"{_num(x)} {_num(self.height - y - h)} {_num(w)} {_num(h)} re {paint}")
+        self._ops.append(' '.join(ops).encode())
+
+    def line(self, x1, y1, x2, y2, color=(0, 0, 0), line_width=1):
+        self._ops.append(
+            f"{_color(color)} RG {_num(line_width)} w {_num(x1)} {_num(self.height - y1)} m "
+            f"{_num(x2)} {_num(self.height - y2)} l S".encode()
+        )
+
+    @classmethod
+    def fragment(cls, draw, width=PAGE_WIDTH, height=PAGE_HEIGHT):
+        """Runs ``draw(canvas)`` on a scratch canvas and returns its ops, for reuse via `raw`."""
+        scratch = cls(width, height)
+        draw(scratch)
+        return b"\n".join(scratch.pages[0])
+
+    def to_bytes(self):
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # Pages, filled in once the kids are known
+            *_FONT_OBJECTS,
+        ]
+        kids = []
+        for ops in self.pages:
+            stream = zlib.compress(b"\n".join(ops), 6)
+            objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            content_ref = len(objects)
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_num(self.width)} {_num(self.height)}] "
+                f"/Contents {content_ref} 0 R /Resources ".encode() + _RESOURCES + b" >>"
+            )
+            kids.append(f"{len(objects)} 0 R")
+        objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            out += b"%010d 00000 n \n" % offset
+        file_id = hashlib.md5(bytes(out)).hexdigest()
+        out += (
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /ID [<{file_id}> <{file_id}>] >>\n"
+            f"startxref\n{xref}\n%%EOF\n"
+        ).encode()
+        return bytes(out)
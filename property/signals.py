@@ -0,0 +1,261 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from users.middleware import invalidate_membership
+from users.models import CustomUser, Organization, SupportMessage
+from . import autocomplete, counters, images, unit_lookup
+from . import cache as dashboard_cache
+from .models import (
+    Announcement, Expense, Invoice, MeterReading, ParkingLot, Property, PropertyStaff, ShortTermStay, Ticket, Unit,
+)
+
+
+# --- Membership cache invalidation ---
+@receiver(post_save, sender=PropertyStaff)
+@receiver(post_delete, sender=PropertyStaff)
+def staff_assignment_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.user_id)
+
+
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def unit_ownership_changed(sender, instance, **kwargs):
+    # Home Owners derive their organization from the units they own.
+    invalidate_membership(instance.owner_id, getattr(instance, '_loaded_owner_id', None))
+
+
+# --- Unit directory invalidation ---
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def unit_directory_changed(sender, instance, **kwargs):
+    unit_lookup.invalidate_unit(instance.organization_id, instance.unit_key, getattr(instance, '_loaded_unit_key', None))
+
+
+@receiver(pre_delete, sender=CustomUser)
+def tenant_removed(sender, instance, **kwargs):
+    # Deleting a tenant clears Unit.current_tenant with a bulk UPDATE (no Unit signals).
+    for unit in Unit.objects.filter(current_tenant=instance).only('id', 'organization_id', 'property_id', 'owner_id', 'unit_number', 'unit_key'):
+        unit_lookup.invalidate_unit(unit.organization_id, unit.unit_key)
+        counters.count_units(unit.property_id, unit.organization_id, occupied=-1, using=unit._state.db)
+        dashboard_cache.bump(dashboard_cache.org_scope(unit.organization_id), dashboard_cache.user_scope(unit.owner_id))
+        unit.current_tenant_id = None
+        autocomplete.refresh_unit(unit)
+
+
+# --- Autocomplete index maintenance ---
+@receiver(post_save, sender=Unit)
+def unit_index_changed(sender, instance, **kwargs):
+    autocomplete.refresh_unit(instance)
+
+
+@receiver(post_delete, sender=Unit)
+def unit_index_removed(sender, instance, **kwargs):
+    autocomplete.forget_unit(instance.organization_id, instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def tenant_index_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login; new users cannot occupy a unit yet.
+    if created or instance.role != 'T' or update_fields == frozenset({'last_login'}):
+        return
+    autocomplete.refresh_tenant(instance)
+
+
+# --- Image ingestion ---
+@receiver(post_save, sender=ShortTermStay)
+@receiver(post_save, sender=MeterReading)
+@receiver(post_save, sender=Expense)
+def photo_uploaded(sender, instance, update_fields=None, **kwargs):
+    field_name = images.IMAGE_FIELDS[sender._meta.label]
+    if update_fields is None or field_name in update_fields:
+        images.enqueue(instance, field_name)
+
+
+# --- Dashboard cache versions ---
+def _unit_people(unit_id):
+    return Unit.objects.filter(pk=unit_id).values_list('owner_id', 'current_tenant_id').first() or (None, None)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invoice_dashboards_changed(sender, instance, **kwargs):
+    # Platform revenue is read from the counters, so invoices leave the PLATFORM scope alone.
+    owner_id, tenant_id = _unit_people(instance.unit_id)
+    dashboard_cache.bump(
+        dashboard_cache.org_scope(instance.organization_id), dashboard_cache.user_scope(owner_id),
+        dashboard_cache.user_scope(tenant_id),
+    )
+
+
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def unit_dashboards_changed(sender, instance, **kwargs):
+    dashboard_cache.bump(
+        dashboard_cache.org_scope(instance.organization_id),
+        *(dashboard_cache.user_scope(user_id) for user_id in (
+            instance.owner_id, instance.current_tenant_id,
+            getattr(instance, '_loaded_owner_id', None), getattr(instance, '_loaded_tenant_id', None),
+        )),
+    )
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def announcement_dashboards_changed(sender, instance, **kwargs):
+    org_id = Property.objects.filter(pk=instance.property_id).values_list('organization_id', flat=True).first()
+    dashboard_cache.bump(dashboard_cache.org_scope(org_id))
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_dashboards_changed(sender, instance, **kwargs):
+    org_id = Unit.objects.filter(pk=instance.unit_id).values_list('organization_id', flat=True).first()
+    dashboard_cache.bump(dashboard_cache.org_scope(org_id), dashboard_cache.user_scope(instance.submitted_by_id))
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def expense_dashboards_changed(sender, instance, **kwargs):
+    dashboard_cache.bump(dashboard_cache.org_scope(instance.organization_id))
+
+
+@receiver(post_save, sender=ParkingLot)
+@receiver(post_delete, sender=ParkingLot)
+def parking_dashboards_changed(sender, instance, **kwargs):
+    dashboard_cache.bump(dashboard_cache.user_scope(instance.owner_id), dashboard_cache.user_scope(instance.current_tenant_id))
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+@receiver(post_save, sender=SupportMessage)
+@receiver(post_delete, sender=SupportMessage)
+def platform_dashboard_changed(sender, instance, **kwargs):
+    org_id = instance.pk if sender is Organization else getattr(instance, 'organization_id', None)
+    dashboard_cache.bump(dashboard_cache.PLATFORM, dashboard_cache.org_scope(org_id))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_dashboards_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields == frozenset({'last_login'}):
+        return
+    dashboard_cache.bump(dashboard_cache.PLATFORM, dashboard_cache.user_scope(instance.pk))
+
+
+# --- Platform counters ---
+def _moved(changes, name, old_scope, new_scope, old_value, new_value):
+    """Adds the change of one per-organization counter (and the platform total) to ``changes``."""
+    for scope, delta in ((old_scope, -old_value), (new_scope, new_value)):
+        if scope:
+            changes[(scope, name)] = changes.get((scope, name), 0) + delta
+    changes[(dashboard_cache.PLATFORM, name)] = new_value - old_value
+
+
+@receiver(post_save, sender=Organization)
+def organization_counted(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.adjust({(counters.PLATFORM, counters.ORGANIZATIONS): 1})
+
+
+@receiver(post_delete, sender=Organization)
+def organization_uncounted(sender, instance, **kwargs):
+    counters.adjust({(counters.PLATFORM, counters.ORGANIZATIONS): -1})
+    counters.forget(counters.org_scope(instance.pk))
+
+
+@receiver(post_save, sender=CustomUser)
+def user_counted(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    old_role, old_org = (None, None) if created else (
+        getattr(instance, '_loaded_role', instance.role), getattr(instance, '_loaded_organization_id', instance.organization_id)
+    )
+    changes = {(counters.PLATFORM, counters.LANDLORDS): (instance.role == 'HO') - (old_role == 'HO')}
+    if old_org != instance.organization_id:
+        changes[(counters.org_scope(old_org), counters.MEMBERS)] = -1
+        changes[(counters.org_scope(instance.organization_id), counters.MEMBERS)] = 1
+    counters.adjust(changes)
+    instance._loaded_role, instance._loaded_organization_id = instance.role, instance.organization_id
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_uncounted(sender, instance, **kwargs):
+    counters.adjust({
+        (counters.PLATFORM, counters.LANDLORDS): -(instance.role == 'HO'),
+        (counters.org_scope(instance.organization_id), counters.MEMBERS): -1,
+    })
+
+
+@receiver(post_save, sender=Property)
+def property_counted(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_org = None if created else getattr(instance, '_loaded_organization_id', instance.organization_id)
+    changes = {}
+    _moved(changes, counters.PROPERTIES, counters.org_scope(old_org), counters.org_scope(instance.organization_id),
+           1 if old_org else 0, 1)
+    counters.adjust(changes, using=instance._state.db)
+    instance._loaded_organization_id = instance.organization_id
+
+
+@receiver(post_delete, sender=Property)
+def property_uncounted(sender, instance, **kwargs):
+    changes = {}
+    _moved(changes, counters.PROPERTIES, counters.org_scope(instance.organization_id), None, 1, 0)
+    counters.adjust(changes, using=instance._state.db)
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_counted(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'is_paid', 'amount', 'organization'} & set(update_fields)):
+        return
+    loaded = (None, 0) if created else getattr(instance, '_loaded_revenue', None)
+    if loaded is None:
+        return  # Loaded with deferred fields; the next rebuild catches any change
+    changes = {}
+    _moved(changes, counters.REVENUE, counters.org_scope(loaded[0]), counters.org_scope(instance.organization_id),
+           loaded[1], instance.paid_amount())
+    counters.adjust(changes, using=instance._state.db)
+    instance._loaded_revenue = (instance.organization_id, instance.paid_amount())
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_uncounted(sender, instance, **kwargs):
+    changes = {}
+    _moved(changes, counters.REVENUE, counters.org_scope(instance.organization_id), None, instance.paid_amount(), 0)
+    counters.adjust(changes, using=instance._state.db)
+
+
+
+# --- Unit counters ---
+@receiver(post_save, sender=Unit)
+def unit_counted(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # (property, organization, occupied) as loaded and as saved
+    old = (None, None, 0) if created else (
+        getattr(instance, '_loaded_source_id', instance.property_id),
+        getattr(instance, '_loaded_organization_id', instance.organization_id),
+        int(getattr(instance, '_loaded_tenant_id', instance.current_tenant_id) is not None),
+    )
+    new = (instance.property_id, instance.organization_id, int(instance.current_tenant_id is not None))
+    if old == new:
+        return
+    using = instance._state.db
+    if old[0] == new[0]:
+        counters.count_units(new[0], None, occupied=new[2] - old[2], using=using)
+    else:
+        counters.count_units(old[0], None, units=-1 if old[0] else 0, occupied=-old[2], using=using)
+        counters.count_units(new[0], None, units=1, occupied=new[2], using=using)
+    if old[1] != new[1]:
+        counters.count_units(None, old[1], units=-1, using=using)
+        counters.count_units(None, new[1], units=1, using=using)
+    instance._loaded_organization_id, instance._loaded_tenant_id = instance.organization_id, instance.current_tenant_id
+
+
+@receiver(post_delete, sender=Unit)
+def unit_uncounted(sender, instance, **kwargs):
+    counters.count_units(instance.property_id, instance.organization_id, units=-1,
+                         occupied=-(instance.current_tenant_id is not None), using=instance._state.db)
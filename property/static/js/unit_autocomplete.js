@@ -0,0 +1,38 @@
+/*
+ * Unit / tenant suggestions for free-text unit number boxes.
+ * Usage: <input data-unit-autocomplete="{% url 'property:unit_autocomplete_api' %}" ...>
+ */
+(function () {
+    document.querySelectorAll('[data-unit-autocomplete]').forEach((input, i) => {
+        const url = input.dataset.unitAutocomplete;
+        const list = document.createElement('datalist');
+        list.id = `unit-suggestions-${i}`;
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(list);
+
+        let timer = null;
+        let controller = null;
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const q = input.value.trim();
+            if (!q) { list.innerHTML = ''; return; }
+            timer = setTimeout(async () => {
+                if (controller) controller.abort();
+                controller = new AbortController();
+                try {
+                    const response = await fetch(`${url}?q=${encodeURIComponent(q)}`, { signal: controller.signal });
+                    if (!response.ok) return;
+                    const data = await response.json();
+                    list.innerHTML = '';
+                    data.results.forEach(r => {
+                        const option = document.createElement('option');
+                        option.value = r.unit_number;
+                        option.label = r.tenant ? `${r.unit_number} — ${r.tenant}` : r.unit_number;
+                        list.appendChild(option);
+                    });
+                } catch (e) { /* aborted or offline: keep typing */ }
+            }, 120);
+        });
+    });
+})();
@@ -0,0 +1,94 @@
+"""
+Content-addressed media storage.
+
+Every saved file is hashed while it streams to a temp file beside the blob
+store, then renamed to ``blobs/ab/cd/<sha256><ext>``. If that blob already
+exists the copy is dropped, so a guest's re-used ID photo or a re-submitted
+meter photo costs one row, not another file. Blobs never change once written,
+which keeps incremental backups of MEDIA_ROOT small.
+
+``delete()`` only drops a reference; files are removed by `gc_media` once
+nothing points at them. Names saved before this backend (the dated
+``upload_to`` paths) keep working and are deleted the old way.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs'
+INCOMING_PREFIX = '.incoming-'
+
+# Text columns that hold storage names without being FileFields.
+EXTRA_REFERENCES = (
+    ('property.ShortTermStayArchive', 'id_passport_image'),
+    ('property.ImageRendition', 'thumbnail'),
+)
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content, so the requested one never collides.
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()[:10]
+        incoming_dir = self.path(BLOB_PREFIX)
+        os.makedirs(incoming_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=incoming_dir, prefix=INCOMING_PREFIX)
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            hexdigest = digest.hexdigest()
+            blob_name = f"{BLOB_PREFIX}/{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{ext}"
+            final_path = self.path(blob_name)
+            if os.path.exists(final_path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._add_reference(blob_name, hexdigest, size)
+        return blob_name
+
+    def _add_reference(self, name, digest, size):
+        from .models import MediaBlob
+        try:
+            MediaBlob.objects.get_or_create(name=name, defaults={'digest': digest, 'size': size})
+        except IntegrityError:
+            pass  # Created concurrently by another upload of the same bytes
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, touched_at=timezone.now())
+
+    def delete(self, name):
+        if not is_blob(name):
+            return super().delete(name)
+        from .models import MediaBlob
+        MediaBlob.objects.filter(name=name, refcount__gt=0).update(
+            refcount=F('refcount') - 1, touched_at=timezone.now()
+        )
+
+    def transfer_references(self, old_name, new_name, count):
+        """Moves ``count`` references from one blob to another after a bulk rename of field values."""
+        from .models import MediaBlob
+        now = timezone.now()
+        MediaBlob.objects.filter(name=old_name).update(refcount=Greatest(F('refcount') - count, 0), touched_at=now)
+        MediaBlob.objects.filter(name=new_name).update(refcount=F('refcount') + count, touched_at=now)
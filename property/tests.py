@@ -1,3 +1,874 @@
-from django.test import TestCase
+import datetime
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Executor, Future
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.core.management import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from community_connect import sharding
+from users.models import CustomUser, Organization
+
+from . import (
+    analytics, archive, autocomplete, availability, billing, concurrency, counters, documents, gate_board, gate_sync,
+    images, storage, unit_lookup,
+)
+from . import cache as dashboard_cache
+from .models import (
+    Expense, GateTrafficHourly, ImageRendition, Invoice, MediaBlob, Notification, PlatformCounter, Property,
+    ShortTermStay, ShortTermStayArchive, SoftwareInvoice, Unit, VisitorLog, VisitorLogArchive,
+)
+
+
+class PropertyTestCase(TestCase):
+    """One organization with a property, a tenanted unit and its people."""
+
+    def setUp(self):
+        cache.clear()
+        unit_lookup.clear()
+        autocomplete.clear()
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+        self.pm = CustomUser.objects.create_user(username="pm", password="x", role='PM', organization=self.org)
+        self.guard = CustomUser.objects.create_user(username="guard", password="x", role='SEC', organization=self.org)
+        self.owner = CustomUser.objects.create_user(username="ho", password="x", role='HO')
+        self.tenant = CustomUser.objects.create_user(username="tenant", password="x", role='T')
+        self.prop = Property.objects.create(name="Greenwood", organization=self.org)
+        self.unit = Unit.objects.create(property=self.prop, block="A", floor="1", door_number="04",
+                                        owner=self.owner, current_tenant=self.tenant)
+
+
+class MediaTestCase(PropertyTestCase):
+    """Uploads go to a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def photo(self, name="id.png", size=(200, 100), color=(200, 30, 30, 255)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+# --- Organization scoping (027) ---
+class OrganizationBackfillTests(PropertyTestCase):
+    def test_rows_take_their_organization_on_save(self):
+        invoice = Invoice.objects.create(unit=self.unit, amount=100, due_date=datetime.date.today())
+        self.assertEqual(invoice.organization_id, self.org.pk)
+
+    def test_migration_backfills_existing_rows(self):
+        migration = importlib.import_module('property.migrations.0003_organization_scoping')
+        invoice = Invoice.objects.create(unit=self.unit, amount=100, due_date=datetime.date.today())
+        visit = VisitorLog.objects.create(unit=self.unit, visitor_name="Visitor")
+        expense = Expense.objects.create(property=self.prop, payee="Plumber", amount=50, date_incurred=datetime.date.today())
+        later = [Invoice.objects.create(unit=self.unit, amount=n, due_date=datetime.date.today()) for n in range(4)]
+        for model in (Invoice, VisitorLog, Expense):
+            model.objects.update(organization=None)
+
+        with mock.patch.object(migration, 'CHUNK_SIZE', 2):  # Several pk windows
+            migration.populate_organizations(apps, SimpleNamespace(connection=connection))
+
+        for row in (invoice, visit, expense, *later):
+            row.refresh_from_db()
+            self.assertEqual(row.organization_id, self.org.pk)
+
+
+# --- Unit number lookup (028) ---
+class UnitLookupTests(PropertyTestCase):
+    def test_typed_numbers_are_normalized(self):
+        expected = (self.unit.pk, self.tenant.pk)
+        self.assertEqual(unit_lookup.lookup_unit(self.org.pk, self.unit.unit_number), expected)
+        self.assertEqual(unit_lookup.lookup_unit(self.org.pk, f"  {self.unit.unit_number.lower()} "), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(unit_lookup.lookup_unit(self.org.pk, self.unit.unit_number), expected)
+
+    def test_lookup_is_scoped_to_the_organization(self):
+        other = Organization.objects.create(name="Org Two", is_active=True)
+        self.assertIsNone(unit_lookup.lookup_unit(other.pk, self.unit.unit_number))
+        self.assertIsNone(unit_lookup.find_unit(other, self.unit.unit_number))
+        self.assertEqual(unit_lookup.find_unit(self.org, self.unit.unit_number), self.unit)
+
+    def test_tenancy_change_drops_the_cached_entry(self):
+        unit_lookup.lookup_unit(self.org.pk, self.unit.unit_number)
+        self.unit.current_tenant = None
+        self.unit.save()
+        self.assertEqual(unit_lookup.lookup_unit(self.org.pk, self.unit.unit_number), (self.unit.pk, None))
+
+    def test_renumbered_unit_is_found_under_its_new_number(self):
+        old_number = self.unit.unit_number
+        self.assertIsNone(unit_lookup.lookup_unit(self.org.pk, "A-105"))
+        self.unit.door_number = "05"
+        self.unit.save()
+        self.assertIsNone(unit_lookup.lookup_unit(self.org.pk, old_number))
+        self.assertEqual(unit_lookup.lookup_unit(self.org.pk, self.unit.unit_number)[0], self.unit.pk)
+
+    def test_migration_fills_keys(self):
+        migration = importlib.import_module('property.migrations.0004_unit_lookup_key')
+        Unit.objects.update(unit_key='', organization=None)
+        migration.populate_unit_keys(apps, SimpleNamespace(connection=connection))
+        self.unit.refresh_from_db()
+        self.assertEqual((self.unit.unit_key, self.unit.organization_id), (Unit.normalize_number(self.unit.unit_number), self.org.pk))
+
+
+# --- Unit autocomplete (029) ---
+class AutocompleteTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tenant.phone_number = "+254 712 345678"
+        self.tenant.save()
+
+    def unit_ids(self, query, org=None):
+        return [row['unit_id'] for row in autocomplete.search((org or self.org).pk, query)]
+
+    def test_matches_unit_number_username_and_phone(self):
+        self.assertEqual(self.unit_ids(self.unit.unit_number[:2].lower()), [self.unit.pk])
+        self.assertEqual(self.unit_ids("TEN"), [self.unit.pk])
+        self.assertEqual(self.unit_ids("0712"), [self.unit.pk])
+        self.assertEqual(self.unit_ids("+254 712"), [self.unit.pk])
+        self.assertEqual(self.unit_ids("zz"), [])
+        self.assertEqual(self.unit_ids("A", org=Organization.objects.create(name="Org Two")), [])
+
+    def test_built_index_is_patched_by_signals(self):
+        self.unit_ids("A")
+        spare = Unit.objects.create(property=self.prop, block="B", floor="2", door_number="01")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unit_ids("B-"), [spare.pk])
+
+        self.tenant.username = "wanjiru"
+        self.tenant.save()
+        self.assertEqual(self.unit_ids("wan"), [self.unit.pk])
+        self.assertEqual(self.unit_ids("tenant"), [])
+
+        spare.delete()
+        self.assertEqual(self.unit_ids("B-"), [])
+
+    def test_api_serves_the_requesting_organization(self):
+        self.client.force_login(self.guard)
+        response = self.client.get('/app/api/units/autocomplete/', {'q': "ten"})
+        self.assertEqual(response.json()['results'], [
+            {'unit_id': self.unit.pk, 'unit_number': self.unit.unit_number, 'tenant': "tenant"},
+        ])
+
+
+# --- Security desk board (030) ---
+class GateBoardTests(PropertyTestCase):
+    def poll(self, since):
+        return self.client.get('/app/api/security/board/', {'since': since.isoformat()})
+
+    def test_deltas_since_the_cursor(self):
+        self.client.force_login(self.guard)
+        since = timezone.now()
+        inside = VisitorLog.objects.create(unit=self.unit, visitor_name="Courier")
+        leaving = VisitorLog.objects.create(unit=self.unit, visitor_name="Plumber")
+        leaving.is_active = False
+        leaving.exit_time = timezone.now()
+        leaving.save()
+
+        body = self.poll(since).json()
+        self.assertEqual([row['id'] for row in body['entered']], [inside.pk])
+        self.assertEqual(body['entered'][0]['unit_number'], self.unit.unit_number)
+        self.assertEqual(body['exited'], [leaving.pk])
+
+        cursor = gate_board.parse_cursor(body['cursor']) + gate_board.CURSOR_OVERLAP
+        self.assertEqual(self.poll(cursor).json()['entered'], [])
+
+    def test_other_organizations_stay_off_the_board(self):
+        other = Organization.objects.create(name="Org Two", is_active=True)
+        prop = Property.objects.create(name="Elsewhere", organization=other)
+        since = timezone.now()
+        VisitorLog.objects.create(unit=Unit.objects.create(property=prop, block="C", floor="1", door_number="01"), visitor_name="Guest")
+        self.assertEqual(gate_board.board_changes(self.org, since)[1:], ([], []))
+
+    def test_cursor_is_required(self):
+        self.client.force_login(self.guard)
+        self.assertEqual(self.client.get('/app/api/security/board/', {'since': "2026-13-01T00:00:00"}).status_code, 400)
+        self.assertEqual(self.client.get('/app/api/security/board/').status_code, 400)
+
+
+# --- Gate device sync (031) ---
+class GateSyncTests(PropertyTestCase):
+    def entry(self, key, **extra):
+        return {'key': key, 'type': 'entry', 'unit_number': self.unit.unit_number, 'visitor_name': "Courier", **extra}
+
+    def test_replayed_batch_is_idempotent(self):
+        events = [self.entry('k1'), self.entry('k2'), {'key': 'k3', 'type': 'exit', 'entry_key': 'k1'}]
+        first = gate_sync.apply_events(self.org, self.guard, events)
+        self.assertEqual([r['status'] for r in first], ['created', 'created', 'applied'])
+
+        again = gate_sync.apply_events(self.org, self.guard, events)
+        self.assertEqual([r['status'] for r in again], ['duplicate', 'duplicate', 'duplicate'])
+        self.assertEqual([r['visitor_id'] for r in again], [r['visitor_id'] for r in first])
+        self.assertEqual(VisitorLog.objects.count(), 2)
+        self.assertEqual(Notification.objects.filter(recipient=self.tenant).count(), 2)
+
+    def test_repeated_key_in_one_batch_is_written_once(self):
+        results = gate_sync.apply_events(self.org, self.guard, [self.entry('k1'), self.entry('k1')])
+        self.assertEqual([r['status'] for r in results], ['created', 'duplicate'])
+        self.assertEqual(results[0]['visitor_id'], results[1]['visitor_id'])
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_malformed_events_fail_alone(self):
+        results = gate_sync.apply_events(self.org, self.guard, [
+            self.entry('bad-time', occurred_at='2026-13-01T00:00:00'),
+            self.entry('bad-name', visitor_name=['x']),
+            {'key': 'bad-exit', 'type': 'exit', 'visitor_id': 'abc'},
+            {'type': 'entry'},
+            self.entry('good'),
+        ])
+        self.assertEqual([r['status'] for r in results], ['error', 'error', 'error', 'error', 'created'])
+        self.assertEqual(VisitorLog.objects.get().client_key, 'good')
+
+    def test_board_reports_replayed_rows_by_write_time(self):
+        since = timezone.now()
+        hours_ago = (since - datetime.timedelta(hours=3)).isoformat()
+        entered = gate_sync.apply_events(self.org, self.guard, [self.entry('k1', occurred_at=hours_ago)])[0]['visitor_id']
+        left = gate_sync.apply_events(self.org, self.guard, [self.entry('k2', occurred_at=hours_ago)])[0]['visitor_id']
+        gate_sync.apply_events(self.org, self.guard, [{'key': 'k3', 'type': 'exit', 'visitor_id': left}])
+
+        cursor, rows, exited = gate_board.board_changes(self.org, since)
+        self.assertEqual([row['id'] for row in rows], [entered])
+        self.assertEqual(exited, [left])
+
+        _, rows, exited = gate_board.board_changes(self.org, cursor + gate_board.CURSOR_OVERLAP)
+        self.assertEqual((rows, exited), ([], []))
+
+    def test_api_returns_results_and_the_full_board_on_first_sync(self):
+        self.client.force_login(self.guard)
+        response = self.client.post('/app/api/gate/sync/', json.dumps({'events': [self.entry('k1')]}),
+                                    content_type='application/json')
+        body = response.json()
+        self.assertEqual([r['status'] for r in body['results']], ['created'])
+        self.assertEqual([row['id'] for row in body['entered']], [body['results'][0]['visitor_id']])
+
+        self.assertEqual(self.client.post('/app/api/gate/sync/', "{", content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post('/app/api/gate/sync/', json.dumps({'events': {}}),
+                                          content_type='application/json').status_code, 400)
+
+
+# --- Gate history archive (032) ---
+class GateArchiveTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.old = self.now - datetime.timedelta(days=120)
+        self.closed = VisitorLog.objects.create(unit=self.unit, visitor_name="Old Courier", entry_time=self.old,
+                                                exit_time=self.old + datetime.timedelta(hours=1), is_active=False)
+        self.still_inside = VisitorLog.objects.create(unit=self.unit, visitor_name="Long Stay", entry_time=self.old)
+        self.recent = VisitorLog.objects.create(unit=self.unit, visitor_name="New Courier", is_active=False,
+                                                exit_time=self.now)
+
+    def test_only_closed_rows_past_the_cutoff_move(self):
+        call_command('archive_gate_history', stdout=StringIO())
+        self.assertEqual(set(VisitorLog.objects.values_list('pk', flat=True)), {self.still_inside.pk, self.recent.pk})
+        archived = VisitorLogArchive.objects.get()
+        self.assertEqual((archived.original_id, archived.unit_number, archived.month),
+                         (self.closed.pk, self.unit.unit_number, self.old.date().replace(day=1)))
+
+    def test_closed_stays_move_too(self):
+        stay = ShortTermStay.objects.create(unit=self.unit, guest_name="Guest", guest_id_number="123")
+        stay.check_out_time, stay.is_active = self.old + datetime.timedelta(days=1), False
+        stay.save()
+        ShortTermStay.objects.filter(pk=stay.pk).update(check_in_time=self.old)
+        self.assertEqual(archive.archive_stays(self.now - datetime.timedelta(days=90)), 1)
+        self.assertFalse(ShortTermStay.objects.exists())
+        self.assertEqual(ShortTermStayArchive.objects.get().original_id, stay.pk)
+
+    def test_history_search_reads_live_and_archived_rows(self):
+        archive.archive_visitors(self.now - datetime.timedelta(days=90))
+        rows = archive.search_visitor_history(self.org, "courier", self.old.date(), self.now.date())
+        self.assertEqual([(row['visitor_name'], row['archived']) for row in rows],
+                         [("New Courier", False), ("Old Courier", True)])
+        rows = archive.search_visitor_history(self.org, self.unit.unit_number.lower(), self.old.date(), self.now.date())
+        self.assertEqual(len(rows), 3)
+
+
+# --- Gate traffic rollups (033) ---
+class GateRollupTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hour = analytics._hour(timezone.now()) - datetime.timedelta(hours=5)
+
+    def visit(self, entry, exit=None, **extra):
+        return VisitorLog.objects.create(unit=self.unit, visitor_name="Visitor", entry_time=entry, exit_time=exit,
+                                         is_active=exit is None, **extra)
+
+    def buckets(self):
+        return list(GateTrafficHourly.objects.order_by('hour', 'visitor_type').values_list('hour', 'visitor_type', 'entries', 'exits'))
+
+    def test_hours_are_rolled_up(self):
+        self.visit(self.hour + datetime.timedelta(minutes=10), self.hour + datetime.timedelta(minutes=40))
+        self.visit(self.hour + datetime.timedelta(minutes=20), visitor_type='DELIVERY')
+        analytics.rollup_hours(self.hour, self.hour + analytics.HOUR)
+        self.assertEqual(self.buckets(), [(self.hour, 'DELIVERY', 1, 0), (self.hour, 'SOCIAL', 1, 1)])
+        self.assertEqual(GateTrafficHourly.objects.get(visitor_type='SOCIAL').dwell_seconds_total, 30 * 60)
+
+    def test_incremental_run_rebuilds_hours_of_replayed_rows(self):
+        analytics.rollup_changes('default')
+        replayed = self.hour - datetime.timedelta(days=3)  # Older than the first run's window
+        self.visit(replayed, replayed + datetime.timedelta(minutes=5))
+        _, hours = analytics.rollup_changes('default')
+        self.assertEqual(hours, 1)
+        self.assertEqual(self.buckets(), [(replayed, 'SOCIAL', 1, 1)])
+
+    def test_full_rebuild_keeps_buckets_of_archived_hours(self):
+        old = self.hour - datetime.timedelta(days=60)
+        self.visit(old, old + datetime.timedelta(minutes=5))
+        self.visit(self.hour)
+        analytics.rollup_hours(old, timezone.now())  # Before the archive run: no cutoff yet
+        call_command('archive_gate_history', days=10, stdout=StringIO())
+        self.assertEqual(VisitorLog.objects.count(), 1)
+
+        call_command('rollup_gate_traffic', hours=24 * 80, stdout=StringIO())
+        self.assertEqual(self.buckets(), [(old, 'SOCIAL', 1, 1), (self.hour, 'SOCIAL', 1, 0)])
+
+
+# --- Short-stay availability (034) ---
+class AvailabilityTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.vacant = Unit.objects.create(property=self.prop, block="A", floor="1", door_number="05")
+        self.stay = ShortTermStay.objects.create(
+            unit=self.vacant, guest_name="Guest", guest_id_number="123",
+            expected_check_out=self.now + datetime.timedelta(days=2),
+        )
+
+    def window(self, start_days, end_days):
+        return self.now + datetime.timedelta(days=start_days), self.now + datetime.timedelta(days=end_days)
+
+    def test_intersecting_window_conflicts(self):
+        self.assertEqual(availability.conflicting_stay(self.vacant, *self.window(1, 3)), self.stay)
+        self.assertEqual(availability.conflicting_stay(self.vacant, *self.window(-1, 1)), self.stay)
+
+    def test_back_to_back_stays_do_not_conflict(self):
+        self.assertIsNone(availability.conflicting_stay(self.vacant, *self.window(2, 4)))
+
+    def test_open_ended_stay_blocks_any_later_window(self):
+        self.stay.expected_check_out = None
+        self.stay.save()
+        self.assertEqual(availability.conflicting_stay(self.vacant, *self.window(30, 31)), self.stay)
+
+    def test_checkout_frees_the_unit(self):
+        self.stay.check_out_time = self.now + datetime.timedelta(hours=1)
+        self.stay.save(update_fields=['check_out_time'])
+        self.assertIsNone(availability.conflicting_stay(self.vacant, *self.window(1, 3)))
+
+    def test_free_units_skip_tenanted_and_booked_units(self):
+        self.assertEqual(list(availability.free_units(self.org, *self.window(0, 1))), [])
+        self.assertEqual(list(availability.free_units(self.org, *self.window(3, 4))), [self.vacant])
+
+    def test_guest_past_planned_checkout_still_occupies(self):
+        self.stay.expected_check_out = self.now - datetime.timedelta(days=1)
+        self.stay.save()
+        self.assertEqual(availability.conflicting_stay(self.vacant, *self.window(0, 1)), self.stay)
+        self.assertEqual(availability.conflicting_stay(self.vacant, self.now, None), self.stay)
+        self.assertEqual(list(availability.free_units(self.org, *self.window(3, 4))), [])
+
+        self.stay.is_active = False
+        self.stay.check_out_time = self.now
+        self.stay.save()
+        self.assertIsNone(availability.conflicting_stay(self.vacant, *self.window(0, 1)))
+        self.assertEqual(list(availability.free_units(self.org, *self.window(0, 1))), [self.vacant])
+
+
+# --- Photo ingestion (035) ---
+@override_settings(IMAGE_PROCESS_IN_BACKGROUND=False, IMAGE_DISPLAY_MAX_SIDE=64, IMAGE_THUMBNAIL_MAX_SIDE=16)
+class ImagePipelineTests(MediaTestCase):
+    def stay(self, **extra):
+        return ShortTermStay.objects.create(unit=self.unit, guest_name="Guest", guest_id_number="123",
+                                            id_passport_image=self.photo(), **extra)
+
+    def test_upload_is_reencoded_with_a_thumbnail(self):
+        stay = self.stay()
+        original = stay.id_passport_image.name
+        self.assertEqual(ImageRendition.objects.get().status, 'PENDING')
+
+        self.assertEqual(images.process_pending(), 1)
+        stay.refresh_from_db()
+        rendition = ImageRendition.objects.get()
+        self.assertNotEqual(stay.id_passport_image.name, original)
+        self.assertEqual((rendition.status, rendition.source), ('DONE', stay.id_passport_image.name))
+        self.assertEqual((rendition.width, rendition.height), (64, 32))
+        self.assertEqual((rendition.thumbnail_width, rendition.thumbnail_height), (16, 8))
+        with default_storage.open(stay.id_passport_image.name) as fh:
+            self.assertEqual(Image.open(fh).format, 'JPEG')
+
+        [listed] = images.attach_thumbnails([stay], 'id_passport_image')
+        self.assertEqual(listed.thumbnail_url, default_storage.url(rendition.thumbnail))
+
+    def test_unreadable_upload_fails_after_retries(self):
+        ShortTermStay.objects.create(unit=self.unit, guest_name="Guest", guest_id_number="123",
+                                     id_passport_image=SimpleUploadedFile("id.jpg", b"not an image"))
+        with self.assertLogs('property.images', 'WARNING'):
+            for _ in range(images.MAX_ATTEMPTS):
+                images.process_pending(limit=1)
+        rendition = ImageRendition.objects.get()
+        self.assertEqual((rendition.status, rendition.attempts), ('FAILED', images.MAX_ATTEMPTS))
+
+    @override_settings(IMAGE_PROCESS_IN_BACKGROUND=True)
+    def test_worker_starts_once_the_owner_commits(self):
+        spy = mock.patch.object(images.transaction, 'on_commit', wraps=images.transaction.on_commit)
+        with mock.patch.object(images, '_kick') as kick, spy as on_commit:
+            with self.captureOnCommitCallbacks(execute=True):
+                stay = self.stay()
+                kick.assert_not_called()
+            kick.assert_called_once_with()
+        on_commit.assert_called_once_with(kick, using=stay._state.db)
+
+
+# --- Content-addressed media (036) ---
+@override_settings(IMAGE_PROCESS_IN_BACKGROUND=False)
+class MediaStorageTests(MediaTestCase):
+    def gc(self):
+        call_command('gc_media', grace_hours=0, stdout=StringIO())
+
+    def test_identical_uploads_share_one_blob(self):
+        first = default_storage.save("receipts/a.jpg", ContentFile(b"same bytes"))
+        second = default_storage.save("other/b.JPG", ContentFile(b"same bytes"))
+        self.assertEqual(first, second)
+        self.assertTrue(storage.is_blob(first) and first.endswith(".jpg"))
+        self.assertEqual(MediaBlob.objects.get(name=first).refcount, 2)
+        self.assertNotEqual(default_storage.save("c.jpg", ContentFile(b"other bytes")), first)
+
+    def test_delete_drops_a_reference_and_gc_removes_the_file(self):
+        name = default_storage.save("a.jpg", ContentFile(b"bytes"))
+        default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 0)
+
+        self.gc()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_gc_recounts_and_keeps_referenced_blobs(self):
+        stay = ShortTermStay.objects.create(unit=self.unit, guest_name="Guest", guest_id_number="123",
+                                            id_passport_image=self.photo())
+        name = stay.id_passport_image.name
+        MediaBlob.objects.filter(name=name).update(refcount=0)  # Drifted count
+        self.gc()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_gc_sweeps_interrupted_uploads(self):
+        default_storage.save("a.jpg", ContentFile(b"bytes"))
+        stray = os.path.join(default_storage.path(storage.BLOB_PREFIX), storage.INCOMING_PREFIX + "crashed")
+        with open(stray, 'wb') as fh:
+            fh.write(b"partial")
+        old = timezone.now().timestamp() - 60
+        os.utime(stray, (old, old))
+        self.gc()
+        self.assertFalse(os.path.exists(stray))
+
+
+# --- PDF documents (037) ---
+class InvoicePdfTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.invoice = Invoice.objects.create(unit=self.unit, amount=1500, due_date=datetime.date(2026, 11, 1))
+        self.url = f'/app/invoice/{self.invoice.pk}/pdf/'
+
+    def test_invoice_is_a_real_pdf(self):
+        self.client.force_login(self.tenant)
+        response = self.client.get(self.url, {'download': 1})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertIn('attachment; filename="INV-', response['Content-Disposition'])
+
+    def test_revalidation_is_answered_without_rendering(self):
+        self.client.force_login(self.tenant)
+        etag = self.client.get(self.url)['ETag']
+        cache.clear()
+        with mock.patch.object(documents, 'render_invoice') as render:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+        render.assert_not_called()
+
+    def test_changed_invoice_gets_a_new_etag(self):
+        self.client.force_login(self.tenant)
+        etag = self.client.get(self.url)['ETag']
+        Invoice.objects.filter(pk=self.invoice.pk).update(amount=2000)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_identical_content_is_rendered_once(self):
+        with mock.patch.object(documents, 'render_invoice', wraps=documents.render_invoice) as render:
+            first = documents.invoice_pdf(documents.invoice_queryset().get(pk=self.invoice.pk))
+            second = documents.invoice_pdf(documents.invoice_queryset().get(pk=self.invoice.pk))
+        self.assertEqual(first, second)
+        self.assertEqual(render.call_count, 1)
+
+    def test_other_residents_are_refused(self):
+        self.client.force_login(CustomUser.objects.create_user(username="t2", password="x", role='T'))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_monthly_statement_pdf(self):
+        self.client.force_login(self.pm)
+        response = self.client.get('/app/finance/report/pdf/')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+
+# --- Batch PDF export (038) ---
+class InlineExecutor(Executor):
+    """Runs pool tasks in the calling process, inside the test's transaction."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+@mock.patch('property.management.commands.render_invoice_pdfs.ProcessPoolExecutor', InlineExecutor)
+class BatchPdfTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in (1, 2, 3):
+            Invoice.objects.create(unit=self.unit, amount=100 * day, due_date=datetime.date(2026, 10, day))
+        Invoice.objects.create(unit=self.unit, amount=50, due_date=datetime.date(2026, 9, 1))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.output = os.path.join(directory, "invoices.zip")
+
+    def export(self, *args):
+        out = StringIO()
+        call_command('render_invoice_pdfs', self.output, '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def names(self):
+        with zipfile.ZipFile(self.output) as archive:
+            return sorted(archive.namelist())
+
+    def test_invoices_land_in_property_folders_and_reruns_resume(self):
+        self.export()
+        folder = f"{self.prop.pk}-greenwood/"
+        self.assertEqual(self.names(), sorted(f"{folder}INV-{pk:05d}.pdf" for pk in Invoice.objects.values_list('pk', flat=True)))
+        with zipfile.ZipFile(self.output) as archive:
+            self.assertTrue(archive.read(self.names()[0]).startswith(b'%PDF'))
+        self.assertIn("4 PDFs already", self.export())
+
+    def test_month_filter_adds_the_statement(self):
+        self.export('--month', '2026-10')
+        self.assertEqual(len([n for n in self.names() if n.startswith(f"{self.prop.pk}-")]), 3)
+        self.assertIn("statements/org-one-2026-10.pdf", self.names())
+
+    def test_archive_cut_short_is_recovered_and_completed(self):
+        self.export()
+        with open(self.output, 'rb') as fh:
+            data = fh.read()
+        with zipfile.ZipFile(self.output) as archive:
+            third = archive.infolist()[2].header_offset
+        with open(self.output, 'wb') as fh:
+            fh.write(data[:third + 10])  # Killed while writing the third entry
+
+        self.assertIn("Recovered 2 complete PDFs", self.export())
+        self.assertEqual(len(self.names()), 4)
+
+
+# --- Dashboard cache (039) ---
+class DashboardCacheTests(PropertyTestCase):
+    def test_value_is_built_once_per_version(self):
+        build = mock.Mock(side_effect=[1, 2])
+        scope = dashboard_cache.org_scope(self.org.pk)
+        self.assertEqual(dashboard_cache.cached('kpis', [scope], build), 1)
+        self.assertEqual(dashboard_cache.cached('kpis', [scope], build), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.bump(scope)
+            self.assertEqual(dashboard_cache.cached('kpis', [scope], build), 1)  # Not before commit
+        self.assertEqual(dashboard_cache.cached('kpis', [scope], build), 2)
+
+    def test_bumps_only_touch_their_scopes(self):
+        org, user = dashboard_cache.org_scope(self.org.pk), dashboard_cache.user_scope(self.tenant.pk)
+        before = dashboard_cache.versions(org, user)
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.bump(user)
+        after = dashboard_cache.versions(org, user)
+        self.assertEqual(after.split('.')[0], before.split('.')[0])
+        self.assertNotEqual(after.split('.')[1], before.split('.')[1])
+
+    def test_evicted_version_never_returns_to_an_old_value(self):
+        scope = dashboard_cache.org_scope(self.org.pk)
+        old = dashboard_cache.versions(scope)
+        cache.delete(f"ver:{scope}")
+        self.assertGreater(int(dashboard_cache.versions(scope)), int(old))
+
+    def test_invoice_changes_bump_the_organization_and_its_residents(self):
+        scopes = [dashboard_cache.org_scope(self.org.pk), dashboard_cache.user_scope(self.owner.pk),
+                  dashboard_cache.user_scope(self.tenant.pk), dashboard_cache.PLATFORM]
+        before = dashboard_cache.versions(*scopes).split('.')
+        with self.captureOnCommitCallbacks(execute=True):
+            Invoice.objects.create(unit=self.unit, amount=100, due_date=datetime.date.today())
+        after = dashboard_cache.versions(*scopes).split('.')
+        self.assertEqual([a != b for a, b in zip(before, after)], [True, True, True, False])
+
+
+# --- Shard moves (042) ---
+@override_settings(DATABASE_SHARDS=['default', 'shard1'])
+class ShardMoveTests(TransactionTestCase):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+        tenant = CustomUser.objects.create_user(username="tenant", password="x", role='T')
+        self.prop = Property.objects.create(name="Greenwood", organization=self.org)
+        self.unit = Unit.objects.create(property=self.prop, block="A", floor="1", door_number="04", current_tenant=tenant)
+        self.invoice = Invoice.objects.create(unit=self.unit, amount=100, due_date=datetime.date.today())
+        VisitorLog.objects.create(unit=self.unit, visitor_name="Courier")
+
+    def move(self, **options):
+        options = {'allow_local_cache': True, 'drain_seconds': 0, 'purge_delay': 0, **options}
+        call_command('move_organization_shard', self.org.pk, 'shard1', stdout=StringIO(), **options)
+
+    def rows(self, model, alias):
+        return sharding.scoped(model, self.org.pk, alias)
+
+    def test_rows_are_copied_and_late_writes_caught_up(self):
+        def write_while_draining(seconds):
+            # Writes that passed the freeze check just before the pause still land on the source...
+            Invoice._base_manager.using('default').filter(pk=self.invoice.pk).update(amount=250)
+            # ...but new ones are refused until the switch.
+            with sharding.using_shard('default', self.org.pk), self.assertRaises(sharding.ShardMoveInProgress):
+                Invoice.objects.create(unit=self.unit, amount=5, due_date=datetime.date.today())
+
+        with mock.patch('property.management.commands.move_organization_shard.time.sleep', side_effect=write_while_draining):
+            self.move()
+
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.shard, 'shard1')
+        self.assertEqual(self.rows(Invoice, 'shard1').get().amount, 250)
+        self.assertEqual((self.rows(Unit, 'shard1').count(), self.rows(VisitorLog, 'shard1').count()), (1, 1))
+        self.assertFalse(self.rows(Unit, 'default').exists())
+        self.assertFalse(self.rows(Invoice, 'default').exists())
+        with sharding.using_shard(sharding.shard_of(self.org.pk), self.org.pk):
+            self.assertEqual(Unit.objects.get().current_tenant.username, "tenant")
+
+    def test_move_refuses_primary_key_collisions(self):
+        other = Organization.objects.create(name="Org Two", is_active=True)
+        Organization.objects.filter(pk=other.pk).update(shard='shard1')
+        with sharding.using_shard('shard1', other.pk):
+            Property.objects.create(pk=self.prop.pk, name="Elsewhere", organization=other)  # Shards number rows independently
+
+        with self.assertRaisesMessage(CommandError, "already exists on 'shard1'"):
+            self.move()
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.shard, 'default')
+        self.assertFalse(self.rows(Property, 'shard1').exists())
+
+    def test_old_shard_refuses_writes_after_the_switch(self):
+        self.move(keep_source=True)
+        with sharding.using_shard('default', self.org.pk), self.assertRaises(sharding.ShardMoveInProgress):
+            Invoice.objects.create(unit=self.unit, amount=5, due_date=datetime.date.today())
+        with sharding.using_shard('shard1', self.org.pk):
+            Invoice.objects.create(unit=self.unit, amount=5, due_date=datetime.date.today())
+        self.assertEqual(self.rows(Invoice, 'shard1').count(), 2)
+
+
+# --- Async dashboards and board stream (043) ---
+class AsyncDashboardTests(TransactionTestCase):
+    """Committed rows, since gathered queries run on worker threads with their own connections."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+        self.pm = CustomUser.objects.create_user(username="pm", password="x", role='PM', organization=self.org)
+        self.guard = CustomUser.objects.create_user(username="guard", password="x", role='SEC', organization=self.org)
+        self.owner = CustomUser.objects.create_user(username="ho", password="x", role='HO')
+        tenant = CustomUser.objects.create_user(username="tenant", password="x", role='T')
+        prop = Property.objects.create(name="Greenwood", organization=self.org)
+        self.unit = Unit.objects.create(property=prop, block="A", floor="1", door_number="04", owner=self.owner, current_tenant=tenant)
+        Unit.objects.create(property=prop, block="A", floor="1", door_number="05", owner=self.owner)
+        today = datetime.date.today()
+        Invoice.objects.create(unit=self.unit, amount=700, due_date=today)
+        Invoice.objects.create(unit=self.unit, amount=300, due_date=today, is_paid=True, payment_date=timezone.now())
+
+    def test_pm_dashboard_gathers_its_kpis(self):
+        self.client.force_login(self.pm)
+        context = self.client.get('/app/pm/').context
+        self.assertEqual((context['total_revenue'], context['total_arrears']), (300, 700))
+        self.assertEqual((context['portfolio_occupancy'], context['total_properties']), (50, 1))
+
+    def test_owner_dashboard_gathers_units_and_rent(self):
+        self.client.force_login(self.owner)
+        context = self.client.get('/app/ho/').context
+        self.assertEqual((context['total_units'], context['active_leases'], context['occupancy_rate']), (2, 1, 50))
+        self.assertEqual(context['collection_rate'], 30)
+
+    def test_gather_keeps_order_and_the_shard_binding(self):
+        async def gathered():
+            with sharding.using_shard('default', self.org.pk):
+                return await concurrency.gather(
+                    sharding.current_organization_id, lambda: Unit.objects.count(), lambda: Invoice.objects.count(),
+                )
+        self.assertEqual(async_to_sync(gathered)(), [self.org.pk, 2, 2])
+
+    @mock.patch.object(gate_board, 'STREAM_INTERVAL', 0)
+    async def test_board_stream_pushes_deltas_over_asgi(self):
+        since = timezone.now() - datetime.timedelta(minutes=1)
+        await VisitorLog.objects.acreate(unit=self.unit, visitor_name="Courier")
+        await self.async_client.aforce_login(self.guard)
+        response = await self.async_client.get('/app/api/security/board/stream/', {'since': since.isoformat()})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = response.streaming_content
+        self.assertTrue((await anext(events)).startswith(b"retry:"))
+        payload = json.loads((await anext(events)).decode().split("data: ", 1)[1])
+        self.assertEqual([row['visitor_name'] for row in payload['entered']], ["Courier"])
+        await events.aclose()
+
+    def test_board_stream_needs_asgi(self):
+        self.client.force_login(self.guard)
+        response = self.client.get('/app/api/security/board/stream/', {'since': timezone.now().isoformat()})
+        self.assertEqual(response.status_code, 501)
+
+
+# --- Platform counters (047) ---
+class PlatformCounterTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        counters.rebuild()
+
+    def stored(self):
+        return {key: value for key, value in counters.recount().items() if value}, {
+            (c.scope, c.name): c.value for c in PlatformCounter.objects.exclude(value=0)
+        }
+
+    def test_signals_keep_counters_in_step_with_the_data(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Organization.objects.create(name="Org Two", is_active=True)
+            CustomUser.objects.create_user(username="ho2", password="x", role='HO', organization=other)
+            lakeside = Property.objects.create(name="Lakeside", organization=other)
+            unit = Unit.objects.create(property=lakeside, block="B", floor="2", door_number="01")
+            invoice = Invoice.objects.create(unit=unit, amount=1500, due_date=datetime.date.today())
+            invoice.is_paid = True
+            invoice.save()
+            self.pm.organization = other
+            self.pm.save()
+            self.owner.role = 'T'
+            self.owner.save()
+            self.prop.delete()
+        fresh, stored = self.stored()
+        self.assertEqual(stored, fresh)
+        platform = counters.read([counters.PLATFORM])[counters.PLATFORM]
+        self.assertEqual((platform[counters.ORGANIZATIONS], platform[counters.LANDLORDS]), (2, 1))
+        self.assertEqual((platform[counters.PROPERTIES], platform[counters.REVENUE]), (1, 1500))
+
+    def test_counters_move_only_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Organization.objects.create(name="Org Two", is_active=True)
+        self.assertEqual(counters.read([counters.PLATFORM])[counters.PLATFORM][counters.ORGANIZATIONS], 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(counters.read([counters.PLATFORM])[counters.PLATFORM][counters.ORGANIZATIONS], 2)
+
+    def test_rebuild_command_reports_and_clears_drift(self):
+        PlatformCounter.objects.filter(scope=counters.PLATFORM, name=counters.PROPERTIES).update(value=40)
+        out = StringIO()
+        call_command('rebuild_platform_counters', '--dry-run', stdout=out)
+        self.assertIn("platform properties: 40.00 -> 1", out.getvalue())
+        self.assertIn("1 of 6 counters differ", out.getvalue())
+        call_command('rebuild_platform_counters', stdout=StringIO())
+        fresh, stored = self.stored()
+        self.assertEqual(stored, fresh)
+
+    def test_counted_paginator_does_not_count(self):
+        paginator = counters.CountedPaginator(Organization.objects.order_by('id'), 25, 60)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 3)
+
+
+# --- Subscription billing (048) ---
+class BillingTests(PropertyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = datetime.date(2026, 10, 19)
+        Organization.objects.filter(pk=self.org.pk).update(next_billing_date=self.today)
+
+    def test_bills_the_subscribed_plan(self):
+        Organization.objects.filter(pk=self.org.pk).update(subscription_plan='PREMIUM', max_units=200)
+        invoices, advanced, manual = billing.bill_due(self.today)
+        self.assertEqual((advanced, manual), (1, []))
+        invoice = SoftwareInvoice.objects.get()
+        self.assertEqual(invoice.amount, 40)  # One unit on the per-unit plan
+        self.assertIn("Premium, 1 units", invoice.description)
+        self.org.refresh_from_db()
+        self.assertEqual((self.org.subscription_plan, self.org.next_billing_date), ('PREMIUM', datetime.date(2026, 11, 19)))
+
+    def test_rerun_does_not_bill_twice(self):
+        billing.bill_due(self.today)
+        Organization.objects.filter(pk=self.org.pk).update(next_billing_date=self.today)
+        billing.bill_due(self.today)
+        self.assertEqual(SoftwareInvoice.objects.count(), 1)
+
+    def test_limit_drift_is_repaired(self):
+        Organization.objects.filter(pk=self.org.pk).update(max_units=999)
+        billing.bill_due(self.today)
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.max_units, 50)
+
+    def test_enterprise_is_left_for_manual_invoicing(self):
+        Organization.objects.filter(pk=self.org.pk).update(subscription_plan='ENTERPRISE', max_units=1000)
+        invoices, advanced, manual = billing.bill_due(self.today)
+        self.assertEqual((invoices, advanced, manual), ([], 1, [(self.org.pk, self.today)]))
+        self.assertFalse(SoftwareInvoice.objects.exists())
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.max_units, 1000)
+
+
+# --- Unit counters and plan limits (049) ---
+class UnitCounterTests(PropertyTestCase):
+    def counts(self):
+        self.prop.refresh_from_db()
+        self.org.refresh_from_db()
+        return self.prop.unit_count, self.prop.occupied_count, self.org.unit_count
+
+    def test_counters_follow_unit_changes(self):
+        self.assertEqual(self.counts(), (1, 1, 1))
+        spare = Unit.objects.create(property=self.prop, block="A", floor="1", door_number="05")
+        self.assertEqual(self.counts(), (2, 1, 2))
+        spare.current_tenant = CustomUser.objects.create_user(username="t2", password="x", role='T')
+        spare.save()
+        self.assertEqual(self.counts(), (2, 2, 2))
+        self.unit.delete()
+        self.assertEqual(self.counts(), (1, 1, 1))
+
+    def test_rebuild_corrects_drift(self):
+        Property.objects.filter(pk=self.prop.pk).update(unit_count=7, occupied_count=0)
+        Organization.objects.filter(pk=self.org.pk).update(unit_count=7)
+        self.assertEqual(counters.rebuild_units(), (1, 1))
+        self.assertEqual(self.counts(), (1, 1, 1))
+        self.assertEqual(counters.rebuild_units(), (0, 0))
+
+    def test_adding_a_unit_past_the_plan_limit_is_refused(self):
+        Organization.objects.filter(pk=self.org.pk).update(unit_count=50)
+        self.assertEqual(counters.units_left(self.org.pk), 0)
+        self.client.force_login(self.pm)
+        self.client.post('/app/pm/add-unit/', {'property': self.prop.pk, 'block': "B", 'floor': "2", 'door_number': "01"})
+        self.assertFalse(Unit.objects.filter(block="B").exists())
+
+        Organization.objects.filter(pk=self.org.pk).update(unit_count=1)
+        self.client.post('/app/pm/add-unit/', {'property': self.prop.pk, 'block': "B", 'floor': "2", 'door_number': "01"})
+        self.assertTrue(Unit.objects.filter(block="B").exists())
@@ -0,0 +1,84 @@
+"""
+Per-organization unit directory.
+
+Gate guards, caretakers and PMs type unit numbers all day. Each organization
+gets a small in-process LRU map of normalized unit number -> (unit id, current
+tenant id), so a repeat lookup is a dictionary hit instead of a query.
+Entries are dropped by signals when a unit or its tenancy changes; the TTL only
+bounds staleness for changes made by other worker processes.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .models import Unit
+
+MAX_UNITS_PER_ORG = 5000
+MAX_ORGS = 256
+ENTRY_TTL = 60  # seconds
+
+_MISSING = object()
+_directories = OrderedDict()  # org_id -> OrderedDict(unit_key -> (expires_at, value))
+_lock = threading.Lock()
+
+
+def _directory(org_id):
+    directory = _directories.get(org_id)
+    if directory is None:
+        directory = _directories[org_id] = OrderedDict()
+        if len(_directories) > MAX_ORGS:
+            _directories.popitem(last=False)
+    else:
+        _directories.move_to_end(org_id)
+    return directory
+
+
+def lookup_unit(org_id, unit_number):
+    """
+    Returns ``(unit_id, tenant_id)`` for a unit number typed by a user, or None.
+    Misses are cached too, so a repeated typo does not hit the database either.
+    """
+    if org_id is None:
+        return None
+    key = Unit.normalize_number(unit_number)
+    if not key:
+        return None
+
+    now = time.monotonic()
+    with _lock:
+        entry = _directory(org_id).get(key, _MISSING)
+    if entry is not _MISSING and entry[0] > now:
+        with _lock:
+            _directory(org_id).move_to_end(key)
+        return entry[1]
+
+    row = Unit.objects.filter(organization_id=org_id, unit_key=key).order_by('id').values_list('id', 'current_tenant_id').first()
+    with _lock:
+        directory = _directory(org_id)
+        directory[key] = (now + ENTRY_TTL, row)
+        if len(directory) > MAX_UNITS_PER_ORG:
+            directory.popitem(last=False)
+    return row
+
+
+def find_unit(org, unit_number):
+    """Resolves a typed unit number to a Unit of ``org`` (with its property loaded)."""
+    row = lookup_unit(getattr(org, 'pk', org), unit_number)
+    if row is None:
+        return None
+    return Unit.objects.select_related('property').filter(pk=row[0]).first()
+
+
+def invalidate_unit(org_id, *unit_keys):
+    with _lock:
+        directory = _directories.get(org_id)
+        if directory is None:
+            return
+        for key in unit_keys:
+            if key:
+                directory.pop(key, None)
+
+
+def clear():
+    with _lock:
+        _directories.clear()
@@ -10,11 +10,14 @@ urlpatterns = [
     # --- DASHBOARDS ---
     # New: Super Admin (SaaS Owner)
     path('super-admin/', views.super_admin_dashboard_view, name='super_admin_dashboard'),
+    path('super-admin/performance/', views.super_admin_performance_view, name='super_admin_performance'),
     
     path('pm/', views.pm_dashboard_view, name='pm_dashboard'),
     path('ho/', views.ho_dashboard_view, name='ho_dashboard'),
     path('tenant/', views.tenant_dashboard_view, name='tenant_dashboard'),
     path('security/', views.security_desk_view, name='security_desk'),
+    path('api/security/board/', views.security_board_api, name='security_board_api'),
+    path('api/security/board/stream/', views.security_board_stream, name='security_board_stream'),
 
     # --- PM MANAGEMENT ACTIONS ---
     # New: Add Users & Announcements
@@ -45,21 +48,28 @@ urlpatterns = [
     path('rentals/checkin/', views.rental_checkin_view, name='rental_checkin'),
     path('rentals/active/', views.rental_checkout_list_view, name='rental_checkout_list'),
     path('rentals/checkout/<int:stay_id>/', views.rental_process_checkout_view, name='rental_process_checkout'),
+    path('api/rentals/availability/', views.rental_availability_api, name='rental_availability_api'),
+    path('api/rentals/calendar/', views.rental_calendar_api, name='rental_calendar_api'),
     
     # Visitor Log (Deliveries/Transient)
     path('visitor/log/', views.log_visitor_view, name='log_visitor'),
     path('visitor/exit/<int:visitor_id>/', views.exit_visitor_view, name='exit_visitor'),
+    path('api/gate/sync/', views.gate_sync_api, name='gate_sync_api'),
+    path('security/history/', views.gate_history_view, name='gate_history'),
+    path('api/analytics/gate-heatmap/', views.gate_heatmap_api, name='gate_heatmap_api'),
 
     # --- FEATURES / TENANT ACTIONS ---
     path('tenant/create-ticket/', views.create_ticket_view, name='create_ticket'),
 
     # --- DETAIL VIEWS & PDFS ---
     path('invoice/<int:invoice_id>/', views.invoice_detail_view, name='invoice_detail'),
+    path('invoice/<int:invoice_id>/pdf/', views.invoice_pdf_view, name='invoice_pdf'),
     path('pm/property/<int:property_id>/', views.property_details_view, name='property_details'),
     path('pm/unit/<int:unit_id>/', views.unit_details_view, name='unit_details'),
 
     # --- APIs (AJAX Requests) ---
     path('api/notify/', views.security_desk_notify_api, name='security_desk_notify_api'),
+    path('api/units/autocomplete/', views.unit_autocomplete_api, name='unit_autocomplete_api'),
     path('api/notifications/unread/', views.get_unread_notifications_api, name='get_unread_notifications_api'),
     path('api/ho/assign_parking/', views.ho_assign_parking_api, name='ho_assign_parking_api'),
     path('api/admin/mark-paid/', views.mark_invoice_paid_api, name='mark_invoice_paid_api'),
@@ -70,6 +80,7 @@ urlpatterns = [
     path('finance/expense/', views.log_expense_view, name='log_expense'),
     path('finance/report/', views.financial_report_view, name='financial_report'),
     path('finance/report/print/', views.financial_report_pdf_view, name='financial_report_print'),
+    path('finance/report/pdf/', views.financial_statement_download_view, name='financial_report_pdf'),
     # Unit Ecosystem Management
     path('pm/manage-property/<int:property_id>/', views.pm_manage_units_view, name='pm_manage_units'),
     path('pm/assign/landlord/<int:unit_id>/', views.assign_landlord_view, name='assign_landlord'),
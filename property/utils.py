@@ -1,16 +1,22 @@
-from django.template.loader import get_template
-from django.http import HttpResponse
-# Ideally use xhtml2pdf or weasyprint. For this MVP, we will use a simple HTML print-friendly view.
-# Real PDF generation requires installing libraries which might bloat the project right now.
-# We will focus on a "Print Friendly" HTML page first.
+from django.http import HttpResponse, HttpResponseNotModified
 
-def render_print_view(request, template_path, context):
+
+def pdf_response(request, digest, content, filename, download=False):
     """
-    Renders a template designed for printing (Ctrl+P -> Save as PDF).
+    Serves a generated PDF. ``digest`` identifies the document content, so a client
+    that already holds this exact file gets a 304 with no body. ``content`` is the
+    PDF bytes or a callable returning them, only called when a body is sent.
     """
-    template = get_template(template_path)
-    html = template.render(context)
-    return HttpResponse(html)
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content() if callable(content) else content, content_type='application/pdf')
+        disposition = 'attachment' if download else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 def format_currency(amount):
-    return f"KES {amount:,.2f}"
\ No newline at end of file
+    return f"KES {amount:,.2f}"
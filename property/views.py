@@ -1,9 +1,12 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST, require_GET
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import transaction, IntegrityError
+from django.db import IntegrityError, transaction
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Sum, Count, Q
 import json
@@ -11,9 +14,14 @@ import datetime
 from .models import PaymentConfiguration, Invoice
 from .mpesa import lipa_na_mpesa_online
 from django.db.models.functions import TruncMonth
-from .utils import format_currency
+from .utils import format_currency, pdf_response
+from .unit_lookup import lookup_unit
+from . import analytics, archive, autocomplete, availability, concurrency, counters, documents, gate_board, gate_sync, images
+from . import cache as dashboard_cache
 
 # --- CUSTOM IMPORTS ---
+from community_connect import metrics, profiling, sharding, slow_queries
+from community_connect.routers import replica_reads
 from users.decorators import role_required
 from users.models import CustomUser, Organization, SupportMessage
 from users.forms import CreateUserForm, SupportMessageForm
@@ -26,7 +34,7 @@ from .forms import (
 @login_required
 @role_required(['PM'])
 def pm_settings_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     
     # Get or create the config object
     config, created = PaymentConfiguration.objects.get_or_create(organization=org)
@@ -57,18 +65,6 @@ except ImportError:
 
 from django.views.decorators.csrf import csrf_exempt
 
-# --- HELPER ---
-def get_user_organization(user):
-    """Safely retrieves the user's organization."""
-    if user.organization:
-        return user.organization
-    # Derive from ownership (Home Owner)
-    if user.role == 'HO':
-        unit = Unit.objects.filter(owner=user).select_related('property__organization').first()
-        if unit:
-            return unit.property.organization
-    return None
-
 # ==========================================
 # 1. THE DISPATCHER (Traffic Cop)
 # ==========================================
@@ -92,87 +88,132 @@ def dashboard_redirect_view(request):
 # ==========================================
 # 2. SUPER ADMIN (SAAS OWNER)
 # ==========================================
+SUPER_ADMIN_ORGS_PER_PAGE = 25
+
 @login_required
-def super_admin_dashboard_view(request):
-    if not request.user.is_superuser:
+@replica_reads
+async def super_admin_dashboard_view(request):
+    user = await request.auser()
+    if not user.is_superuser:
         return redirect('home')
-    
-    # Global Stats
-    total_orgs = Organization.objects.count()
-    total_landlords = CustomUser.objects.filter(role='HO').count()
-    total_revenue = Invoice.objects.filter(is_paid=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    active_properties = Property.objects.count()
-    
-    messages_list = SupportMessage.objects.select_related('sender__organization').order_by('-created_at')[:20]
-    organizations = Organization.objects.annotate(user_count=Count('members')).order_by('-created_at')
 
-    context = {
-        'total_orgs': total_orgs,
-        'total_landlords': total_landlords,
-        'total_revenue': total_revenue,
-        'active_properties': active_properties,
-        'messages': messages_list,
-        'organizations': organizations
-    }
-    return render(request, 'super_admin_dashboard.html', context)
+    # Platform totals and per-organization rollups come from the counters
+    # (property/counters.py); the directory page itself is cached.
+    platform = (await concurrency.run(lambda: counters.read([counters.PLATFORM])))[counters.PLATFORM]
+    paginator = counters.CountedPaginator(
+        Organization.objects.order_by('-created_at', '-id'), SUPER_ADMIN_ORGS_PER_PAGE, platform[counters.ORGANIZATIONS],
+    )
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_number = page_obj.number
+
+    async def build():
+        support_messages, organizations = await concurrency.gather(
+            lambda: list(SupportMessage.objects.select_related('sender__organization').order_by('-created_at')[:20]),
+            lambda: list(paginator.page(page_number).object_list),
+        )
+        return {'messages': support_messages, 'organizations': organizations}
+
+    cached = await dashboard_cache.acached(f'super_admin:{page_number}', [dashboard_cache.PLATFORM], build)
+    scopes = [counters.org_scope(org.id) for org in cached['organizations']]
+    values = await concurrency.run(lambda: counters.read(scopes))
+    for org in cached['organizations']:
+        org.rollup = values[counters.org_scope(org.id)]
+    return await sync_to_async(render)(request, 'super_admin_dashboard.html', {
+        **cached,
+        'total_orgs': platform[counters.ORGANIZATIONS],
+        'total_landlords': platform[counters.LANDLORDS],
+        'total_revenue': platform[counters.REVENUE],
+        'active_properties': platform[counters.PROPERTIES],
+        'page_obj': page_obj,
+    })
+
+@login_required
+def super_admin_performance_view(request):
+    """Per-view percentiles and slow query shapes from every worker (community_connect/profiling.py, slow_queries.py)."""
+    if not request.user.is_superuser:
+        return redirect('home')
+    rows, worst, processes = profiling.report()
+    return render(request, 'super_admin_performance.html', {
+        'rows': rows,
+        'worst': worst,
+        'slow_shapes': slow_queries.report(),
+        'slow_query_ms': settings.SLOW_QUERY_MS,
+        'processes': processes,
+        'window_minutes': settings.PROFILING_WINDOW_MINUTES,
+        'profiling_enabled': settings.PROFILING_ENABLED,
+    })
 
 # ==========================================
 # 3. PM HQ DASHBOARD (Aggregated)
 # ==========================================
+def _send_support_message(request):
+    """Handles the dashboard's support form; returns a redirect once sent."""
+    s_form = SupportMessageForm(request.POST)
+    if s_form.is_valid():
+        msg = s_form.save(commit=False)
+        msg.sender = request.user
+        msg.save()
+        messages.success(request, "Message sent to Super Admin.")
+        return redirect('property:pm_dashboard')
+    return None
+
 @login_required
 @role_required(['PM'])
-def pm_dashboard_view(request):
-    org = get_user_organization(request.user)
+@replica_reads
+async def pm_dashboard_view(request):
+    org = request.org
     if not org:
-        return render(request, 'base.html', {'error': 'No Organization found.'})
-        
-    # 1. Scope: All properties in this Org
-    properties = Property.objects.filter(organization=org).annotate(
-        total_units=Count('unit'),
-        occupied_units=Count('unit', filter=Q(unit__current_tenant__isnull=False))
-    ).order_by('name')
-    
-    # 2. Financial Aggregation (Global)
-    all_org_invoices = Invoice.objects.filter(unit__property__organization=org)
-    total_revenue = all_org_invoices.filter(is_paid=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    total_arrears = all_org_invoices.filter(is_paid=False).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # 3. Operational Stats
-    total_properties = properties.count()
-    total_units_portfolio = properties.aggregate(Sum('total_units'))['total_units__sum'] or 0
-    total_occupied_portfolio = properties.aggregate(Sum('occupied_units'))['occupied_units__sum'] or 0
-    
-    portfolio_occupancy = 0
-    if total_units_portfolio > 0:
-        portfolio_occupancy = int((total_occupied_portfolio / total_units_portfolio) * 100)
+        return await sync_to_async(render)(request, 'base.html', {'error': 'No Organization found.'})
 
     # Support Form
-    support_form = SupportMessageForm()
     if request.method == 'POST' and 'support_msg' in request.POST:
-        s_form = SupportMessageForm(request.POST)
-        if s_form.is_valid():
-            msg = s_form.save(commit=False)
-            msg.sender = request.user
-            msg.save()
-            messages.success(request, "Message sent to Super Admin.")
-            return redirect('property:pm_dashboard')
+        sent = await sync_to_async(_send_support_message)(request)
+        if sent:
+            return sent
+
+    # 1. Scope: All properties in this Org (only evaluated when the cached grid fragment is stale)
+    # Unit totals come from the maintained counters (property/counters.py), not a join over every unit.
+    properties = Property.objects.filter(organization=org).order_by('name')
+
+    async def build_kpis():
+        invoices, units = await concurrency.gather(
+            # 2. Financial Aggregation (Global)
+            lambda: Invoice.objects.filter(organization=org).aggregate(
+                revenue=Sum('amount', filter=Q(is_paid=True)),
+                arrears=Sum('amount', filter=Q(is_paid=False)),
+            ),
+            # 3. Operational Stats
+            lambda: Property.objects.filter(organization=org).aggregate(
+                total=Sum('unit_count'), occupied=Sum('occupied_count'), properties=Count('id')
+            ),
+        )
+        portfolio_occupancy = 0
+        if units['total']:
+            portfolio_occupancy = int((units['occupied'] / units['total']) * 100)
+        return {
+            'total_revenue': invoices['revenue'] or 0,
+            'total_arrears': invoices['arrears'] or 0,
+            'portfolio_occupancy': portfolio_occupancy,
+            'total_properties': units['properties'],
+        }
+
+    scope = dashboard_cache.org_scope(org.id)
+    kpis = await dashboard_cache.acached('pm', [scope], build_kpis)
 
     context = {
         'org': org,
         'properties': properties,
-        'total_revenue': total_revenue,
-        'total_arrears': total_arrears,
-        'portfolio_occupancy': portfolio_occupancy,
-        'total_properties': total_properties,
-        'support_form': support_form
+        'support_form': SupportMessageForm(),
+        'cache_version': await sync_to_async(dashboard_cache.fragment_version)(scope),
+        **kpis,
     }
-    return render(request, 'pm_dashboard.html', context)
+    return await sync_to_async(render)(request, 'pm_dashboard.html', context)
 
 # --- PM ACTIONS ---
 @login_required
 @role_required(['PM'])
 def pm_create_user_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
         form = CreateUserForm(request.POST)
         if form.is_valid():
@@ -188,7 +229,7 @@ def pm_create_user_view(request):
 @login_required
 @role_required(['PM'])
 def pm_create_announcement_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
         title = request.POST.get('title')
         content = request.POST.get('content')
@@ -211,7 +252,7 @@ def pm_create_announcement_view(request):
 @login_required
 @role_required(['PM'])
 def bulk_create_parking_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     
     if request.method == 'POST':
         form = BulkParkingCreationForm(request.POST, org=org)
@@ -255,56 +296,57 @@ def bulk_create_parking_view(request):
 # ==========================================
 @login_required
 @role_required(['HO'])
-def ho_dashboard_view(request):
-    # 1. Base Queryset
-    my_units = Unit.objects.filter(owner=request.user).select_related('property', 'current_tenant')
-    # 2. Parking Lots
-    owned_parking = ParkingLot.objects.filter(owner=request.user).select_related('property', 'current_tenant')
-    
-    # 3. Aggregations
-    total_units_count = my_units.count()
-    active_leases = my_units.filter(current_tenant__isnull=False).count()
-    vacant_units = total_units_count - active_leases
-    
-    occupancy_rate = 0
-    if total_units_count > 0:
-        occupancy_rate = int((active_leases / total_units_count) * 100)
-
-    # 4. Financials
-    all_invoices = Invoice.objects.filter(unit__in=my_units).order_by('-due_date')
-    rent_invoices = all_invoices.filter(sender_role='HO')
-    service_charge_invoices = all_invoices.filter(sender_role='ORGANIZATION')
-    pending_rent = rent_invoices.filter(is_paid=False).aggregate(Sum('amount'))['amount__sum'] or 0
-    net_income = rent_invoices.filter(is_paid=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Collection Rate (This Month)
-    today = timezone.now()
-    month_invoices = all_invoices.filter(due_date__month=today.month, due_date__year=today.year)
-    total_due_month = month_invoices.aggregate(Sum('amount'))['amount__sum'] or 0
-    collected_month = month_invoices.filter(is_paid=True).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    collection_rate = 0
-    if total_due_month > 0:
-        collection_rate = int((collected_month / total_due_month) * 100)
+@replica_reads
+async def ho_dashboard_view(request):
+    user = await request.auser()
+    # Invoice list for the (fragment-cached) table; only queried when that fragment is stale.
+    all_invoices = Invoice.objects.filter(unit__owner=user).select_related('unit').order_by('-due_date')
 
-    properties_count = my_units.values('property').distinct().count()
-    locked_units = my_units.filter(is_locked=True)
-    
-    context = {
-        'owned_units': my_units,
-        'owned_parking': owned_parking,
-        'invoices': all_invoices,
-        'properties_count': properties_count,
-        'total_units': total_units_count,
-        'active_leases': active_leases,
-        'vacant_units': vacant_units,
-        'occupancy_rate': occupancy_rate,
-        'collection_rate': collection_rate,
-        'pending_amount': pending_rent,
-        'net_income': net_income,
-        'locked_units': locked_units,
-    }
-    return render(request, 'ho_dashboard.html', context)
+    async def build():
+        today = timezone.now()
+        this_month = Q(due_date__month=today.month, due_date__year=today.year)
+        my_units, owned_parking, totals = await concurrency.gather(
+            # 1. Base Queryset
+            lambda: list(Unit.objects.filter(owner=user).select_related('property', 'current_tenant')),
+            # 2. Parking Lots
+            lambda: list(ParkingLot.objects.filter(owner=user).select_related('property', 'current_tenant')),
+            # 3. Financials (rent, plus this month's collection rate)
+            lambda: all_invoices.aggregate(
+                pending_rent=Sum('amount', filter=Q(sender_role='HO', is_paid=False)),
+                net_income=Sum('amount', filter=Q(sender_role='HO', is_paid=True)),
+                total_due_month=Sum('amount', filter=this_month),
+                collected_month=Sum('amount', filter=this_month & Q(is_paid=True)),
+            ),
+        )
+
+        # 4. Aggregations
+        total_units_count = len(my_units)
+        active_leases = sum(1 for unit in my_units if unit.current_tenant_id)
+        occupancy_rate = 0
+        if total_units_count > 0:
+            occupancy_rate = int((active_leases / total_units_count) * 100)
+        collection_rate = 0
+        if totals['total_due_month']:
+            collection_rate = int(((totals['collected_month'] or 0) / totals['total_due_month']) * 100)
+
+        return {
+            'owned_units': my_units,
+            'owned_parking': owned_parking,
+            'properties_count': len({unit.property_id for unit in my_units}),
+            'total_units': total_units_count,
+            'active_leases': active_leases,
+            'vacant_units': total_units_count - active_leases,
+            'occupancy_rate': occupancy_rate,
+            'collection_rate': collection_rate,
+            'pending_amount': totals['pending_rent'] or 0,
+            'net_income': totals['net_income'] or 0,
+            'locked_units': [unit for unit in my_units if unit.is_locked],
+        }
+
+    scope = dashboard_cache.user_scope(user.id)
+    context = await dashboard_cache.acached('ho', [scope], build)
+    context = {**context, 'invoices': all_invoices, 'cache_version': await sync_to_async(dashboard_cache.fragment_version)(scope)}
+    return await sync_to_async(render)(request, 'ho_dashboard.html', context)
 
 @login_required
 @role_required(['HO'])
@@ -333,23 +375,88 @@ def ho_assign_tenant_view(request):
 @login_required
 @role_required(['SEC', 'PM'])
 def security_desk_view(request):
-    org = get_user_organization(request.user)
-    # Active visitors are those with entry time but no exit time, and are marked active
-    active_visitors = VisitorLog.objects.filter(
-        unit__property__organization=org,
-        is_active=True
-    ).order_by('-entry_time')
+    org = request.org
+    # Active visitors are those with entry time but no exit time, and are marked active.
+    # Loaded once with their units; the page then polls security_board_api for deltas.
+    active_visitors = gate_board.active_visitors(org)
     
     context = {
         'organization_name': org.name if org else 'Unassigned',
-        'active_visitors': active_visitors
+        'active_visitors': active_visitors,
+        'board_cursor': timezone.now().isoformat(),
     }
     return render(request, 'security_desk.html', context)
 
+@login_required
+@role_required(['SEC', 'PM'])
+@require_GET
+def security_board_api(request):
+    """Entry/exit deltas for the live gate board since the client's cursor."""
+    since = gate_board.parse_cursor(request.GET.get('since'))
+    if since is None:
+        return JsonResponse({'status': 'error', 'message': 'A valid since cursor is required.'}, status=400)
+    cursor, entered, exited = gate_board.board_changes(request.org, since)
+    return JsonResponse({'cursor': cursor.isoformat(), 'entered': entered, 'exited': exited})
+
+@login_required
+@role_required(['SEC', 'PM'])
+@require_GET
+async def security_board_stream(request):
+    """The live gate board as server-sent events (ASGI only; WSGI clients keep polling)."""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'status': 'error', 'message': 'Streaming needs the ASGI server.'}, status=501)
+    since = gate_board.parse_cursor(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    if since is None:
+        return JsonResponse({'status': 'error', 'message': 'A valid since cursor is required.'}, status=400)
+    response = StreamingHttpResponse(
+        gate_board.stream(request.org, since, sharding.current_shard()), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+@role_required(['SEC', 'PM'])
+@require_POST
+def gate_sync_api(request):
+    """
+    Offline queue replay for gate devices: applies a batch of visitor entries/exits
+    in one transaction and returns the board delta (protocol in gate_sync.py).
+    """
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON.'}, status=400)
+
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        return JsonResponse({'status': 'error', 'message': 'events must be a list.'}, status=400)
+    if len(events) > gate_sync.MAX_EVENTS:
+        return JsonResponse({'status': 'error', 'message': f'At most {gate_sync.MAX_EVENTS} events per sync.'}, status=400)
+
+    org = request.org
+    results = gate_sync.apply_events(org, request.user, events)
+
+    since = gate_board.parse_cursor(payload.get('since'))
+    if since is None:
+        # First sync from this device: send the full board.
+        cursor, entered, exited = gate_board.full_board(org)
+    else:
+        cursor, entered, exited = gate_board.board_changes(org, since)
+
+    return JsonResponse({
+        'status': 'ok',
+        'results': results,
+        'cursor': cursor.isoformat(),
+        'entered': entered,
+        'exited': exited,
+        'full': since is None,
+    })
+
 @login_required
 @role_required(['SEC', 'PM'])
 def log_visitor_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
         unit_number = request.POST.get('unit_number')
         visitor_name = request.POST.get('visitor_name')
@@ -360,34 +467,39 @@ def log_visitor_view(request):
         id_collected = request.POST.get('id_collected') == 'on'
         
         try:
-            unit = Unit.objects.filter(property__organization=org, unit_number__iexact=unit_number).first()
-            if not unit:
+            # Dictionary hit in the org's unit directory (see unit_lookup.py)
+            found = lookup_unit(org.pk if org else None, unit_number)
+            if not found:
                 messages.error(request, f"Unit {unit_number} not found.")
                 return redirect('property:security_desk')
+            unit_id, tenant_id = found
 
             allowed = (action == 'ALLOW')
             notes = "Sent up" if allowed else "Waiting at gate"
             
             VisitorLog.objects.create(
-                unit=unit,
+                unit_id=unit_id,
+                organization=org,
                 visitor_name=visitor_name,
                 visitor_id_number=visitor_id,
                 visitor_phone=visitor_phone,
                 id_collected_at_gate=id_collected,
                 visitor_type=visitor_type,
-                notified_tenant=unit.current_tenant,
+                notified_tenant_id=tenant_id,
                 allowed_entry=allowed,
                 notes=notes,
                 is_active=allowed
             )
+            metrics.VISITORS_LOGGED.inc(source='desk')
             
-            if unit.current_tenant:
+            if tenant_id:
                 Notification.objects.create(
-                    recipient=unit.current_tenant, 
+                    recipient_id=tenant_id, 
                     message=f"{visitor_type}: {visitor_name} is at gate.", 
                     sender=request.user
                 )
                 messages.success(request, "Visitor logged and tenant notified.")
+            metrics.NOTIFICATION_FANOUT.observe(1 if tenant_id else 0, event='visitor_at_gate')
             
             return redirect('property:security_desk')
         except Exception as e:
@@ -406,45 +518,137 @@ def exit_visitor_view(request, visitor_id):
     messages.success(request, msg)
     return redirect('property:security_desk')
 
+@login_required
+@role_required(['SEC', 'PM'])
+@replica_reads
+def gate_history_view(request):
+    """
+    Unified search over visitor logs and guest stays, live and archived.
+    Defaults to the last 30 days so the archive is only read when asked for.
+    """
+    org = request.org
+    today = timezone.localdate()
+    try:
+        end = datetime.date.fromisoformat(request.GET.get('end') or today.isoformat())
+        start = datetime.date.fromisoformat(request.GET.get('start') or (end - datetime.timedelta(days=30)).isoformat())
+    except ValueError:
+        start, end = today - datetime.timedelta(days=30), today
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', 'visitors')
+
+    if kind == 'stays':
+        rows = archive.search_stay_history(org, query, start, end)
+    else:
+        kind = 'visitors'
+        rows = archive.search_visitor_history(org, query, start, end)
+
+    return render(request, 'gate_history.html', {
+        'rows': rows, 'query': query, 'kind': kind, 'start': start, 'end': end,
+    })
+
+@login_required
+@role_required(['PM'])
+@require_GET
+@replica_reads
+def gate_heatmap_api(request):
+    """Peak gate hours and visitor-type mix, served from the hourly rollup."""
+    try:
+        days = min(max(int(request.GET.get('days', 28)), 1), 366)
+        property_id = int(request.GET['property']) if request.GET.get('property') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid parameters.'}, status=400)
+    return JsonResponse(analytics.heatmap(request.org, property_id, days))
+
 @login_required
 @role_required(['SEC', 'PM'])
 def rental_checkin_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
-        form = CheckInForm(request.POST, request.FILES)
+        form = CheckInForm(request.POST, request.FILES, org=org)
         if form.is_valid():
             stay = form.save(commit=False)
-            stay.unit = form.cleaned_data['unit_number'] # Cleaned in form
-            
-            if stay.unit.property.organization != org:
-                messages.error(request, "Unit mismatch.")
-                return redirect('property:rental_checkin')
+            stay.unit = form.cleaned_data['unit_number'] # Cleaned in form (scoped to org)
 
-            stay.checked_in_by = request.user
-            stay.save()
+            with sharding.atomic():
+                # Lock the unit row so two desks cannot check guests into it at once.
+                Unit.objects.select_for_update().filter(pk=stay.unit.pk).first()
+                clash = availability.conflicting_stay(stay.unit, timezone.now(), stay.expected_check_out)
+                if clash:
+                    until = f" until {timezone.localtime(clash.occupied_until):%d %b %H:%M}" if clash.occupied_until else ""
+                    messages.error(request, f"Unit {stay.unit.unit_number} is occupied by {clash.guest_name}{until}.")
+                    return render(request, 'rental_checkin.html', {'form': form})
+
+                stay.organization = org
+                stay.checked_in_by = request.user
+                stay.save()
             messages.success(request, f"Checked in {stay.guest_name}.")
             return redirect('property:rental_checkout_list')
     else:
-        form = CheckInForm()
+        form = CheckInForm(org=org)
     return render(request, 'rental_checkin.html', {'form': form})
 
 @login_required
 @role_required(['SEC', 'PM'])
 def rental_checkout_list_view(request):
-    org = get_user_organization(request.user)
-    active_stays = ShortTermStay.objects.filter(unit__property__organization=org, is_active=True)
-    return render(request, 'rental_checkout_list.html', {'stays': active_stays})
+    org = request.org
+    active_stays = ShortTermStay.objects.filter(organization=org, is_active=True).select_related('unit').order_by('-check_in_time')
+    query = request.GET.get('q', '').strip()
+    if query:
+        active_stays = active_stays.filter(
+            Q(guest_name__icontains=query) | Q(guest_id_number__icontains=query) | Q(unit__unit_key=Unit.normalize_number(query))
+        )
+    return render(request, 'rental_checkout_list.html', {'stays': images.attach_thumbnails(active_stays, 'id_passport_image')})
+
+def _parse_range(request, default_start, default_end):
+    """Reads ?start=&end= ISO datetimes (dates allowed); returns aware datetimes or None on bad input."""
+    start = gate_board.parse_cursor(request.GET.get('start')) if request.GET.get('start') else default_start
+    end = gate_board.parse_cursor(request.GET.get('end')) if request.GET.get('end') else default_end
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+@login_required
+@role_required(['SEC', 'PM'])
+@require_GET
+def rental_availability_api(request):
+    """Units free over [start, end) — defaults to tonight."""
+    window = _parse_range(request, *availability.tonight())
+    if window is None:
+        return JsonResponse({'status': 'error', 'message': 'Invalid start/end.'}, status=400)
+    units = availability.free_units(request.org, *window, property_id=request.GET.get('property') or None)
+    return JsonResponse({
+        'start': window[0].isoformat(),
+        'end': window[1].isoformat(),
+        'units': [{'unit_id': u.id, 'unit_number': u.unit_number, 'property': u.property.name} for u in units],
+    })
+
+@login_required
+@role_required(['SEC', 'PM'])
+@require_GET
+@replica_reads
+def rental_calendar_api(request):
+    """Stays per unit overlapping [start, end) — defaults to the next 30 days."""
+    now = timezone.now()
+    window = _parse_range(request, now, now + datetime.timedelta(days=30))
+    if window is None:
+        return JsonResponse({'status': 'error', 'message': 'Invalid start/end.'}, status=400)
+    return JsonResponse({
+        'start': window[0].isoformat(),
+        'end': window[1].isoformat(),
+        'units': availability.calendar(request.org, *window, property_id=request.GET.get('property') or None),
+    })
 
 @login_required
 @role_required(['SEC', 'PM'])
 def rental_process_checkout_view(request, stay_id):
-    stay = get_object_or_404(ShortTermStay, id=stay_id)
+    stay = get_object_or_404(ShortTermStay.objects.select_related('unit'), id=stay_id, organization=request.org)
     if request.method == 'POST':
         form = FeedbackForm(request.POST, instance=stay)
         if form.is_valid():
             stay = form.save(commit=False)
             stay.is_active = False
             stay.check_out_time = timezone.now()
+            stay.checked_out_by = request.user
             stay.save()
             messages.success(request, "Guest checked out.")
             return redirect('property:rental_checkout_list')
@@ -527,22 +731,31 @@ def mpesa_callback(request):
             if result_code == 0:
                 # Payment Successful
                 try:
-                    # FIND INVOICE BY CHECKOUT ID
-                    invoice = Invoice.objects.get(checkout_request_id=checkout_request_id)
-                    
+                    # FIND INVOICE BY CHECKOUT ID (on whichever shard holds it)
+                    shard, invoice = sharding.find_across_shards(Invoice.objects.filter(checkout_request_id=checkout_request_id))
+                    if invoice is None:
+                        raise Invoice.DoesNotExist
+
                     if not invoice.is_paid:
                         invoice.is_paid = True
                         invoice.payment_date = timezone.now()
                         invoice.mpesa_code = stk_callback.get('CallbackMetadata', {}).get('Item', [])[1].get('Value') # Extract Receipt No roughly
-                        invoice.save()
+                        with sharding.using_shard(shard, invoice.organization_id):
+                            invoice.save()
+                        metrics.MPESA_CALLBACKS.inc(outcome='applied')
                         print(f"Invoice #{invoice.id} marked as PAID via Callback")
+                    else:
+                        metrics.MPESA_CALLBACKS.inc(outcome='already_paid')
                         
                 except Invoice.DoesNotExist:
+                    metrics.MPESA_CALLBACKS.inc(outcome='unknown_invoice')
                     print(f"Callback received for unknown CheckoutID: {checkout_request_id}")
             else:
+                metrics.MPESA_CALLBACKS.inc(outcome='payment_failed')
                 print(f"Payment Failed Callback: {stk_callback.get('ResultDesc')}")
                 
         except Exception as e:
+            metrics.MPESA_CALLBACKS.inc(outcome='error')
             print(f"Callback Error: {e}")
             
     return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
@@ -550,21 +763,28 @@ def mpesa_callback(request):
 @login_required
 @role_required(['T'])
 def tenant_dashboard_view(request):
-    try:
-        unit = Unit.objects.get(current_tenant=request.user)
-        announcements = Announcement.objects.filter(property=unit.property, is_active=True).order_by('-created_at')
-        my_tickets = Ticket.objects.filter(unit=unit).order_by('-created_at')
-        my_invoices = Invoice.objects.filter(unit=unit).order_by('-due_date')
-    except Unit.DoesNotExist:
-        unit = None; announcements = []; my_tickets = []; my_invoices = []
-    
-    try: parking = ParkingLot.objects.get(current_tenant=request.user)
-    except ParkingLot.DoesNotExist: parking = None
-        
-    context = {
-        'unit': unit, 'parking': parking,
-        'announcements': announcements, 'my_tickets': my_tickets, 'my_invoices': my_invoices,
-    }
+    user_scope = dashboard_cache.user_scope(request.user.id)
+    # Which unit (and so which organization's announcements) applies; changes bump the tenant's scope.
+    unit = dashboard_cache.cached(
+        'tenant_unit', [user_scope],
+        lambda: Unit.objects.filter(current_tenant=request.user).select_related('property', 'owner').first() or False,
+    )
+
+    def build():
+        if unit:
+            announcements = list(Announcement.objects.filter(property=unit.property, is_active=True).order_by('-created_at'))
+            my_tickets = list(Ticket.objects.filter(unit=unit).order_by('-created_at'))
+            my_invoices = list(Invoice.objects.filter(unit=unit).order_by('-due_date'))
+        else:
+            announcements = []; my_tickets = []; my_invoices = []
+        return {
+            'unit': unit or None, 'parking': ParkingLot.objects.filter(current_tenant=request.user).select_related('property').first(),
+            'announcements': announcements, 'my_tickets': my_tickets, 'my_invoices': my_invoices,
+        }
+
+    context = dashboard_cache.cached(
+        'tenant', [user_scope, dashboard_cache.org_scope(unit.organization_id if unit else None)], build
+    )
     return render(request, 'tenant_dashboard.html', context)
 
 @login_required
@@ -586,15 +806,43 @@ def create_ticket_view(request):
         return redirect('property:tenant_dashboard')
     return render(request, 'ticket_create.html')
 
+def _can_view_invoice(user, invoice):
+    # Simple permission check (can refine later)
+    return user.id in [invoice.unit.owner_id, invoice.unit.current_tenant_id] or user.role in ['PM', 'ADMIN']
+
 @login_required
 def invoice_detail_view(request, invoice_id):
-    invoice = get_object_or_404(Invoice, id=invoice_id)
-    # Simple permission check (can refine later)
-    if request.user in [invoice.unit.owner, invoice.unit.current_tenant] or request.user.role in ['PM', 'ADMIN']:
+    invoice = get_object_or_404(documents.invoice_queryset(), id=invoice_id)
+    if _can_view_invoice(request.user, invoice):
         return render(request, 'invoice_pdf.html', {'invoice': invoice})
     messages.error(request, "Access denied.")
     return redirect('home')
 
+@login_required
+def invoice_pdf_view(request, invoice_id):
+    """The invoice as a real PDF file, rendered once per distinct content."""
+    invoice = get_object_or_404(documents.invoice_queryset(), id=invoice_id)
+    if not _can_view_invoice(request.user, invoice):
+        messages.error(request, "Access denied.")
+        return redirect('home')
+    # A repeat download is answered with 304 before the PDF is fetched or rendered.
+    return pdf_response(
+        request, documents.invoice_digest(invoice), lambda: documents.invoice_pdf(invoice)[1],
+        f"INV-{invoice.id:05d}.pdf", download='download' in request.GET,
+    )
+
+@login_required
+@role_required(['SEC', 'PM', 'CT'])
+@require_GET
+def unit_autocomplete_api(request):
+    """
+    Suggests units as a guard/caretaker types a unit number, tenant username or phone.
+    Served from the organization's in-memory prefix index (see autocomplete.py).
+    """
+    org = request.org
+    results = autocomplete.search(org.pk if org else None, request.GET.get('q', ''))
+    return JsonResponse({'results': results})
+
 # --- API ENDPOINTS (Simplified for brevity) ---
 @login_required
 def security_desk_notify_api(request): return JsonResponse({'status': 'ok'})
@@ -649,15 +897,12 @@ def record_meter_reading_view(request):
     """
     Caretaker/PM records water reading. System auto-generates invoice.
     """
-    org = get_user_organization(request.user)
+    org = request.org
     
     if request.method == 'POST':
-        form = MeterReadingForm(request.POST, request.FILES)
+        form = MeterReadingForm(request.POST, request.FILES, org=org)
         if form.is_valid():
-            unit = form.cleaned_data['unit']
-            if unit.property.organization != org:
-                messages.error(request, "Unit not in your organization.")
-                return redirect('property:record_reading')
+            unit = form.cleaned_data['unit'] # Scoped to org by the form
 
             # 1. Get/Create Meter
             meter, _ = Meter.objects.get_or_create(unit=unit, meter_type='WATER', defaults={'meter_number': f'M-{unit.unit_number}'})
@@ -680,6 +925,7 @@ def record_meter_reading_view(request):
             # 4. Auto-Create Invoice
             invoice = Invoice.objects.create(
                 unit=unit,
+                organization=org,
                 amount=bill,
                 due_date=timezone.now().date() + datetime.timedelta(days=7),
                 description=f"Water Bill: {prev}-{curr} ({consumption} units)",
@@ -688,22 +934,24 @@ def record_meter_reading_view(request):
             )
             reading.invoice = invoice
             reading.save()
+            metrics.INVOICES_GENERATED.inc(kind='water')
             
             messages.success(request, f"Recorded! Consumption: {consumption}. Bill: KES {bill}. Invoice sent.")
             return redirect('property:record_reading')
     else:
-        form = MeterReadingForm()
+        form = MeterReadingForm(org=org)
         
     return render(request, 'finance_reading.html', {'form': form})
 
 @login_required
 @role_required(['PM'])
+@replica_reads
 def pm_all_invoices_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     
     # CHANGE: order_by('-date_issued') -> order_by('-due_date')
     invoices = Invoice.objects.filter(
-        unit__property__organization=org
+        organization=org
     ).select_related('unit', 'unit__current_tenant').order_by('-due_date')
     
     return render(request, 'pm_all_invoices.html', {'invoices': invoices})
@@ -711,7 +959,7 @@ def pm_all_invoices_view(request):
 @login_required
 @role_required(['PM'])
 def bulk_create_units_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     
     if request.method == 'POST':
         form = BulkUnitCreationForm(request.POST, org=org)
@@ -722,24 +970,30 @@ def bulk_create_units_view(request):
             end = form.cleaned_data['floor_end']
             count = form.cleaned_data['units_per_floor']
             
-            created_count = 0
-            for floor in range(start, end + 1):
-                for door in range(1, count + 1):
-                    # Format: 01, 02...
-                    door_str = f"{door:02d}" 
-                    
-                    # Avoid duplicates
-                    if not Unit.objects.filter(property=prop, block=block, floor=str(floor), door_number=door_str).exists():
-                        Unit.objects.create(
-                            property=prop,
-                            block=block,
-                            floor=str(floor),
-                            door_number=door_str,
-                            organization_owner=org
-                        )
-                        created_count += 1
+            # Avoid duplicates (one query for the whole range); doors formatted 01, 02...
+            existing = set(Unit.objects.filter(property=prop, block=block).values_list('floor', 'door_number'))
+            wanted = [
+                (str(floor), f"{door:02d}")
+                for floor in range(start, end + 1) for door in range(1, count + 1)
+                if (str(floor), f"{door:02d}") not in existing
+            ]
+
+            # The organization row stays locked until the units are in, so parallel requests cannot overshoot the plan.
+            with transaction.atomic(), sharding.atomic():
+                left = counters.units_left(org.pk)
+                if len(wanted) > left:
+                    messages.error(request, f"Creating {len(wanted)} units would exceed your plan's limit of {org.max_units} units ({left} left).")
+                    return redirect('property:pm_dashboard')
+                for floor, door_str in wanted:
+                    Unit.objects.create(
+                        property=prop,
+                        block=block,
+                        floor=floor,
+                        door_number=door_str,
+                        organization_owner=org
+                    )
             
-            messages.success(request, f"Successfully created {created_count} units.")
+            messages.success(request, f"Successfully created {len(wanted)} units.")
             return redirect('property:pm_dashboard')
     else:
         form = BulkUnitCreationForm(org=org)
@@ -752,7 +1006,7 @@ def log_expense_view(request):
     """
     Digital Petty Cash for PMs.
     """
-    org = get_user_organization(request.user)
+    org = request.org
     
     if request.method == 'POST':
         form = ExpenseForm(request.POST, request.FILES)
@@ -765,6 +1019,7 @@ def log_expense_view(request):
                 return redirect('property:pm_dashboard')
                 
             expense.property = prop
+            expense.organization = org
             expense.recorded_by = request.user
             expense.save()
             messages.success(request, "Expense recorded successfully.")
@@ -778,50 +1033,39 @@ def log_expense_view(request):
 
 @login_required
 @role_required(['PM'])
-def financial_report_view(request):
+@replica_reads
+async def financial_report_view(request):
     """
     The 'Provisional Accounts' Dashboard.
     Mimics the Excel structure: Income vs Expenses.
     """
-    org = get_user_organization(request.user)
+    org = request.org
     
     # 1. Date Filtering
     today = timezone.now()
     year = int(request.GET.get('year', today.year))
-    
-    # 2. INCOME (Invoices Paid)
-    # We group by month to show trends (Jan, Feb, Mar...)
-    income_data = Invoice.objects.filter(
-        unit__property__organization=org,
-        is_paid=True,
-        payment_date__year=year
-    ).annotate(month=TruncMonth('payment_date')).values('month').annotate(total=Sum('amount')).order_by('month')
-    
-    # Total Income for the year
-    total_income_ytd = Invoice.objects.filter(
-        unit__property__organization=org,
-        is_paid=True,
-        payment_date__year=year
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-    # 3. EXPENSES (Money Out)
-    expense_data = Expense.objects.filter(
-        property__organization=org,
-        date_incurred__year=year
-    ).annotate(month=TruncMonth('date_incurred')).values('month').annotate(total=Sum('amount')).order_by('month')
-    
-    # Total Expense for the year
-    total_expense_ytd = Expense.objects.filter(
-        property__organization=org,
-        date_incurred__year=year
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # 4. Expense Breakdown by Category (for the Pie Chart/Table)
-    # e.g., Utilities, Staff, Maintenance
-    category_breakdown = Expense.objects.filter(
-        property__organization=org,
-        date_incurred__year=year
-    ).values('category__name').annotate(total=Sum('amount')).order_by('-total')
+    paid = Invoice.objects.filter(organization=org, is_paid=True, payment_date__year=year)
+    spent = Expense.objects.filter(organization=org, date_incurred__year=year)
+
+    # Independent queries, issued concurrently
+    income_data, total_income_ytd, expense_data, total_expense_ytd, category_breakdown, recent_expenses = await concurrency.gather(
+        # 2. INCOME (Invoices Paid)
+        # We group by month to show trends (Jan, Feb, Mar...)
+        lambda: list(paid.annotate(month=TruncMonth('payment_date')).values('month').annotate(total=Sum('amount')).order_by('month')),
+        # Total Income for the year
+        lambda: paid.aggregate(Sum('amount'))['amount__sum'] or 0,
+        # 3. EXPENSES (Money Out)
+        lambda: list(spent.annotate(month=TruncMonth('date_incurred')).values('month').annotate(total=Sum('amount')).order_by('month')),
+        # Total Expense for the year
+        lambda: spent.aggregate(Sum('amount'))['amount__sum'] or 0,
+        # 4. Expense Breakdown by Category (for the Pie Chart/Table)
+        # e.g., Utilities, Staff, Maintenance
+        lambda: list(spent.values('category__name').annotate(total=Sum('amount')).order_by('-total')),
+        # 6. Latest entries with their receipt thumbnails
+        lambda: images.attach_thumbnails(
+            spent.select_related('category').order_by('-date_incurred', '-id')[:10], 'receipt_image',
+        ),
+    )
 
     # 5. Net Position
     net_balance = total_income_ytd - total_expense_ytd
@@ -834,8 +1078,9 @@ def financial_report_view(request):
         'income_trend': income_data,
         'expense_trend': expense_data,
         'category_breakdown': category_breakdown,
+        'recent_expenses': recent_expenses,
     }
-    return render(request, 'finance_dashboard.html', context)
+    return await sync_to_async(render)(request, 'finance_dashboard.html', context)
 
 # ==========================================
 # 8. PM OPERATIONS (NEW)
@@ -844,7 +1089,7 @@ def financial_report_view(request):
 @login_required
 @role_required(['PM'])
 def pm_add_user_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
         form = PMUserCreationForm(request.POST)
         if form.is_valid():
@@ -861,7 +1106,7 @@ def pm_add_user_view(request):
 @login_required
 @role_required(['PM'])
 def pm_add_property_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
         form = PropertyCreationForm(request.POST)
         if form.is_valid():
@@ -877,29 +1122,28 @@ def pm_add_property_view(request):
 @login_required
 @role_required(['PM'])
 def pm_create_invoice_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
-        form = InvoiceCreationForm(request.POST)
+        form = InvoiceCreationForm(request.POST, org=org)
         if form.is_valid():
-            unit = form.cleaned_data['unit_number']
-            if unit.property.organization != org:
-                messages.error(request, "Unit not in your organization.")
-                return redirect('property:pm_create_invoice')
+            unit = form.cleaned_data['unit_number'] # Scoped to org by the form
             
             invoice = form.save(commit=False)
             invoice.unit = unit
+            invoice.organization = org
             invoice.sender_role = 'ORGANIZATION'
             invoice.save()
+            metrics.INVOICES_GENERATED.inc(kind='manual')
             messages.success(request, "Invoice sent successfully.")
             return redirect('property:pm_dashboard')
     else:
-        form = InvoiceCreationForm()
+        form = InvoiceCreationForm(org=org)
     return render(request, 'pm_form_generic.html', {'form': form, 'title': 'Create Invoice'})
 
 @login_required
 @role_required(['PM'])
 def pm_post_announcement_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     if request.method == 'POST':
         form = AnnouncementForm(request.POST)
         property_id = request.POST.get('property_id')
@@ -933,59 +1177,42 @@ def pm_post_announcement_view(request):
 
 @login_required
 @role_required(['PM'])
+@replica_reads
 def financial_report_pdf_view(request):
     """
     Renders a print-optimized version of the Financial Report.
     """
-    org = get_user_organization(request.user)
-    
+    org = request.org
     today = timezone.now()
-    try:
-        month = int(request.GET.get('month', today.month))
-        year = int(request.GET.get('year', today.year))
-    except ValueError:
-        month = today.month
-        year = today.year
-    
-    # 1. Income
-    income_qs = Invoice.objects.filter(
-        unit__property__organization=org,
-        is_paid=True,
-        payment_date__month=month,
-        payment_date__year=year
-    )
-    total_income = income_qs.aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # 2. Expenses
-    expense_qs = Expense.objects.filter(
-        property__organization=org,
-        date_incurred__month=month,
-        date_incurred__year=year
-    )
-    total_expense = expense_qs.aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # 3. Net
-    net_profit = total_income - total_expense
-    
-    # 4. Breakdown
-    expenses_breakdown = expense_qs.values('category__name').annotate(total=Sum('amount')).order_by('-total')
-    
+    month, year = _report_period(request, today)
     context = {
         'org': org,
-        'total_income': total_income,
-        'total_expense': total_expense,
-        'net_profit': net_profit,
-        'expenses_breakdown': expenses_breakdown,
         'month': month,
         'year': year,
-        'date_generated': today
+        'date_generated': today,
+        **documents.monthly_statement(org, month, year),
     }
     return render(request, 'finance_report_pdf.html', context)
 
+def _report_period(request, today):
+    try:
+        return int(request.GET.get('month', today.month)), int(request.GET.get('year', today.year))
+    except ValueError:
+        return today.month, today.year
+
+@login_required
+@role_required(['PM'])
+@replica_reads
+def financial_statement_download_view(request):
+    """The monthly statement as a PDF file."""
+    month, year = _report_period(request, timezone.now())
+    digest, content = documents.statement_pdf(request.org, month, year, generated_on=timezone.localdate())
+    return pdf_response(request, digest, content, f"statement-{year}-{month:02d}.pdf", download='download' in request.GET)
+
 @login_required
 @role_required(['PM'])
 def pm_add_unit_view(request):
-    org = get_user_organization(request.user)
+    org = request.org
     
     if request.method == 'POST':
         form = UnitCreationForm(request.POST)
@@ -1000,7 +1227,11 @@ def pm_add_unit_view(request):
             unit.organization_owner = org  # Auto-link to Organization
             
             try:
-                unit.save()
+                with transaction.atomic(), sharding.atomic():
+                    if not counters.units_left(org.pk):
+                        messages.error(request, f"Your plan allows {org.max_units} units. Upgrade to add more.")
+                        return redirect('property:pm_dashboard')
+                    unit.save()
                 messages.success(request, f"Unit {unit.unit_number} added successfully.")
                 return redirect('property:pm_dashboard')
             except IntegrityError:
@@ -1021,7 +1252,7 @@ def pm_add_unit_view(request):
 @login_required
 @role_required(['PM'])
 def pm_manage_units_view(request, property_id):
-    org = get_user_organization(request.user)
+    org = request.org
     prop = get_object_or_404(Property, id=property_id, organization=org)
     
     # Get all units and prefetch related info to minimize DB queries
@@ -1040,7 +1271,7 @@ def pm_manage_units_view(request, property_id):
 @login_required
 @role_required(['PM'])
 def assign_landlord_view(request, unit_id):
-    org = get_user_organization(request.user)
+    org = request.org
     unit = get_object_or_404(Unit, id=unit_id, property__organization=org)
     
     if request.method == 'POST':
@@ -1072,7 +1303,7 @@ def assign_landlord_view(request, unit_id):
 @login_required
 @role_required(['PM'])
 def assign_tenant_view(request, unit_id):
-    org = get_user_organization(request.user)
+    org = request.org
     unit = get_object_or_404(Unit, id=unit_id, property__organization=org)
     
     if request.method == 'POST':
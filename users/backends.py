@@ -0,0 +1,93 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from community_connect import metrics
+
+from .middleware import MEMBERSHIP_CACHE_TIMEOUT, get_cached_organization
+
+UserModel = get_user_model()
+
+# Columns a request needs from request.user. Anything else (password, last_login,
+# date_joined) is deferred and loads on first access.
+_PRINCIPAL_COLUMNS = {
+    'id', 'username', 'first_name', 'last_name', 'email', 'phone_number',
+    'role', 'organization_id', 'is_active', 'is_staff', 'is_superuser',
+}
+# In model order, as Model.from_db expects them.
+PRINCIPAL_FIELDS = [f.attname for f in UserModel._meta.concrete_fields if f.attname in _PRINCIPAL_COLUMNS]
+
+
+def principal_cache_key(user_id):
+    return f"auth:user:{user_id}:v2"
+
+
+def principal_generation_key(user_id):
+    return f"auth:user:{user_id}:gen"
+
+
+def _bump_generations(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate_principal(*user_ids):
+    """
+    Voids the cached principals by bumping their generation, now and again once the
+    transaction commits, so a request that read the old row concurrently cannot
+    store it back under the current generation.
+    """
+    keys = [principal_generation_key(uid) for uid in user_ids if uid]
+    if keys:
+        _bump_generations(keys)
+        transaction.on_commit(lambda: _bump_generations(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose per-request user lookup is served from the cache.
+
+    The cached principal holds PRINCIPAL_FIELDS and the session auth hash, never
+    the password hash; the organization is attached from the membership cache,
+    so ``request.user.organization`` costs no query either. Entries are tagged
+    with the user's generation, which users/signals.py bumps whenever the user
+    row changes.
+    """
+
+    def get_user(self, user_id):
+        key, generation_key = principal_cache_key(user_id), principal_generation_key(user_id)
+        found = cache.get_many([key, generation_key])
+        generation = found.get(generation_key)
+        if generation is None:
+            cache.add(generation_key, time.time_ns(), None)
+            generation = cache.get(generation_key)
+        entry = found.get(key)
+        hit = entry is not None and entry[0] == generation
+        metrics.cache_lookup('principal', hit)
+        if not hit:
+            user = super().get_user(user_id)
+            if user is not None:
+                values = [getattr(user, name) for name in PRINCIPAL_FIELDS]
+                cache.set(key, (generation, values, user.get_session_auth_hash()), MEMBERSHIP_CACHE_TIMEOUT)
+            return user
+
+        _, values, session_hash = entry
+        user = UserModel.from_db('default', PRINCIPAL_FIELDS, values)
+        user.cached_session_auth_hash = session_hash
+        if not self.user_can_authenticate(user):
+            return None
+        if user.organization_id:
+            org = get_cached_organization(user.organization_id)
+            if org is not None:
+                UserModel._meta.get_field('organization').set_cached_value(user, org)
+        return user
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
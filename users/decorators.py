@@ -1,30 +1,51 @@
 from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.shortcuts import redirect, render
 from django.contrib import messages
 from django.http import HttpResponseForbidden
+from .middleware import get_request_membership
+
+def _role_check(request, allowed_roles):
+    """Returns the response that turns the caller away, or None to let them through."""
+    if not request.user.is_authenticated:
+        return redirect('users:auth_login')
+
+    # --- SAAS CHECK ---
+    # If user belongs to an org, check if it is active
+    org = get_request_membership(request).organization
+    if request.user.organization_id and org and not org.is_active:
+        # Allow them to see the activation page, but block dashboards
+        if request.resolver_match.url_name != 'activation_pending':
+            return redirect('users:activation_pending')
+    # ------------------
+
+    if request.user.is_superuser:
+        return None
+
+    user_role = getattr(request.user, 'role', None)
+    if user_role in allowed_roles:
+        return None
+
+    return HttpResponseForbidden("<h1>403 Access Denied</h1>")
+
 
 def role_required(allowed_roles):
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                denied = await sync_to_async(_role_check)(request, allowed_roles)
+                if denied is not None:
+                    return denied
+                return await view_func(request, *args, **kwargs)
+            return async_wrapper
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            if not request.user.is_authenticated:
-                return redirect('users:auth_login')
-            
-            # --- SAAS CHECK ---
-            # If user belongs to an org, check if it is active
-            if request.user.organization and not request.user.organization.is_active:
-                # Allow them to see the activation page, but block dashboards
-                if request.resolver_match.url_name != 'activation_pending':
-                    return redirect('users:activation_pending')
-            # ------------------
-
-            if request.user.is_superuser:
-                 return view_func(request, *args, **kwargs)
-            
-            user_role = getattr(request.user, 'role', None)
-            if user_role in allowed_roles:
-                return view_func(request, *args, **kwargs)
-            
-            return HttpResponseForbidden("<h1>403 Access Denied</h1>")     
+            denied = _role_check(request, allowed_roles)
+            if denied is not None:
+                return denied
+            return view_func(request, *args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,172 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from community_connect import metrics, sharding
+
+# How long a resolved membership may live in the cache before it is rebuilt.
+# Signals (see users/signals.py and property/signals.py) clear it on change;
+# the timeout only bounds staleness for caches that are not shared between workers.
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+
+def membership_cache_key(user_id):
+    return f"membership:user:{user_id}:v2"
+
+
+def organization_cache_key(org_id):
+    return f"membership:org:{org_id}"
+
+
+class Membership:
+    """
+    The caller's place in the SaaS: which Organization they work under,
+    their role and (for guards/caretakers) the Property they are posted to.
+    """
+    __slots__ = ('organization', 'role', 'staff_property_id', 'home')
+
+    def __init__(self, organization=None, role=None, staff_property_id=None, home=None):
+        self.organization = organization
+        self.role = role
+        self.staff_property_id = staff_property_id
+        # (shard, organization id) of the unit a tenant without an organization occupies
+        self.home = home
+
+    def __bool__(self):
+        return self.organization is not None
+
+    @property
+    def shard(self):
+        if self.organization is not None:
+            return self.organization.shard
+        return self.home[0] if self.home else sharding.DEFAULT
+
+    @property
+    def data_organization_id(self):
+        """The organization whose data this request works on (for tenants, their unit's)."""
+        if self.organization is not None:
+            return self.organization.id
+        return self.home[1] if self.home else None
+
+
+def get_cached_organization(org_id):
+    """Loads an Organization once and keeps it in the cache until it is saved again."""
+    if org_id is None:
+        return None
+    key = organization_cache_key(org_id)
+    org = cache.get(key)
+    metrics.cache_lookup('organization', org is not None)
+    if org is None:
+        from .models import Organization
+        org = Organization.objects.filter(pk=org_id).first()
+        if org is not None:
+            cache.set(key, org, MEMBERSHIP_CACHE_TIMEOUT)
+    return org
+
+
+def resolve_membership(user):
+    """
+    Works out the user's Organization, role and staff assignment.
+    Home Owners usually have no direct organization link, so theirs is
+    derived from the first unit they own (the old get_user_organization rule).
+    """
+    if not user.is_authenticated:
+        return Membership()
+
+    key = membership_cache_key(user.pk)
+    data = cache.get(key)
+    metrics.cache_lookup('membership', data is not None)
+    if data is None:
+        from property.models import PropertyStaff, Unit
+
+        org_id, home = user.organization_id, None
+        if org_id is None and user.role == 'HO':
+            # Their units may sit on any shard
+            for alias in sharding.shard_aliases():
+                org_id = Unit.objects.using(alias).filter(owner=user).values_list('property__organization_id', flat=True).first()
+                if org_id is not None:
+                    break
+        elif org_id is None and user.role == 'T':
+            alias, unit = sharding.find_across_shards(Unit.objects.filter(current_tenant=user).only('id', 'organization_id'))
+            if unit is not None:
+                home = (alias, unit.organization_id)
+
+        staff_property_id = None
+        if user.role in ('SEC', 'CT'):
+            staff_property_id = PropertyStaff.objects.using(sharding.shard_of(org_id)).filter(user=user).values_list('property_id', flat=True).first()
+
+        data = (org_id, user.role, staff_property_id, home)
+        cache.set(key, data, MEMBERSHIP_CACHE_TIMEOUT)
+
+    org_id, role, staff_property_id, home = data
+    return Membership(get_cached_organization(org_id), role, staff_property_id, home)
+
+
+def get_request_membership(request):
+    """Returns the membership attached by the middleware, resolving it if the middleware did not run."""
+    membership = getattr(request, 'membership', None)
+    if membership is None:
+        membership = resolve_membership(request.user)
+        request.membership = membership
+        request.org = membership.organization
+    return membership
+
+
+def invalidate_membership(*user_ids):
+    keys = [membership_cache_key(uid) for uid in user_ids if uid]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_organization(org_id):
+    cache.delete(organization_cache_key(org_id))
+
+
+class OrganizationMiddleware:
+    """
+    Resolves the caller's Organization once per request and exposes it as
+    ``request.org`` (plus the full ``request.membership``), then binds the
+    request to that organization's shard. Must sit after AuthenticationMiddleware.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        membership, paused = self.resolve(request)
+        if paused:
+            return paused
+        with sharding.using_shard(membership.shard, membership.data_organization_id):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        membership, paused = await sync_to_async(self.resolve)(request)
+        if paused:
+            return paused
+        with sharding.using_shard(membership.shard, membership.data_organization_id):
+            return await self.get_response(request)
+
+    def resolve(self, request):
+        membership = resolve_membership(request.user)
+        request.membership = membership
+        request.org = membership.organization
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and sharding.is_frozen(membership.data_organization_id):
+            return membership, self.paused()
+        return membership, None
+
+    def process_exception(self, request, exception):
+        # A write refused mid-request by the router (community_connect/routers.py) during a shard move.
+        if isinstance(exception, sharding.ShardMoveInProgress):
+            return self.paused()
+        return None
+
+    @staticmethod
+    def paused():
+        response = HttpResponse("Your organization is being moved to new storage. Please retry in a minute.", status=503)
+        response['Retry-After'] = '30'
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='shard',
+            field=models.CharField(default='default', editable=False, help_text='Change with `manage.py move_organization_shard`.', max_length=50),
+        ),
+    ]
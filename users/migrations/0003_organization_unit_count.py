@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_organization_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='unit_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
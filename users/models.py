@@ -11,6 +11,8 @@ class Organization(models.Model):
         ('PREMIUM', 'Premium (51-200 Units)'),
         ('ENTERPRISE', 'Enterprise (200+ Units)'),
     ]
+    # Units each self-serve plan allows; Enterprise limits are set per contract.
+    PLAN_UNIT_LIMITS = {'STANDARD': 50, 'PREMIUM': 200, 'ENTERPRISE': None}
 
     name = models.CharField(max_length=150, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -21,10 +23,25 @@ class Organization(models.Model):
     is_active = models.BooleanField(default=False, help_text="Active after integration fee payment")
     subscription_plan = models.CharField(max_length=20, choices=SUBSCRIPTION_CHOICES, default='STANDARD')
     max_units = models.IntegerField(default=50, help_text="Limit based on plan")
+    # Units across all properties, kept by the Unit signals and checked against max_units.
+    unit_count = models.IntegerField(default=0, editable=False)
     next_billing_date = models.DateField(null=True, blank=True)
 
+    # Database alias holding this organization's property data (see community_connect/sharding.py)
+    shard = models.CharField(max_length=50, default='default', editable=False,
+                             help_text="Change with `manage.py move_organization_shard`.")
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # max_units follows the plan (except Enterprise, where it is edited by hand).
+        limit = self.PLAN_UNIT_LIMITS.get(self.subscription_plan)
+        if limit is not None and self.max_units != limit:
+            self.max_units = limit
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'max_units'}
+        super().save(*args, **kwargs)
     
     class Meta:
         verbose_name_plural = "Organizations"
@@ -64,6 +81,20 @@ class CustomUser(AbstractUser):
     
     # assigned_property -> REMOVED in favor of PropertyStaff model in property app to fix circular dependency strictly.
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Role and organization as loaded, so signals can adjust the platform counters.
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_role = instance.__dict__.get('role')
+        instance._loaded_organization_id = instance.__dict__.get('organization_id')
+        return instance
+
+    def get_session_auth_hash(self):
+        # Principals served from the cache (users/backends.py) carry the hash, not the password.
+        if 'password' not in self.__dict__ and getattr(self, 'cached_session_auth_hash', None):
+            return self.cached_session_auth_hash
+        return super().get_session_auth_hash()
+
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
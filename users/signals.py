@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from community_connect import sharding
+
+from .backends import invalidate_principal
+from .middleware import invalidate_membership, invalidate_organization
+from .models import CustomUser, Organization
+
+
+# --- Membership cache invalidation ---
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_membership_changed(sender, instance, **kwargs):
+    invalidate_membership(instance.pk)
+    invalidate_principal(instance.pk)
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def organization_changed(sender, instance, **kwargs):
+    invalidate_organization(instance.pk)
+
+
+# --- Directory mirroring onto shards ---
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=CustomUser)
+def directory_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no shard query reads.
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    sharding.mirror(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Organization)
+def directory_deleted(sender, instance, **kwargs):
+    sharding.unmirror(sender, instance.pk)
@@ -1,3 +1,97 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from property.models import Property, PropertyStaff, Unit
+
+from .backends import CachedModelBackend, principal_cache_key
+from .middleware import get_cached_organization, resolve_membership
+from .models import CustomUser, Organization
+
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+        self.other = Organization.objects.create(name="Org Two", is_active=True)
+        self.pm = CustomUser.objects.create_user(username="pm", password="x", role='PM', organization=self.org)
+        self.prop = Property.objects.create(name="Greenwood", organization=self.org)
+
+    def test_membership_is_served_from_cache(self):
+        resolve_membership(self.pm)
+        with self.assertNumQueries(0):
+            membership = resolve_membership(self.pm)
+        self.assertEqual(membership.organization, self.org)
+        self.assertEqual(membership.role, 'PM')
+
+    def test_moving_user_to_another_organization_invalidates(self):
+        resolve_membership(self.pm)
+        self.pm.organization = self.other
+        self.pm.save()
+        self.assertEqual(resolve_membership(self.pm).organization, self.other)
+
+    def test_staff_assignment_invalidates(self):
+        guard = CustomUser.objects.create_user(username="guard", password="x", role='SEC', organization=self.org)
+        self.assertIsNone(resolve_membership(guard).staff_property_id)
+        PropertyStaff.objects.create(user=guard, property=self.prop)
+        self.assertEqual(resolve_membership(guard).staff_property_id, self.prop.pk)
+
+    def test_owner_without_organization_follows_their_units(self):
+        ho = CustomUser.objects.create_user(username="ho", password="x", role='HO')
+        self.assertIsNone(resolve_membership(ho).organization)
+        Unit.objects.create(property=self.prop, block="A", floor="1", door_number="04", owner=ho)
+        self.assertEqual(resolve_membership(ho).organization, self.org)
+
+    def test_saving_organization_invalidates_cached_copy(self):
+        self.assertTrue(get_cached_organization(self.org.pk).is_active)
+        self.org.is_active = False
+        self.org.save()
+        self.assertFalse(get_cached_organization(self.org.pk).is_active)
+
+
+class CachedPrincipalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org One", is_active=True)
+        self.user = CustomUser.objects.create_user(username="pm", password="x", role='PM', organization=self.org)
+        self.backend = CachedModelBackend()
+
+    def test_cached_principal_leaves_out_the_password(self):
+        self.backend.get_user(self.user.pk)
+        get_cached_organization(self.org.pk)
+        _, values, _ = cache.get(principal_cache_key(self.user.pk))
+        self.assertNotIn(self.user.password, values)
+
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+            self.assertEqual(user.organization, self.org)
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_user_change_voids_cached_principal(self):
+        self.backend.get_user(self.user.pk)
+        self.user.first_name = "Grace"
+        self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, "Grace")
+
+    def test_password_change_ends_cached_session(self):
+        client = self.client
+        client.force_login(self.user)
+        self.assertEqual(client.get('/app/pm/').status_code, 200)
+        self.user.set_password('new-pass-123')
+        self.user.save()
+        self.assertEqual(client.get('/app/pm/').status_code, 302)
+
+
+class OrganizationPlanTests(TestCase):
+    def test_max_units_follows_plan(self):
+        org = Organization.objects.create(name="Org One")
+        self.assertEqual(org.max_units, 50)
+        org.subscription_plan = 'PREMIUM'
+        org.save(update_fields=['subscription_plan'])
+        org.refresh_from_db()
+        self.assertEqual(org.max_units, 200)
+
+    def test_enterprise_limit_is_set_by_hand(self):
+        org = Organization.objects.create(name="Org One", subscription_plan='ENTERPRISE', max_units=1500)
+        org.refresh_from_db()
+        self.assertEqual(org.max_units, 1500)
@@ -6,6 +6,8 @@ from .forms import LoginForm, ManagerSignUpForm
 from property.models import SoftwareInvoice # Needed to create the 20k invoice
 from django.utils import timezone
 
+from community_connect import metrics
+
 def splash_page_view(request):
     if request.user.is_authenticated:
         return redirect('home')
@@ -27,6 +29,8 @@ def register_view(request):
                 description="One-Time System Integration Fee",
                 due_date=timezone.now().date()
             )
+            metrics.SIGNUPS.inc()
+            metrics.INVOICES_GENERATED.inc(kind='integration_fee')
             
             login(request, user)
             # 2. Redirect to Activation Pending instead of Home
@@ -44,7 +48,7 @@ def activation_pending_view(request):
     """
     Landing page for inactive organizations (haven't paid 20k).
     """
-    org = request.user.organization
+    org = request.org
     if org and org.is_active:
         return redirect('home')
         
@@ -60,8 +64,10 @@ def login_view(request):
         if form.is_valid():
             user = form.get_user()
             login(request, user)
+            metrics.LOGINS.inc(result='success')
             return redirect('home')
         else:
+            metrics.LOGINS.inc(result='failure')
             messages.error(request, 'Invalid username or password.')
     else:
         form = LoginForm()